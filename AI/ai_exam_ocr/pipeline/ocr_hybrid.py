@@ -8,7 +8,7 @@ from typing import List, Dict, Any
 import cv2
 import numpy as np
 #from paddleocr import PaddleOCR
-from ai_file_ocr.pipeline.rewrite import code_rewrite, process_latex
+from ai_file_ocr.pipeline.rewrite import tag_text
 from openai import OpenAI
 from dotenv import load_dotenv
 
@@ -353,8 +353,7 @@ def run_hybrid_ocr_on_seq_meta(seq_meta: List[Dict[str, Any]]):
 
            
             gpt_text = hybrid_gpt_vision_with_paddle(path, kind=kind)
-            clean_text = code_rewrite(gpt_text)
-            clean_text = process_latex(clean_text)
+            clean_text = tag_text(gpt_text)
             item["gpt_hybrid_text"] = clean_text
 
     return seq_meta
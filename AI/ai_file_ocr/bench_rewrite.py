@@ -0,0 +1,117 @@
+"""
+수식 / 코드 태깅 마이크로벤치마크: 이전 정규식 여러 번 방식 vs 한 번 스캔 방식.
+
+    python -m ai_file_ocr.bench_rewrite [--sizes 10000,100000,1000000] [--repeat 3]
+
+합성 페이지(본문 + 인라인/블록 수식 + 환경 + 텍스트 명령 + 코드 블록)를 크기별로 만들어 처리 시간을 비교한다.
+이전 방식은 크기에 따라 제곱으로 느려지므로 큰 크기에서는 --skip-legacy-over로 건너뛸 수 있다.
+"""
+import argparse
+import random
+import re
+import time
+
+from ai_file_ocr.pipeline.rewrite import TEXT_COMMANDS, tag_text
+
+# ---- 이전 방식 (비교용) ----
+_LEGACY_PATTERNS = [
+    r'\\\((.*?)\\\)',
+    r'\\\[(.*?)\\\]',
+    r'\$\$(.*?)\$\$',
+    r'\\begin\{.*?\}.*?\\end\{.*?\}',
+]
+
+
+def _legacy_safe_sub(pattern, repl, text):
+    def wrapper(match):
+        start = match.start()
+        open_tag = text.rfind("<수식>", 0, start)
+        close_tag = text.rfind("</수식>", 0, start)
+        if open_tag != -1 and (close_tag == -1 or close_tag < open_tag):
+            return match.group(0)
+        return repl(match)
+
+    return re.sub(pattern, wrapper, text, flags=re.DOTALL)
+
+
+def _legacy_remove_text(text):
+    spans = []
+    for pattern in _LEGACY_PATTERNS:
+        for m in re.finditer(pattern, text, flags=re.DOTALL):
+            spans.append((m.start(), m.end()))
+
+    def replacer(match):
+        if any(start <= match.start() < end for start, end in spans):
+            return match.group(0)
+        return match.group(2)
+
+    return re.sub(r'\\(' + '|'.join(TEXT_COMMANDS) + r')\{([^{}]+)\}', replacer, text)
+
+
+def legacy_tag(text: str) -> str:
+    text = _legacy_remove_text(text)
+    for idx, pattern in enumerate(_LEGACY_PATTERNS):
+        group = 0 if idx == 3 else 1
+        text = _legacy_safe_sub(pattern, lambda m: f"<수식>\n{m.group(group).strip()}\n</수식>", text)
+    text = re.sub(r'<수식>\s*<수식>', '<수식>', text)
+    text = re.sub(r'</수식>\s*</수식>', '</수식>', text)
+    text = re.sub(
+        r'<수식>([\s\S]*?)</수식>',
+        lambda m: f"<수식>\n{m.group(1).replace('<수식>', '').replace('</수식>', '').strip()}\n</수식>",
+        text,
+    )
+    return re.sub(r"```(.*?)```", lambda m: f"<코드>\n{m.group(1).strip()}\n</코드>", text, flags=re.DOTALL)
+
+
+# ---- 합성 페이지 ----
+_PIECES = [
+    "강의 내용을 정리하면 다음과 같다. ",
+    "함수 \\(f(x) = x^2 + 1\\)의 도함수는 \\(f'(x) = 2x\\)이다. ",
+    "\\textbf{정의} 연속 함수는 \\text{구간} 위에서 정의된다. ",
+    "\\[\\int_0^1 x\\,dx = \\frac{1}{2}\\]\n",
+    "$$\\sum_{i=1}^{n} i = \\frac{n(n+1)}{2}$$\n",
+    "\\begin{align} a &= b + c \\\\[2pt] d &= \\text{e} \\end{align}\n",
+    "```python\nfor i in range(10):\n    print(i)\n```\n",
+    "괄호 \\( 가 닫히지 않은 문장도 있다. ",
+]
+
+
+def synthetic_page(size: int, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    parts, total = [], 0
+    while total < size:
+        piece = rnd.choice(_PIECES)
+        parts.append(piece)
+        total += len(piece)
+    return "".join(parts)
+
+
+def _best(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy-over", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'chars':>10} {'legacy (s)':>12} {'single-pass (s)':>16} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        text = synthetic_page(size)
+        new = _best(tag_text, text, args.repeat)
+        if size > args.skip_legacy_over:
+            print(f"{len(text):>10} {'-':>12} {new:>16.4f} {'-':>8}")
+            continue
+        old = _best(legacy_tag, text, args.repeat)
+        print(f"{len(text):>10} {old:>12.4f} {new:>16.4f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,10 @@ celery_app.autodiscover_tasks(['ai_file_ocr'], force=True)
 
 celery_app.conf.update(
     task_routes={
-        "ai_file_ocr.tasks.run_pdf_ocr": {"queue": "ai"}
-    }
-)
\ No newline at end of file
+        "ai_file_ocr.tasks.*": {"queue": "ai"}
+    },
+    # 페이지 subtask가 워커들에 고르게 나뉘도록 한 번에 하나씩만 가져가고,
+    # 워커가 죽으면 다른 워커가 다시 받도록 완료 후 ack
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+)
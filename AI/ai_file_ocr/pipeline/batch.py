@@ -0,0 +1,171 @@
+import json
+import os
+import tempfile
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+from ai_file_ocr.pipeline.ocr import SECTION_TITLES, client
+
+# 지연(deferred) 모드 batch 제공자: "openai" (Batch API) | "local" (테스트용 대체 구현)
+BATCH_PROVIDER = os.getenv("OCR_BATCH_PROVIDER", "openai")
+BATCH_LOCAL_DIR = os.getenv("OCR_BATCH_LOCAL_DIR", "ocr_batches")
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Batch API 입력 파일 한도 (요청 수 / 파일 크기), 넘으면 여러 batch로 나눠 제출한다
+BATCH_MAX_REQUESTS = int(os.getenv("OCR_BATCH_MAX_REQUESTS", "50000"))
+BATCH_MAX_BYTES = int(os.getenv("OCR_BATCH_MAX_BYTES", str(190 * 1024 * 1024)))
+# 나눠 제출한 batch id들을 하나의 id로 묶는 구분자
+BATCH_ID_SEPARATOR = ","
+LOCAL_BATCH_PREFIX = "local_"
+
+
+class BatchFailed(Exception):
+    pass
+
+
+def split_requests(
+    requests: List[dict],
+    max_requests: int = BATCH_MAX_REQUESTS,
+    max_bytes: int = BATCH_MAX_BYTES,
+) -> Iterator[List[bytes]]:
+    # JSONL 줄 단위로 요청 수 / 파일 크기 한도 안에서 나눈다
+    part: List[bytes] = []
+    size = 0
+    for req in requests:
+        line = (json.dumps(req, ensure_ascii=False) + "\n").encode("utf-8")
+        if part and (len(part) >= max_requests or size + len(line) > max_bytes):
+            yield part
+            part, size = [], 0
+        part.append(line)
+        size += len(line)
+    if part:
+        yield part
+
+
+class OpenAIBatchProvider:
+    """
+    OpenAI Batch API: 요청을 JSONL 파일로 올려 한 번에 제출하고, 끝나면 결과 파일을 받는다.
+    동기 호출과 별도의 한도로 처리되므로 강의 중인 문서의 Vision 호출과 경쟁하지 않는다.
+    입력 파일 한도를 넘으면 여러 batch로 나눠 제출하고, 그 id들을 이어 붙인 id 하나를 돌려준다.
+    """
+
+    # 실제 모델 결과라 페이지 캐시에 넣어도 된다
+    cacheable = True
+
+    def submit(self, requests: List[dict], metadata: Dict[str, str]) -> str:
+        batch_ids = []
+        try:
+            for part in split_requests(requests):
+                batch_ids.append(self._submit_part(part, metadata))
+        except Exception:
+            # 일부만 제출된 경우 나머지도 취소 (작업 전체를 다시 시도)
+            for batch_id in batch_ids:
+                try:
+                    client.batches.cancel(batch_id)
+                except Exception as e:
+                    print(f"[AI OCR] batch 취소 실패: {batch_id}, error={e}")
+            raise
+        return BATCH_ID_SEPARATOR.join(batch_ids)
+
+    def _submit_part(self, lines: List[bytes], metadata: Dict[str, str]) -> str:
+        with tempfile.NamedTemporaryFile("wb", suffix=".jsonl", delete=False) as tmp:
+            tmp.writelines(lines)
+            path = tmp.name
+
+        try:
+            with open(path, "rb") as f:
+                input_file = client.files.create(file=f, purpose="batch")
+        finally:
+            os.remove(path)
+
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW,
+            metadata=metadata,
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, Optional[str]]]:
+        """
+        하나라도 진행 중이면 None, 모두 끝났으면 custom_id → 응답 본문 (실패한 요청은 None).
+        나눠 제출한 batch 중 일부만 실패하면 그 요청은 결과에서 빠진다 (호출한 쪽이 다시 처리).
+        """
+        batches = [client.batches.retrieve(part) for part in batch_id.split(BATCH_ID_SEPARATOR)]
+        failed = [b for b in batches if b.status in ("failed", "expired", "cancelled")]
+        if len(failed) == len(batches):
+            raise BatchFailed(f"batch {batch_id}: {', '.join(b.status for b in failed)}")
+        if any(b.status != "completed" for b in batches if b not in failed):
+            return None
+
+        results: Dict[str, Optional[str]] = {}
+        for batch in batches:
+            if batch in failed or not batch.output_file_id:
+                continue
+            for line in client.files.content(batch.output_file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                content = None
+                if response.get("status_code") == 200:
+                    content = response["body"]["choices"][0]["message"]["content"]
+                results[item["custom_id"]] = content
+        return results
+
+    def cancel(self, batch_id: str) -> None:
+        for part in batch_id.split(BATCH_ID_SEPARATOR):
+            client.batches.cancel(part)
+
+
+class LocalBatchProvider:
+    """
+    테스트/개발용 대체 구현: 요청을 로컬 디렉토리에 JSONL로 저장하고,
+    poll 시 모델 호출 없이 정해진 형식의 결과를 돌려준다 (지연 모드 전체 흐름 확인용).
+    """
+
+    # 자리표시 결과는 페이지 캐시에 넣지 않는다
+    cacheable = False
+
+    def submit(self, requests: List[dict], metadata: Dict[str, str]) -> str:
+        os.makedirs(BATCH_LOCAL_DIR, exist_ok=True)
+        batch_id = f"{LOCAL_BATCH_PREFIX}{uuid.uuid4().hex}"
+        with open(os.path.join(BATCH_LOCAL_DIR, f"{batch_id}.jsonl"), "w", encoding="utf-8") as f:
+            for req in requests:
+                f.write(json.dumps(req, ensure_ascii=False) + "\n")
+        return batch_id
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, Optional[str]]]:
+        path = os.path.join(BATCH_LOCAL_DIR, f"{batch_id}.jsonl")
+        if not os.path.exists(path):
+            raise BatchFailed(f"batch {batch_id}: not found")
+
+        results: Dict[str, Optional[str]] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                custom_id = json.loads(line)["custom_id"]
+                sections = {key: "" for key, _ in SECTION_TITLES}
+                sections["body"] = f"(local batch) {custom_id}"
+                results[custom_id] = json.dumps({"sections": sections, "summary": ""}, ensure_ascii=False)
+        os.remove(path)
+        return results
+
+    def cancel(self, batch_id: str) -> None:
+        path = os.path.join(BATCH_LOCAL_DIR, f"{batch_id}.jsonl")
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def batch_request(custom_id: str, body: dict) -> dict:
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def get_batch_provider(batch_id: Optional[str] = None):
+    # 제출한 batch는 설정이 바뀌어도 제출한 제공자로 확인한다
+    if batch_id is not None:
+        local = batch_id.startswith(LOCAL_BATCH_PREFIX)
+    else:
+        local = BATCH_PROVIDER == "local"
+    return LocalBatchProvider() if local else OpenAIBatchProvider()
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from ai_file_ocr.pipeline.ocr import CACHE_VERSION, MODEL_KEY, PageAnalysis
+
+# 페이지 OCR 결과 캐시 (문서/강의가 달라도 같은 페이지면 재사용)
+CACHE_ENABLED = os.getenv("OCR_CACHE", "1") == "1"
+CACHE_PATH = os.getenv("OCR_CACHE_PATH", "ocr_cache/pages.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "50000"))
+
+
+def page_cache_key(image_bytes: bytes) -> str:
+    # 렌더링된 페이지 + 프롬프트 버전 + 모델 구성이 같으면 같은 결과로 본다
+    hasher = hashlib.sha256()
+    hasher.update(f"{CACHE_VERSION}:{MODEL_KEY}:".encode())
+    hasher.update(image_bytes)
+    return hasher.hexdigest()
+
+
+class PageCache:
+    """
+    디스크(SQLite) 기반 페이지 결과 캐시.
+    항목 수가 max_entries를 넘으면 가장 오래 사용되지 않은 항목부터 지운다 (LRU).
+    hit/miss 횟수도 같은 파일에 누적해 API 서버에서 조회할 수 있다.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " key TEXT PRIMARY KEY, text TEXT NOT NULL, summary TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _count(self, name: str) -> None:
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key: str) -> Optional[PageAnalysis]:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT text, summary FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self._count("misses")
+                return None
+
+            self._conn.execute("UPDATE pages SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._count("hits")
+            return PageAnalysis(text=row[0], summary=row[1])
+
+    def put(self, key: str, analysis: PageAnalysis) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, text, summary, last_used) VALUES (?, ?, ?, ?)",
+                (key, analysis.text, analysis.summary, time.time()),
+            )
+
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()
+            overflow = entries - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM pages WHERE key IN"
+                    " (SELECT key FROM pages ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self._conn.execute(
+                    "INSERT INTO counters (name, value) VALUES ('evictions', ?)"
+                    " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (overflow,),
+                )
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()
+
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        total = hits + misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+
+_page_cache: Optional[PageCache] = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> Optional[PageCache]:
+    global _page_cache
+    if not CACHE_ENABLED:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+        return _page_cache
@@ -0,0 +1,80 @@
+import os
+import time
+from typing import List
+
+from ai_file_ocr.redis_client import redis_client
+
+# 취소 표시 / 문서 작업 id 보관 기간
+CANCEL_TTL = int(os.getenv("OCR_CANCEL_TTL", str(24 * 3600)))
+# 워커가 취소 여부를 다시 확인하는 간격 (초)
+CANCEL_CHECK_SEC = 1.0
+
+
+class DocumentCancelled(Exception):
+    """문서가 삭제되어 OCR 작업을 중단한 경우 (재시도하지 않음)"""
+
+    def __init__(self, doc_id: int):
+        super().__init__(f"doc={doc_id} cancelled")
+        self.doc_id = doc_id
+
+
+def _keys(doc_id: int):
+    return f"ocr:cancel:{doc_id}", f"ocr:tasks:{doc_id}"
+
+
+def track_tasks(doc_id: int, task_ids: List[str]) -> None:
+    # 취소 시 큐에서 꺼내지 않은 task를 revoke할 수 있도록 기록
+    if not task_ids:
+        return
+    _, tasks_key = _keys(doc_id)
+    pipe = redis_client.pipeline()
+    pipe.sadd(tasks_key, *task_ids)
+    pipe.expire(tasks_key, CANCEL_TTL)
+    pipe.execute()
+
+
+def mark_cancelled(doc_id: int) -> None:
+    cancel_key, _ = _keys(doc_id)
+    redis_client.set(cancel_key, "1", ex=CANCEL_TTL)
+
+
+def cancel_document(doc_id: int) -> List[str]:
+    # 취소 표시를 남기고, 이 문서로 등록된 task id 목록을 돌려준다
+    cancel_key, tasks_key = _keys(doc_id)
+    pipe = redis_client.pipeline()
+    pipe.set(cancel_key, "1", ex=CANCEL_TTL)
+    pipe.smembers(tasks_key)
+    pipe.delete(tasks_key)
+    _, task_ids, _ = pipe.execute()
+    return sorted(task_ids or [])
+
+
+def is_cancelled(doc_id: int) -> bool:
+    cancel_key, _ = _keys(doc_id)
+    try:
+        return bool(redis_client.exists(cancel_key))
+    except Exception as e:
+        print(f"[AI OCR] 취소 여부 확인 실패: doc={doc_id}, error={e}")
+        return False
+
+
+class CancelFlag:
+    """
+    페이지마다 Redis를 조회하지 않도록 취소 여부를 CANCEL_CHECK_SEC 동안 캐시한다.
+    한 번 취소되면 계속 취소 상태.
+    """
+
+    def __init__(self, doc_id: int):
+        self.doc_id = doc_id
+        self._set = False
+        self._checked_at = 0.0
+
+    def is_set(self) -> bool:
+        if not self._set and time.time() - self._checked_at >= CANCEL_CHECK_SEC:
+            self._set = is_cancelled(self.doc_id)
+            self._checked_at = time.time()
+        return self._set
+
+    def set(self) -> None:
+        self._set = True
+        mark_cancelled(self.doc_id)
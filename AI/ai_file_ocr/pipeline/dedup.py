@@ -0,0 +1,183 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import cv2
+import fitz
+import numpy as np
+
+# 비교용 썸네일 가로 크기 (px)
+THUMB_WIDTH = 128
+# 밝기 표준편차가 이보다 작으면 빈 페이지
+BLANK_STD = float(os.getenv("OCR_DEDUP_BLANK_STD", "4.0"))
+# 픽셀 밝기 차이가 이보다 크면 바뀐 픽셀
+DIFF_THRESHOLD = 32
+# 바뀐 픽셀 비율이 이 이하면 같은 페이지
+DUPLICATE_MAX_CHANGED = float(os.getenv("OCR_DEDUP_DUPLICATE_MAX_CHANGED", "0.002"))
+# 바뀐 영역(bbox)이 페이지의 이 비율 이하면 이전 페이지 + 추가분(delta)으로 처리
+DELTA_MAX_AREA = float(os.getenv("OCR_DEDUP_DELTA_MAX_AREA", "0.4"))
+# 변경 영역 crop 여백 (페이지 비율)
+DELTA_MARGIN = 0.02
+# 썸네일로 같다고 본 직전 페이지를 다시 비교하는 해상도 (가로 px) / 바뀐 픽셀 비율 기준
+# (128px 썸네일에서는 글자 한 단어 수정이 뭉개져 보이지 않는다)
+CONFIRM_WIDTH = 512
+CONFIRM_MAX_CHANGED = float(os.getenv("OCR_DEDUP_CONFIRM_MAX_CHANGED", "0.00002"))
+# 떨어진 페이지 중복 검사용 dHash 허용 비트 수
+HASH_MAX_DISTANCE = 3
+MAX_HASHES = 500
+
+
+@dataclass
+class PageClass:
+    kind: str                    # "new" | "blank" | "duplicate" | "delta"
+    ref: Optional[int] = None    # 기준 페이지 번호 (duplicate / delta)
+    bbox: Optional[Tuple[float, float, float, float]] = None  # 바뀐 영역 (0~1 비율, delta)
+
+
+def render_thumbnail(page: fitz.Page) -> np.ndarray:
+    # 작은 흑백 썸네일 (dHash / 픽셀 비교용)
+    zoom = THUMB_WIDTH / max(page.rect.width, 1)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    thumb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+    return thumb[:, : pix.width].copy()
+
+
+def text_signature(page: fitz.Page) -> Optional[str]:
+    # 텍스트 레이어 해시 (중복 확인용, 글자가 없으면 None)
+    text = " ".join(page.get_text("text").split())
+    if not text:
+        return None
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _detail(image_bytes: bytes) -> Optional[np.ndarray]:
+    # 렌더링된 페이지 이미지 → 확인용 흑백 이미지 (CONFIRM_WIDTH)
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    h, w = img.shape
+    if w > CONFIRM_WIDTH:
+        img = cv2.resize(img, (CONFIRM_WIDTH, max(1, round(h * CONFIRM_WIDTH / w))), interpolation=cv2.INTER_AREA)
+    return img
+
+
+def dhash(thumb: np.ndarray) -> int:
+    small = cv2.resize(thumb, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def _changed_mask(a: np.ndarray, b: np.ndarray) -> Optional[np.ndarray]:
+    if a.shape != b.shape:
+        return None
+    return cv2.absdiff(a, b) > DIFF_THRESHOLD
+
+
+class PageDeduper:
+    """
+    렌더링 순서대로 페이지 썸네일을 받아
+    빈 페이지 / 앞 페이지 중복 / 직전 페이지 + 추가분(delta) / 새 페이지로 분류한다.
+    썸네일로 같아 보이는 페이지는 텍스트 레이어가 다르면 중복이 아니고,
+    직전 페이지는 렌더링 이미지를 더 큰 해상도로 비교해 확인한다.
+    떨어진 페이지는 이미지를 들고 있지 않으므로 텍스트 레이어가 같을 때만 중복으로 본다.
+    """
+
+    def __init__(self):
+        self._prev: Optional[Tuple[int, np.ndarray, Optional[str], Optional[bytes]]] = None
+        self._hashes: Dict[int, Tuple[int, np.ndarray, Optional[str]]] = {}
+        self.stats = {"blank": 0, "duplicate": 0, "delta": 0, "new": 0}
+
+    def classify(
+        self,
+        page_number: int,
+        thumb: Optional[np.ndarray],
+        text_sig: Optional[str] = None,
+        image: Optional[bytes] = None,
+    ) -> PageClass:
+        if thumb is None:
+            return PageClass("new")
+
+        result = self._classify(page_number, thumb, text_sig, image)
+
+        self._prev = (page_number, thumb, text_sig, image)
+        if result.kind != "blank" and len(self._hashes) < MAX_HASHES:
+            self._hashes.setdefault(dhash(thumb), (page_number, thumb, text_sig))
+
+        self.stats[result.kind] += 1
+        return result
+
+    def _classify(
+        self, page_number: int, thumb: np.ndarray, text_sig: Optional[str], image: Optional[bytes]
+    ) -> PageClass:
+        if float(thumb.std()) < BLANK_STD:
+            return PageClass("blank")
+
+        # 1) 직전 페이지와 비교 (빌드 애니메이션 슬라이드, 바로 앞 번호일 때만)
+        if self._prev is not None and self._prev[0] == page_number - 1:
+            prev_number, prev_thumb, prev_sig, prev_image = self._prev
+            mask = _changed_mask(prev_thumb, thumb)
+            if mask is not None:
+                changed = float(mask.mean())
+                if changed <= DUPLICATE_MAX_CHANGED and _same_page(prev_sig, text_sig, prev_image, image):
+                    return PageClass("duplicate", ref=prev_number)
+
+                # 썸네일에서 바뀐 곳이 보이지 않는데 확인에서 다르면 새 페이지로
+                if mask.any():
+                    ys, xs = np.nonzero(mask)
+                    h, w = mask.shape
+                    x0, x1 = xs.min() / w - DELTA_MARGIN, (xs.max() + 1) / w + DELTA_MARGIN
+                    y0, y1 = ys.min() / h - DELTA_MARGIN, (ys.max() + 1) / h + DELTA_MARGIN
+                    x0, y0, x1, y1 = max(x0, 0.0), max(y0, 0.0), min(x1, 1.0), min(y1, 1.0)
+                    if (x1 - x0) * (y1 - y0) <= DELTA_MAX_AREA:
+                        return PageClass("delta", ref=prev_number, bbox=(x0, y0, x1, y1))
+
+        # 2) 떨어진 앞 페이지와 같은지 (반복되는 구분 슬라이드 등)
+        if text_sig is None:
+            return PageClass("new")
+        h = dhash(thumb)
+        for known_hash, (number, known_thumb, known_sig) in self._hashes.items():
+            if known_sig != text_sig or bin(known_hash ^ h).count("1") > HASH_MAX_DISTANCE:
+                continue
+            mask = _changed_mask(known_thumb, thumb)
+            if mask is not None and float(mask.mean()) <= DUPLICATE_MAX_CHANGED:
+                return PageClass("duplicate", ref=number)
+
+        return PageClass("new")
+
+
+def _same_page(
+    sig_a: Optional[str], sig_b: Optional[str], image_a: Optional[bytes], image_b: Optional[bytes]
+) -> bool:
+    # 썸네일로 같아 보이는 두 페이지가 정말 같은지 (확인할 수 없으면 False)
+    if sig_a != sig_b:
+        return False
+    if image_a is None or image_b is None:
+        return sig_a is not None
+    if image_a == image_b:
+        return True
+    a, b = _detail(image_a), _detail(image_b)
+    if a is None or b is None:
+        return False
+    mask = _changed_mask(a, b)
+    return mask is not None and float(mask.mean()) <= CONFIRM_MAX_CHANGED
+
+
+def crop_region(image_bytes: bytes, bbox: Tuple[float, float, float, float]) -> bytes:
+    # 학생용 페이지 이미지(WebP/JPEG/PNG rendition)에서 bbox(비율) 영역만 잘라 PNG로
+    # 디코딩에 실패하거나 잘린 영역이 비면 페이지 전체를 보낸다
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return image_bytes
+    h, w = img.shape[:2]
+    x0, y0, x1, y1 = bbox
+    crop = img[int(y0 * h): int(y1 * h), int(x0 * w): int(x1 * w)]
+    if crop.size == 0:
+        return image_bytes
+    ok, buf = cv2.imencode(".png", crop)
+    if not ok:
+        return image_bytes
+    return buf.tobytes()
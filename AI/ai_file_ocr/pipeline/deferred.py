@@ -0,0 +1,167 @@
+import json
+import os
+import time
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+
+from ai_file_ocr.redis_client import redis_client
+from ai_file_ocr.pipeline.ocr import PageAnalysis, iter_pdf_pages, page_request_body, parse_structured
+from ai_file_ocr.pipeline.batch import BatchFailed, batch_request, get_batch_provider
+from ai_file_ocr.pipeline.cache import get_page_cache, page_cache_key
+from ai_file_ocr.pipeline.dedup import PageDeduper
+from ai_file_ocr.pipeline.outbox import CallbackOutbox
+from ai_file_ocr.pipeline.outline import outline_context
+from ai_file_ocr.pipeline.runner import BLANK_PAGE, upload_page
+
+# batch 결과를 기다리는 동안 필요한 정보 보관 기간 (batch 완료 기한 24h + 여유)
+DEFERRED_TTL = int(os.getenv("OCR_DEFERRED_TTL", str(3 * 24 * 3600)))
+
+
+def _meta_key(batch_id: str) -> str:
+    return f"ocr:deferred:{batch_id}"
+
+
+def submit_deferred(
+    doc_id: int,
+    pdf_ref: str,
+    pdf_sha256: str,
+    pdf_path: str,
+    callback_url: str,
+    outline: str,
+    outbox: CallbackOutbox,
+    pages: Optional[List[int]] = None,
+) -> Tuple[Optional[str], dict]:
+    """
+    급하지 않은 문서: 페이지 이미지는 바로 올리고, Vision이 필요 없는 페이지(텍스트 레이어 / 빈 페이지 /
+    캐시 / 앞 페이지 중복)는 즉시 outbox로 보낸다. 나머지는 batch 작업 하나로 묶어 제출하고 batch id를 반환한다.
+    """
+    deduper = PageDeduper()
+    cache = get_page_cache()
+    provider = get_batch_provider()
+
+    done: Dict[int, PageAnalysis] = {}
+    pending: Dict[int, dict] = {}
+    copies: Dict[int, dict] = {}
+    requests = []
+    stats = {"pages": 0, "deferred": 0, "vision_calls_saved": 0}
+
+    for page in iter_pdf_pages(pdf_path, pages=pages):
+        t = time.time()
+        stats["pages"] += 1
+        image_url, thumbnail_url = upload_page(doc_id, page)
+        urls = {"image_url": image_url, "thumbnail_url": thumbnail_url}
+        kind = deduper.classify(page.number, page.thumb, page.text_sig, page.image)
+
+        analysis = None
+        if page.local:
+            analysis = page.local
+        elif kind.kind == "blank":
+            analysis = BLANK_PAGE
+        elif kind.kind == "duplicate" and kind.ref is not None:
+            if kind.ref in done:
+                analysis = done[kind.ref]
+            else:
+                # 기준 페이지 결과가 batch에서 오면 그때 복사
+                copies[page.number] = {"ref": kind.ref, **urls}
+                stats["vision_calls_saved"] += 1
+                continue
+
+        cache_key = None
+        if cache is not None:
+            cache_key = page_cache_key(page.vision.data if page.vision else page.image)
+        if analysis is None and cache_key is not None:
+            analysis = cache.get(cache_key)
+
+        if analysis is not None:
+            done[page.number] = analysis
+            outbox.add(page.number, image_url, analysis.text, thumbnail_url)
+            stats["vision_calls_saved"] += 1
+            continue
+
+        # delta 페이지도 지연 모드에서는 페이지 전체를 보낸다 (기준 페이지 결과를 기다리지 않도록)
+        image = page.vision or page.image
+        if page.vision is not None and page.vision.reuse_display:
+            image = replace(page.vision, url=image_url)
+        body = page_request_body(image, outline_context(outline, page.number))
+        requests.append(batch_request(f"{doc_id}:{page.number}", body))
+        pending[page.number] = {"cache_key": cache_key, **urls}
+        stats["deferred"] += 1
+        print(f"[TIME] Deferred page {page.number} prepared: {time.time() - t:.2f} sec")
+
+    # 기준 페이지가 즉시 처리된 중복 페이지
+    for number, info in list(copies.items()):
+        if info["ref"] in done:
+            outbox.add(number, info["image_url"], done[info["ref"]].text, info["thumbnail_url"])
+            del copies[number]
+
+    if not requests:
+        return None, stats
+
+    batch_id = provider.submit(requests, {"doc_id": str(doc_id)})
+    meta = {
+        "doc_id": doc_id,
+        "pdf_ref": pdf_ref,
+        "pdf_sha256": pdf_sha256,
+        "callback_url": callback_url,
+        "pages": pending,
+        "copies": copies,
+    }
+    redis_client.set(_meta_key(batch_id), json.dumps(meta), ex=DEFERRED_TTL)
+    print(f"[AI OCR] doc={doc_id} deferred batch {batch_id}: {len(requests)} pages")
+    return batch_id, stats
+
+
+def deferred_meta(batch_id: str) -> Optional[dict]:
+    value = redis_client.get(_meta_key(batch_id))
+    return json.loads(value) if value else None
+
+
+def cancel_deferred(batch_id: str) -> None:
+    # 문서가 삭제된 경우: 아직 끝나지 않은 batch를 취소하고 보관 정보를 지운다
+    try:
+        get_batch_provider(batch_id).cancel(batch_id)
+    except Exception as e:
+        print(f"[AI OCR] deferred batch 취소 실패: {batch_id}, error={e}")
+    redis_client.delete(_meta_key(batch_id))
+
+
+def collect_deferred(batch_id: str, meta: dict, outbox: CallbackOutbox) -> Optional[dict]:
+    """
+    batch가 끝났으면 결과를 캐시에 넣고 (실제 모델 결과일 때만) outbox로 보낸다. 아직 진행 중이면 None.
+    결과가 없는 페이지(요청 실패, batch 만료 등)는 missing으로 돌려줘 일반 경로로 다시 처리하게 한다.
+    """
+    provider = get_batch_provider(batch_id)
+    try:
+        results = provider.poll(batch_id)
+    except BatchFailed as e:
+        print(f"[AI OCR] deferred batch 실패: {e}")
+        results = {}
+    if results is None:
+        return None
+
+    doc_id = meta["doc_id"]
+    cache = get_page_cache()
+    done: Dict[int, PageAnalysis] = {}
+    missing = []
+
+    for number, info in meta["pages"].items():
+        number = int(number)
+        content = results.get(f"{doc_id}:{number}")
+        if content is None:
+            missing.append(number)
+            continue
+        analysis, _ = parse_structured(content.strip())
+        done[number] = analysis
+        if cache is not None and provider.cacheable and info.get("cache_key"):
+            cache.put(info["cache_key"], analysis)
+        outbox.add(number, info["image_url"], analysis.text, info["thumbnail_url"])
+
+    for number, info in meta["copies"].items():
+        ref = done.get(info["ref"])
+        if ref is None:
+            missing.append(int(number))
+            continue
+        outbox.add(int(number), info["image_url"], ref.text, info["thumbnail_url"])
+
+    redis_client.delete(_meta_key(batch_id))
+    return {"pages": len(done), "missing": sorted(missing)}
@@ -0,0 +1,121 @@
+import json
+import os
+import time
+from typing import List, Optional, Tuple
+
+from ai_file_ocr.redis_client import redis_client
+from ai_file_ocr.pipeline.cancel import track_tasks
+
+# 등록 후 워커가 시작하기 전까지 / 실행 중 heartbeat 사이에 기록이 유지되는 시간 (초)
+# 워커가 죽거나 재시도가 모두 실패하면 기록이 만료되어 다시 제출할 수 있다
+JOB_QUEUED_TTL = int(os.getenv("OCR_JOB_QUEUED_TTL", "3600"))
+JOB_TTL = int(os.getenv("OCR_JOB_TTL", "900"))
+
+
+def job_key(doc_id: int, pdf_sha256: str) -> str:
+    return f"ocr:job:{doc_id}:{pdf_sha256}"
+
+
+def claim_job(doc_id: int, pdf_sha256: str) -> Optional[dict]:
+    """
+    같은 문서(doc_id + PDF 해시)의 작업을 하나만 등록한다 (SET NX).
+    새로 등록했으면 None, 이미 진행 중인 작업이 있으면 그 작업 정보를 반환한다.
+    """
+    key = job_key(doc_id, pdf_sha256)
+    job = {"doc_id": doc_id, "status": "queued", "task_id": None, "created_at": time.time()}
+    if redis_client.set(key, json.dumps(job), nx=True, ex=JOB_QUEUED_TTL):
+        return None
+    value = redis_client.get(key)
+    return json.loads(value) if value else job
+
+
+def job_exists(doc_id: int, pdf_sha256: str) -> bool:
+    return bool(redis_client.exists(job_key(doc_id, pdf_sha256)))
+
+
+def submit_once(doc_id: int, pdf_sha256: str, task, *args, **kwargs) -> Optional[dict]:
+    """
+    같은 문서(doc_id + PDF 해시)의 작업이 이미 등록되어 있으면 새로 시작하지 않고 그 작업 정보를 반환한다.
+    (백엔드 요청 timeout 후 재시도 / 중복 제출로 같은 문서가 동시에 두 번 처리되지 않도록)
+    """
+    existing = claim_job(doc_id, pdf_sha256)
+    if existing is not None:
+        print(f"[AI OCR] doc={doc_id} 이미 처리 중인 작업에 연결: {existing}")
+        return existing
+    try:
+        result = task.delay(*args, **kwargs)
+    except Exception:
+        release_job(doc_id, pdf_sha256)
+        raise
+    track_tasks(doc_id, [result.id])
+    update_job(doc_id, pdf_sha256, ttl=JOB_QUEUED_TTL, task_id=result.id)
+    return None
+
+
+def update_job(doc_id: int, pdf_sha256: str, ttl: int = JOB_TTL, **fields) -> None:
+    # 상태 / task id 갱신 + 만료 시간 연장 (이미 끝나 지워진 작업은 다시 만들지 않음)
+    key = job_key(doc_id, pdf_sha256)
+    try:
+        value = redis_client.get(key)
+        if not value:
+            return
+        job = json.loads(value)
+        job.update(fields, updated_at=time.time())
+        redis_client.set(key, json.dumps(job), ex=ttl, xx=True)
+    except Exception as e:
+        print(f"[AI OCR] 작업 기록 갱신 실패: doc={doc_id}, error={e}")
+
+
+def touch_job(doc_id: int, pdf_sha256: str) -> None:
+    # 실행 중 heartbeat
+    try:
+        redis_client.expire(job_key(doc_id, pdf_sha256), JOB_TTL)
+    except Exception as e:
+        print(f"[AI OCR] 작업 기록 갱신 실패: doc={doc_id}, error={e}")
+
+
+def release_job(doc_id: int, pdf_sha256: str) -> None:
+    try:
+        redis_client.delete(job_key(doc_id, pdf_sha256))
+    except Exception as e:
+        print(f"[AI OCR] 작업 기록 삭제 실패: doc={doc_id}, error={e}")
+
+
+def reocr_key(doc_id: int, pdf_sha256: str) -> str:
+    return f"ocr:reocr:{doc_id}:{pdf_sha256}"
+
+
+def add_pending_reocr(doc_id: int, pdf_sha256: str, pages: List[int], callback_url: str) -> None:
+    """
+    실행 중인 작업이 있어 바로 등록하지 못한 다시 OCR 요청: 페이지 → callback_url (hash).
+    같은 작업을 쓰면 진행 기록 / 페이지 큐가 겹치므로, 실행 중인 작업이 끝날 때 이어서 등록한다 (pop_pending_reocr).
+    """
+    key = reocr_key(doc_id, pdf_sha256)
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping={str(n): callback_url for n in pages})
+    pipe.expire(key, JOB_QUEUED_TTL + JOB_TTL)
+    pipe.execute()
+
+
+def pop_pending_reocr(doc_id: int, pdf_sha256: str) -> Optional[Tuple[List[int], str]]:
+    # 남아 있던 다시 OCR 요청 (페이지 목록, callback_url), 없으면 None
+    key = reocr_key(doc_id, pdf_sha256)
+    pipe = redis_client.pipeline()
+    pipe.hgetall(key)
+    pipe.delete(key)
+    pending, _ = pipe.execute()
+    if not pending:
+        return None
+    pages = sorted(int(n) for n in pending)
+    return pages, pending[str(pages[-1])]
+
+
+def release_doc_jobs(doc_id: int) -> None:
+    # 문서 취소 시: PDF 해시와 관계없이 이 문서의 작업 기록 / 대기 중인 다시 OCR 요청을 모두 지운다
+    try:
+        keys = list(redis_client.scan_iter(match=job_key(doc_id, "*")))
+        keys += list(redis_client.scan_iter(match=reocr_key(doc_id, "*")))
+        if keys:
+            redis_client.delete(*keys)
+    except Exception as e:
+        print(f"[AI OCR] 작업 기록 삭제 실패: doc={doc_id}, error={e}")
@@ -34,5 +34,11 @@ class ContextMemory:
 
         return "\n\n".join(lines)
 
+    def snapshot(self) -> List[Dict]:
+        return [dict(h) for h in self._history]
+
+    def restore(self, history: List[Dict]) -> None:
+        self._history = [dict(h) for h in history][-self.max_history :]
+
     def reset(self) -> None:
         self._history.clear()
@@ -1,29 +1,342 @@
 import base64
+import hashlib
+import json
 import os
+import queue
+import re
+import statistics
+import threading
+import time
 from openai import OpenAI
 from dotenv import load_dotenv
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import fitz  
-from ai_file_ocr.pipeline.rewrite import code_rewrite, process_latex
+from ai_file_ocr.pipeline.dedup import render_thumbnail, text_signature
+from ai_file_ocr.pipeline.rendition import DISPLAY_DPI, MIME_TYPES, RENDITION_FORMAT, VisionInput, image_mime, render_page
+from ai_file_ocr.pipeline.rewrite import REWRITE_VERSION, tag_text
+
+# 미리 렌더링해 둘 페이지 수 (look-ahead 버퍼 크기)
+RENDER_PREFETCH = int(os.getenv("OCR_RENDER_PREFETCH", "2"))
+
+# 텍스트 레이어가 있는 페이지는 Vision 없이 로컬에서 처리
+TEXT_LAYER_ENABLED = os.getenv("OCR_TEXT_LAYER", "1") == "1"
+# 이보다 글자가 적으면 스캔본/그림 위주 페이지로 보고 Vision으로 보낸다
+TEXT_LAYER_MIN_CHARS = int(os.getenv("OCR_TEXT_LAYER_MIN_CHARS", "20"))
+# 페이지 면적 대비 삽입 이미지 면적이 이 비율을 넘으면 Vision
+TEXT_LAYER_MAX_IMAGE_RATIO = float(os.getenv("OCR_TEXT_LAYER_MAX_IMAGE_RATIO", "0.02"))
+# 벡터 도형(표 테두리, 도식 등)이 이보다 많으면 Vision
+TEXT_LAYER_MAX_DRAWINGS = int(os.getenv("OCR_TEXT_LAYER_MAX_DRAWINGS", "15"))
+
+# Vision으로 가는 페이지의 복잡도 판단 (cascade 모드에서 바로 상위 모델로 보낼지)
+# 삽입 이미지가 페이지의 이 비율을 넘으면 도식 위주 페이지
+COMPLEX_IMAGE_RATIO = float(os.getenv("OCR_COMPLEX_IMAGE_RATIO", "0.25"))
+# 벡터 도형이 이보다 많으면 표/도식
+COMPLEX_DRAWINGS = int(os.getenv("OCR_COMPLEX_DRAWINGS", "40"))
+# 고정폭 글꼴 줄이 이 이상이면 코드
+COMPLEX_CODE_LINES = 2
+
+# 빈 페이지 / 중복 페이지 감지용 썸네일 생성
+DEDUP_ENABLED = os.getenv("OCR_DEDUP", "1") == "1"
+
+# 수식 전용 폰트 → 텍스트 레이어로는 LaTeX 복원이 안 되므로 Vision
+MATH_FONT_PATTERN = re.compile(r"CMMI|CMSY|CMEX|MSBM|Math|Symbol", re.IGNORECASE)
+MONO_FONT_PATTERN = re.compile(r"Mono|Courier|Consolas|CMTT", re.IGNORECASE)
+BULLET_PATTERN = re.compile(r"^(?:[•▪●◦■□➢►▶‣∙·]\s*|[-–]\s+)")
+MONOSPACED_FLAG = 8
+
+_RENDER_DONE = object()
+
+
+@dataclass
+class PageAnalysis:
+    text: str          # callback으로 보낼 OCR 결과 (후처리 완료)
+    summary: str = ""  # ContextMemory용 mini-summary (없으면 별도 생성)
+
+
+@dataclass
+class PdfPage:
+    number: int
+    image: bytes                            # 학생용 페이지 이미지 (WebP/JPEG rendition)
+    local: Optional[PageAnalysis] = None    # 텍스트 레이어로 처리된 결과 (없으면 Vision 필요)
+    thumb: Optional[Any] = None             # 중복 비교용 흑백 썸네일 (np.ndarray)
+    mime: str = MIME_TYPES.get(RENDITION_FORMAT, "image/webp")
+    thumbnail: Optional[bytes] = None       # 목록용 작은 이미지
+    vision: Optional[VisionInput] = None    # Vision 입력 (해상도 / crop / detail 조정)
+    complexity: List[str] = field(default_factory=list)  # formula / code / table / figure / dense
+    density: str = "normal"                 # 글자 밀도 (sparse / normal / dense)
+    text_sig: Optional[str] = None          # 텍스트 레이어 해시 (중복 페이지 확인용)
+
+
+# Vision 입력: 인코딩된 이미지 bytes (학생용 rendition / 잘라낸 영역) 또는 rendition 정책으로 만든 VisionInput
+VisionImage = Union[bytes, VisionInput]
+
 
 #이미지 변환
-def pdf_to_images(pdf_bytes: bytes, dpi: int = 150) -> List[Tuple[int, bytes]]:
+def pdf_to_images(pdf_bytes: bytes, dpi: int = DISPLAY_DPI) -> List[Tuple[int, bytes]]:
+    """(페이지 번호, 학생용 rendition bytes) 목록. 형식은 OCR_RENDITION_FORMAT (기본 WebP)"""
+    return list(iter_pdf_images(pdf_bytes, dpi=dpi))
+
+
+def open_document(source: Union[str, bytes]) -> fitz.Document:
+    # 파일 경로면 디스크에서 필요한 만큼만 읽고, bytes면 메모리 스트림으로 연다
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def pdf_page_count(source: Union[str, bytes]) -> int:
+    pdf = open_document(source)
+    try:
+        return pdf.page_count
+    finally:
+        pdf.close()
+
+
+def iter_pdf_images(
+    source: Union[str, bytes],
+    dpi: int = DISPLAY_DPI,
+    prefetch: int = RENDER_PREFETCH,
+) -> Iterator[Tuple[int, bytes]]:
+    """pdf_to_images의 스트리밍 버전 (이미지 형식도 같다)"""
+    for page in iter_pdf_pages(source, dpi=dpi, prefetch=prefetch, text_layer=False, fingerprint=False):
+        yield page.number, page.image
+
+
+#이미지 변환 (스트리밍)
+def iter_pdf_pages(
+    source: Union[str, bytes],
+    dpi: int = DISPLAY_DPI,
+    prefetch: int = RENDER_PREFETCH,
+    text_layer: bool = TEXT_LAYER_ENABLED,
+    fingerprint: bool = DEDUP_ENABLED,
+    pages: Optional[Iterable[int]] = None,
+) -> Iterator[PdfPage]:
+    """
+    백그라운드 스레드에서 페이지를 하나씩 렌더링해 PdfPage로 넘긴다.
+    최대 prefetch 장만 메모리에 올려두므로, 소비자가 N페이지를 처리하는 동안
+    N+1페이지가 렌더링되고 페이지 수와 무관하게 메모리 사용량이 일정하다.
+    text_layer가 켜져 있으면 텍스트 레이어만으로 충분한 페이지는 local 결과를,
+    fingerprint가 켜져 있으면 중복 비교용 썸네일을 함께 담는다.
+    pages를 주면 해당 페이지 번호(1부터)만 그 순서대로 렌더링한다.
+    (PageScheduler처럼 순서가 바뀌는 iterable도 받는다)
+    """
+    buf: "queue.Queue" = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # 소비자가 중단하면 대기 중인 put도 빠져나온다
+        while not stop.is_set():
+            try:
+                buf.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def render():
+        try:
+            pdf = open_document(source)
+            try:
+                # pages는 렌더링 직전에 하나씩 꺼낸다 (스케줄러가 순서를 바꿀 수 있음)
+                numbers = pages if pages is not None else range(1, pdf.page_count + 1)
+                for page_num in numbers:
+                    if stop.is_set():
+                        break
+                    if not 1 <= page_num <= pdf.page_count:
+                        continue
+                    page = pdf[page_num - 1]
+                    local = extract_text_layer(page) if text_layer else None
+                    thumb = render_thumbnail(page) if fingerprint else None
+                    text_sig = text_signature(page) if fingerprint else None
+                    # 학생용 이미지 / 썸네일 / Vision 입력을 한 번의 래스터화로
+                    r = render_page(page, thumb, dpi=dpi)
+                    item = PdfPage(
+                        page_num, r.image, local, thumb,
+                        mime=r.mime, thumbnail=r.thumbnail, vision=r.vision,
+                        complexity=page_complexity(page, r.density) if local is None else [],
+                        density=r.density, text_sig=text_sig,
+                    )
+                    if not put(item):
+                        break
+            finally:
+                pdf.close()
+        except Exception as e:
+            put(e)
+        finally:
+            put(_RENDER_DONE)
+
+    worker = threading.Thread(target=render, name="pdf-render", daemon=True)
+    worker.start()
+
+    try:
+        while True:
+            item = buf.get()
+            if item is _RENDER_DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        worker.join(timeout=5)
+
+
+#텍스트 레이어 추출
+def _read_lines(page: fitz.Page) -> Tuple[List[dict], float]:
+    # 페이지의 텍스트 줄(폰트 정보 포함)과 삽입 이미지 면적
+    data = page.get_text("dict", sort=True)
+
+    lines: List[dict] = []
+    image_area = 0.0
+
+    for block in data.get("blocks", []):
+        if block.get("type") == 1:
+            x0, y0, x1, y1 = block["bbox"]
+            image_area += (x1 - x0) * (y1 - y0)
+            continue
+
+        for line in block.get("lines", []):
+            spans = [sp for sp in line.get("spans", []) if sp["text"].strip()]
+            if not spans:
+                continue
+
+            text = "".join(sp["text"] for sp in line["spans"])
+            lines.append(
+                {
+                    "text": text.strip(),
+                    "size": max(sp["size"] for sp in spans),
+                    "mono": all(
+                        sp["flags"] & MONOSPACED_FLAG or MONO_FONT_PATTERN.search(sp["font"])
+                        for sp in spans
+                    ),
+                    "math": any(MATH_FONT_PATTERN.search(sp["font"]) for sp in spans),
+                    # 인코딩이 깨진 텍스트 레이어
+                    "broken": "\ufffd" in text,
+                    "y0": line["bbox"][1],
+                }
+            )
+
+    return lines, image_area
 
-    pdf = fitz.open(stream=pdf_bytes, filetype="pdf")
-    pages: List[Tuple[int, bytes]] = []
 
-    for page_num, page in enumerate(pdf, start=1):
-        pix = page.get_pixmap(dpi=dpi)
-        img_bytes = pix.tobytes("png")
-        pages.append((page_num, img_bytes))
+def _text_lines(page: fitz.Page) -> Optional[List[dict]]:
+    """
+    텍스트 레이어만으로 처리할 수 있는 페이지의 텍스트 줄.
+    삽입 이미지/도형이 많거나 수식 폰트, 깨진 글자가 있으면 None (Vision 필요).
+    """
+    lines, image_area = _read_lines(page)
+    page_area = page.rect.width * page.rect.height
 
-    pdf.close()
-    return pages
+    if any(ln["math"] or ln["broken"] for ln in lines):
+        return None
+    if sum(len(ln["text"]) for ln in lines) < TEXT_LAYER_MIN_CHARS:
+        return None
+    if image_area > page_area * TEXT_LAYER_MAX_IMAGE_RATIO:
+        return None
+    if len(page.get_drawings()) > TEXT_LAYER_MAX_DRAWINGS:
+        return None
+
+    return lines
+
+
+def page_complexity(page: fitz.Page, density: str = "normal") -> List[str]:
+    """
+    Vision으로 보낼 페이지에 상위 모델이 필요한 요소가 있는지 텍스트 레이어로 미리 판단한다.
+    텍스트 레이어가 없는 페이지(스캔본)는 글자 밀도만 본다.
+    """
+    flags = []
+    try:
+        lines, image_area = _read_lines(page)
+        page_area = max(page.rect.width * page.rect.height, 1.0)
+        if any(ln["math"] for ln in lines):
+            flags.append("formula")
+        if sum(1 for ln in lines if ln["mono"]) >= COMPLEX_CODE_LINES:
+            flags.append("code")
+        if len(page.get_drawings()) > COMPLEX_DRAWINGS:
+            flags.append("table")
+        if image_area > page_area * COMPLEX_IMAGE_RATIO:
+            flags.append("figure")
+    except Exception as e:
+        print(f"[AI OCR] 페이지 복잡도 판단 실패: {e}")
+    if density == "dense":
+        flags.append("dense")
+    return flags
+
+
+def _split_title(page: fitz.Page, lines: List[dict]) -> Tuple[str, List[dict]]:
+    # 상단 30% 안에서 본문보다 큰 글씨 → 제목
+    median_size = statistics.median(ln["size"] for ln in lines)
+    top_limit = page.rect.y0 + page.rect.height * 0.3
+
+    candidates = [ln for ln in lines if ln["y0"] < top_limit and ln["size"] >= median_size * 1.2]
+    if not candidates:
+        return "", lines
+
+    title_size = max(ln["size"] for ln in candidates)
+    title_lines = [ln for ln in candidates if ln["size"] == title_size]
+    body = [ln for ln in lines if ln not in title_lines]
+    return " ".join(ln["text"] for ln in title_lines), body
+
+
+def page_title(page: fitz.Page) -> str:
+    # 문서 개요용 페이지 제목 (큰 글씨가 없으면 첫 줄)
+    lines, _ = _read_lines(page)
+    lines = [ln for ln in lines if not ln["broken"]]
+    if not lines:
+        return ""
+
+    title, _ = _split_title(page, lines)
+    return (title or lines[0]["text"])[:80]
+
+
+def extract_text_layer(page: fitz.Page) -> Optional[PageAnalysis]:
+    """
+    본문이 전부 텍스트인 페이지(PowerPoint/LaTeX 내보내기 등)는
+    텍스트 레이어에서 바로 섹션을 만들고 기존 수식/코드 후처리를 거친다.
+    그림/표/스캔본이 섞인 페이지는 None을 반환해 Vision으로 보낸다.
+    """
+    try:
+        lines = _text_lines(page)
+    except Exception as e:
+        print(f"[AI OCR] 텍스트 레이어 추출 실패: page={page.number + 1}, error={e}")
+        return None
+
+    if not lines:
+        return None
+
+    title, body_lines = _split_title(page, lines)
+
+    # 고정폭 글꼴 줄은 코드블록으로 묶는다
+    body: List[str] = []
+    code: List[str] = []
+    for ln in body_lines:
+        if ln["mono"]:
+            code.append(ln["text"])
+            continue
+        if code:
+            body.append("```\n" + "\n".join(code) + "\n```")
+            code = []
+        body.append(BULLET_PATTERN.sub("- ", ln["text"]))
+    if code:
+        body.append("```\n" + "\n".join(code) + "\n```")
+
+    sections = {"title": title, "body": "\n".join(body)}
+    text = _postprocess(render_sections(sections))
+
+    # 로컬 페이지는 mini-summary도 로컬에서 (제목 + 앞부분)
+    summary = " ".join([title] + [ln["text"] for ln in body_lines[:2]]).strip()[:200]
+
+    return PageAnalysis(text=text, summary=summary)
 
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 
+# 프롬프트 / 응답 스키마 / 섹션 조립·파싱·후처리(render_sections, parse_structured, _postprocess)를
+# 결과가 달라지게 고치면 올린다 (페이지 결과 캐시 키에 들어감)
+PROMPT_VERSION = "2"
+
 PROMPT_TEMPLATE = """
 너는 시각장애 대학생을 위한 강의 슬라이드 분석 도우미다.
 지금까지 분석된 페이지들의 문맥 요약은 다음과 같다:
@@ -62,36 +375,395 @@ PROMPT_TEMPLATE = """
 
 """
 
-def analyze_page_with_context(image_bytes: bytes, context: str) -> str:
+# 섹션 + mini-summary를 한 번의 Vision 호출로 받을지 여부 ("fused" | "separate")
+SUMMARY_MODE = os.getenv("OCR_SUMMARY_MODE", "fused")
+
+VISION_MODEL = "gpt-4o"
+
+# cascade 모드 (OCR_CASCADE=1로 켠다): 저렴한 모델이 먼저 분석하고, 복잡한 페이지나 자기 점검에서 걸린 페이지만 VISION_MODEL로
+# (구조화 출력을 쓰는 fused 모드에서만)
+CASCADE_ENABLED = os.getenv("OCR_CASCADE", "0") == "1" and SUMMARY_MODE == "fused"
+CASCADE_MODEL = os.getenv("OCR_CASCADE_MODEL", "gpt-4o-mini")
+# 저렴한 모델의 confidence가 이보다 낮으면 상위 모델로
+CASCADE_MIN_CONFIDENCE = float(os.getenv("OCR_CASCADE_MIN_CONFIDENCE", "0.75"))
+# 이 요소가 있으면 상위 모델로 (사전 판단 / 자기 점검 공통)
+CASCADE_ESCALATE_ON = set(
+    os.getenv("OCR_CASCADE_ESCALATE_ON", "formula,code,table,figure").split(",")
+)
+CONTENT_KINDS = ["formula", "code", "table", "figure"]
+
+# 연속된 페이지 여러 장을 한 번의 Vision 요청으로 (0이면 끔, 병렬 outline 모드에서만)
+VISION_BATCH_MAX = int(os.getenv("OCR_VISION_BATCH", "0"))
+# 글자 밀도별 한 요청에 넣을 페이지 수 (VISION_BATCH_MAX 이하)
+VISION_BATCH_SIZES = {"sparse": 4, "normal": 3, "dense": 2}
+
+# 구조화 출력의 섹션 키 → 기존 출력 형식의 섹션 제목
+SECTION_TITLES = [
+    ("title", "제목"),
+    ("body", "본문"),
+    ("image_description", "이미지 설명"),
+    ("table_graph", "표/그래프"),
+]
+
+STRUCTURED_OUTPUT_RULES = """
+출력 형식
+- 결과는 JSON으로만 출력한다.
+- sections: 위 네 섹션의 내용을 각 키에 넣는다. 섹션 제목([제목] 등)은 쓰지 않고, 내용이 없는 섹션은 빈 문자열로 둔다.
+- summary: 교안 전체의 흐름 파악을 돕는 이 페이지의 핵심 개념을 2~3줄로 짧고 명확하게 요약한다.
+"""
+
+PAGE_ANALYSIS_SCHEMA = {
+    "name": "page_analysis",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "sections": {
+                "type": "object",
+                "properties": {key: {"type": "string"} for key, _ in SECTION_TITLES},
+                "required": [key for key, _ in SECTION_TITLES],
+                "additionalProperties": False,
+            },
+            "summary": {"type": "string"},
+        },
+        "required": ["sections", "summary"],
+        "additionalProperties": False,
+    },
+}
+
+SELF_CHECK_RULES = """
+- self_check.contains: 이 페이지에 수식(formula), 코드(code), 표(table), 복잡한 도식/그래프(figure)가 있으면 해당 항목을 모두 넣는다.
+- self_check.confidence: 모든 내용을 빠짐없이 정확하게 읽었다고 확신하는 정도 (0~1). 글자가 작거나 흐려 확실하지 않으면 낮게 준다.
+"""
+
+# 저렴한 모델용: 결과 + 자기 점검
+CASCADE_SCHEMA = {
+    "name": "page_analysis_checked",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            **PAGE_ANALYSIS_SCHEMA["schema"]["properties"],
+            "self_check": {
+                "type": "object",
+                "properties": {
+                    "contains": {"type": "array", "items": {"type": "string", "enum": CONTENT_KINDS}},
+                    "confidence": {"type": "number"},
+                },
+                "required": ["contains", "confidence"],
+                "additionalProperties": False,
+            },
+        },
+        "required": ["sections", "summary", "self_check"],
+        "additionalProperties": False,
+    },
+}
+
+BATCH_RULES = """
+여러 페이지 이미지가 순서대로 주어진다. 각 이미지 바로 앞에 페이지 번호(p.번호)가 있다.
+페이지마다 따로 위 규칙을 적용하고, 페이지끼리 내용을 섞지 마라.
+- pages: 주어진 페이지마다 하나씩, page에 페이지 번호를 넣고 sections / summary를 위 형식대로 작성한다.
+"""
+
+
+def _batch_schema(page_schema: dict) -> dict:
+    # 페이지 하나의 스키마 → 여러 페이지 배열 스키마
+    page_item = {
+        "type": "object",
+        "properties": {"page": {"type": "integer"}, **page_schema["schema"]["properties"]},
+        "required": ["page"] + page_schema["schema"]["required"],
+        "additionalProperties": False,
+    }
+    return {
+        "name": page_schema["name"] + "_batch",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"pages": {"type": "array", "items": page_item}},
+            "required": ["pages"],
+            "additionalProperties": False,
+        },
+    }
+
+
+def _image_part(image: VisionImage) -> dict:
+    # VisionInput은 업로드된 URL(있으면) 또는 data URL + detail, bytes는 형식을 보고 data URL로
+    if isinstance(image, VisionInput):
+        return {
+            "type": "image_url",
+            "image_url": {"url": image.url or image.data_url(), "detail": image.detail},
+        }
+    img_b64 = base64.b64encode(image).decode("utf-8")
+    return {"type": "image_url", "image_url": {"url": f"data:{image_mime(image)};base64,{img_b64}"}}
+
+
+def _batch_messages(system_prompt: str, images: List[VisionImage], numbers: List[int]) -> list:
+    content = [{"type": "text", "text": "아래 페이지 이미지들을 분석해줘."}]
+    for number, image in zip(numbers, images):
+        content.append({"type": "text", "text": f"p.{number}"})
+        content.append(_image_part(image))
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": content},
+    ]
+
+
+def _vision_messages(system_prompt: str, image: VisionImage) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "아래 이미지를 분석해줘."},
+                _image_part(image),
+            ]
+        }
+    ]
+
+
+def _postprocess(raw: str) -> str:
+    # 수식 / 코드 태깅 (한 번의 스캔)
+    return tag_text(raw)
+
+
+def render_sections(sections: dict) -> str:
+    # 구조화 출력 → 기존 "[제목] ... [본문] ..." 텍스트 형식
+    parts = []
+    for key, title in SECTION_TITLES:
+        body = (sections.get(key) or "").strip()
+        if body:
+            parts.append(f"[{title}]\n{body}")
+    return "\n\n".join(parts)
+
+
+def analyze_page_with_context(image: VisionImage, context: str) -> str:
 
     print("⭐context:"+context)
     system_prompt = PROMPT_TEMPLATE.replace("{context}", context)
 
-    img_b64 = base64.b64encode(image_bytes).decode("utf-8")
-
     response = client.chat.completions.create(
-        model="gpt-4o",
+        model=VISION_MODEL,
         temperature=0.2,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "아래 이미지를 분석해줘."},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{img_b64}"
-                        }
-                    },
-                ]
-            }
-        ],
+        messages=_vision_messages(system_prompt, image),
     )
 
     raw = response.choices[0].message.content.strip()
     print("🔥🔥전처리 전 코드:" +  raw)
-    clean = process_latex(raw)
-    clean = code_rewrite(clean)
 
-    return clean
+    return _postprocess(raw)
+
+
+def _structured_body(
+    system_prompt: str,
+    image: VisionImage,
+    model: str = VISION_MODEL,
+    schema: dict = PAGE_ANALYSIS_SCHEMA,
+) -> dict:
+    return {
+        "model": model,
+        "temperature": 0.2,
+        "messages": _vision_messages(system_prompt, image),
+        "response_format": {"type": "json_schema", "json_schema": schema},
+    }
+
+
+def parse_structured(raw: str) -> Tuple[PageAnalysis, Dict]:
+    # JSON 파싱에 실패하면 응답 전체를 본문으로 쓰고 summary는 비워 둔다
+    try:
+        data = json.loads(raw)
+        text = render_sections(data.get("sections") or {})
+        summary = (data.get("summary") or "").strip()
+    except (ValueError, AttributeError):
+        data, text, summary = {}, raw, ""
+
+    return PageAnalysis(text=_postprocess(text), summary=summary), data
+
+
+def page_request_body(image: VisionImage, context: str) -> dict:
+    # 한 페이지 분석 요청 본문 (fused 구조화 출력, batch API 등 지연 처리용)
+    system_prompt = PROMPT_TEMPLATE.replace("{context}", context) + STRUCTURED_OUTPUT_RULES
+    return _structured_body(system_prompt, image)
+
+
+def _structured_request(
+    system_prompt: str,
+    image: VisionImage,
+    model: str = VISION_MODEL,
+    schema: dict = PAGE_ANALYSIS_SCHEMA,
+) -> Tuple[PageAnalysis, Dict]:
+    response = client.chat.completions.create(**_structured_body(system_prompt, image, model, schema))
+
+    raw = (response.choices[0].message.content or "").strip()
+    return parse_structured(raw)
+
+
+def _structured_call(system_prompt: str, image: VisionImage) -> PageAnalysis:
+    analysis, _ = _structured_request(system_prompt, image)
+    return analysis
+
+
+def analyze_page_structured(image: VisionImage, context: str) -> PageAnalysis:
+    # 섹션과 mini-summary를 한 번의 호출로 받는다
+    system_prompt = PROMPT_TEMPLATE.replace("{context}", context) + STRUCTURED_OUTPUT_RULES
+    return _structured_call(system_prompt, image)
+
+
+DELTA_RULES = """
+이 페이지는 직전 페이지에 일부 내용이 추가되거나 바뀐 페이지이다.
+직전 페이지의 분석 결과는 다음과 같다:
+
+{previous}
+
+아래 이미지는 이 페이지에서 바뀐 영역만 잘라낸 것이다.
+직전 페이지 결과에 이 영역의 내용을 반영하여, 이 페이지 전체의 결과를 위 규칙과 같은 섹션 구성으로 작성하라.
+"""
+
+
+def analyze_page_delta(region_bytes: bytes, previous_text: str, context: str) -> PageAnalysis:
+    """
+    빌드 애니메이션처럼 직전 페이지와 일부만 다른 페이지:
+    바뀐 영역 이미지 + 직전 페이지 결과만 보내 페이지 전체 결과를 받는다.
+    """
+    system_prompt = (
+        PROMPT_TEMPLATE.replace("{context}", context)
+        + DELTA_RULES.replace("{previous}", previous_text)
+        + STRUCTURED_OUTPUT_RULES
+    )
+    return _structured_call(system_prompt, region_bytes)
+
+
+def analyze_page(image: VisionImage, context: str) -> PageAnalysis:
+    if SUMMARY_MODE == "fused":
+        return analyze_page_structured(image, context)
+    return PageAnalysis(text=analyze_page_with_context(image, context))
+
+
+@dataclass
+class Route:
+    model: str             # 최종 결과를 만든 모델
+    reason: str            # 라우팅 근거 (precheck:formula / self-check:table / confidence:0.52 / accepted)
+    escalated: bool = False
+    cheap_seconds: float = 0.0
+    seconds: float = 0.0
+
+
+def analyze_page_cascade(image: VisionImage, context: str, complexity: List[str]) -> Tuple[PageAnalysis, Route]:
+    """
+    1) 사전 판단(텍스트 레이어 / 글자 밀도)에서 복잡한 요소가 있으면 바로 VISION_MODEL
+    2) 아니면 CASCADE_MODEL이 분석 + 자기 점검, 수식/코드/표/도식이 보이거나 확신이 낮으면 VISION_MODEL로 다시 분석
+    """
+    start = time.time()
+    flagged = [flag for flag in complexity if flag in CASCADE_ESCALATE_ON]
+    if flagged:
+        analysis = analyze_page_structured(image, context)
+        return analysis, Route(VISION_MODEL, "precheck:" + ",".join(flagged), seconds=time.time() - start)
+
+    system_prompt = (
+        PROMPT_TEMPLATE.replace("{context}", context) + STRUCTURED_OUTPUT_RULES + SELF_CHECK_RULES
+    )
+    analysis, data = _structured_request(system_prompt, image, model=CASCADE_MODEL, schema=CASCADE_SCHEMA)
+    cheap_seconds = time.time() - start
+
+    check = data.get("self_check") or {}
+    contains = [kind for kind in check.get("contains") or [] if kind in CASCADE_ESCALATE_ON]
+    confidence = float(check.get("confidence", 0.0) or 0.0)
+
+    if contains:
+        reason = "self-check:" + ",".join(contains)
+    elif confidence < CASCADE_MIN_CONFIDENCE:
+        reason = f"confidence:{confidence:.2f}"
+    else:
+        route = Route(CASCADE_MODEL, f"accepted:{confidence:.2f}", cheap_seconds=cheap_seconds, seconds=cheap_seconds)
+        return analysis, route
+
+    analysis = analyze_page_structured(image, context)
+    return analysis, Route(
+        VISION_MODEL, reason, escalated=True, cheap_seconds=cheap_seconds, seconds=time.time() - start
+    )
+
+
+def batch_size_for(page: "PdfPage") -> int:
+    # 복잡한 요소가 있는 페이지는 단독으로, 글자가 적을수록 많이 묶는다
+    if VISION_BATCH_MAX < 2 or any(flag in CASCADE_ESCALATE_ON for flag in page.complexity):
+        return 1
+    return min(VISION_BATCH_SIZES.get(page.density, 2), VISION_BATCH_MAX)
+
+
+def analyze_pages_batch(
+    images: List[VisionImage],
+    numbers: List[int],
+    context: str,
+    page_contexts: Optional[Dict[int, str]] = None,
+) -> Dict[int, Tuple[PageAnalysis, Route]]:
+    """
+    연속된 페이지 여러 장을 한 번에 보내 페이지별 섹션을 받는다 (긴 프롬프트 / 요청 오버헤드를 한 번만).
+    cascade 모드면 CASCADE_MODEL로 보내고, 자기 점검에서 걸린 페이지만 VISION_MODEL로 다시 분석한다.
+    응답에 빠진 페이지는 결과에 넣지 않는다 (호출한 쪽에서 페이지 단위로 다시 처리).
+    """
+    start = time.time()
+    model = CASCADE_MODEL if CASCADE_ENABLED else VISION_MODEL
+    page_schema = CASCADE_SCHEMA if CASCADE_ENABLED else PAGE_ANALYSIS_SCHEMA
+    rules = STRUCTURED_OUTPUT_RULES + (SELF_CHECK_RULES if CASCADE_ENABLED else "") + BATCH_RULES
+    system_prompt = PROMPT_TEMPLATE.replace("{context}", context) + rules
+
+    response = client.chat.completions.create(
+        model=model,
+        temperature=0.2,
+        messages=_batch_messages(system_prompt, images, numbers),
+        response_format={"type": "json_schema", "json_schema": _batch_schema(page_schema)},
+    )
+    raw = (response.choices[0].message.content or "").strip()
+    batch_seconds = time.time() - start
+
+    items = {}
+    try:
+        for item in json.loads(raw).get("pages") or []:
+            if item.get("page") in numbers:
+                items[item["page"]] = item
+    except (ValueError, AttributeError):
+        print(f"[AI OCR] batch 응답 파싱 실패: pages={numbers}")
+
+    results: Dict[int, Tuple[PageAnalysis, Route]] = {}
+    for number, image in zip(numbers, images):
+        item = items.get(number)
+        if item is None:
+            continue
+        analysis = PageAnalysis(
+            text=_postprocess(render_sections(item.get("sections") or {})),
+            summary=(item.get("summary") or "").strip(),
+        )
+        if not CASCADE_ENABLED:
+            results[number] = (analysis, Route(model, f"batch:{len(numbers)}", seconds=batch_seconds))
+            continue
+
+        check = item.get("self_check") or {}
+        contains = [kind for kind in check.get("contains") or [] if kind in CASCADE_ESCALATE_ON]
+        confidence = float(check.get("confidence", 0.0) or 0.0)
+        if not contains and confidence >= CASCADE_MIN_CONFIDENCE:
+            route = Route(model, f"batch:{len(numbers)},accepted:{confidence:.2f}",
+                          cheap_seconds=batch_seconds, seconds=batch_seconds)
+            results[number] = (analysis, route)
+            continue
+
+        reason = "self-check:" + ",".join(contains) if contains else f"confidence:{confidence:.2f}"
+        t = time.time()
+        analysis = analyze_page_structured(image, (page_contexts or {}).get(number, context))
+        results[number] = (
+            analysis,
+            Route(VISION_MODEL, f"batch:{len(numbers)},{reason}", escalated=True,
+                  cheap_seconds=batch_seconds, seconds=batch_seconds + time.time() - t),
+        )
+
+    return results
+
+
+# 캐시된 PageAnalysis를 바꿀 수 있는 입력: 손으로 올리는 프롬프트 / 태깅 버전 + 결과에 영향을 주는 설정값
+CACHE_VERSION = f"p{PROMPT_VERSION}.r{REWRITE_VERSION}." + hashlib.sha256(
+    json.dumps(
+        [SUMMARY_MODE, CASCADE_MIN_CONFIDENCE, sorted(CASCADE_ESCALATE_ON), VISION_BATCH_MAX, VISION_BATCH_SIZES],
+        sort_keys=True,
+    ).encode("utf-8")
+).hexdigest()[:8]
+
+# 결과를 만든 모델 구성 (cascade 결과와 단일 모델 결과는 캐시를 나눈다)
+MODEL_KEY = f"cascade:{CASCADE_MODEL}>{VISION_MODEL}" if CASCADE_ENABLED else VISION_MODEL
@@ -0,0 +1,259 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+from ai_file_ocr.redis_client import redis_client
+from ai_file_ocr.pipeline.cancel import DocumentCancelled, is_cancelled, mark_cancelled
+
+# 한 번에 보내는 페이지 수 / 모아 보내는 간격 (초)
+OUTBOX_BATCH_SIZE = int(os.getenv("OCR_OUTBOX_BATCH_SIZE", "10"))
+OUTBOX_FLUSH_SEC = float(os.getenv("OCR_OUTBOX_FLUSH_SEC", "1.0"))
+# 전송 실패 시 재시도 대기 (초, 실패할 때마다 2배)
+OUTBOX_RETRY_BASE = 1.0
+OUTBOX_RETRY_MAX = 60.0
+# 작업 종료 시 남은 항목 전송 시도 횟수 (그래도 남으면 drain task가 이어서 보냄)
+OUTBOX_CLOSE_ATTEMPTS = 3
+OUTBOX_TTL = int(os.getenv("OCR_OUTBOX_TTL", str(7 * 24 * 3600)))
+
+
+def outbox_key(doc_id: int, owner: str = "") -> str:
+    # fan-out subtask마다 따로 (자기 페이지만 보내고 전달 기록을 남기도록)
+    return f"ocr:outbox:{doc_id}:{owner}" if owner else f"ocr:outbox:{doc_id}"
+
+
+def _index_key(doc_id: int) -> str:
+    # 문서의 outbox key 목록 (취소 시 한꺼번에 지운다)
+    return f"ocr:outboxes:{doc_id}"
+
+
+def dead_letter_key(doc_id: int) -> str:
+    # 백엔드가 거절한 (다시 보내도 소용없는) 항목 보관
+    return f"ocr:outbox-dead:{doc_id}"
+
+
+def delete_outboxes(doc_id: int) -> None:
+    keys = redis_client.smembers(_index_key(doc_id)) or set()
+    redis_client.delete(outbox_key(doc_id), *keys, _index_key(doc_id))
+
+
+def bulk_callback_url(callback_url: str) -> str:
+    # .../docs/{id}/ocr-callback/ → .../docs/{id}/ocr-callback/bulk/
+    return callback_url.rstrip("/") + "/bulk/"
+
+
+# 백엔드가 문서가 없을 때 돌려주는 오류 코드 (lecture_docs.views.DOC_NOT_FOUND)
+DOC_NOT_FOUND = "doc_not_found"
+
+
+def _doc_not_found(resp) -> bool:
+    # 404만으로는 문서 삭제인지 (잘못된 주소 / 프록시 오류 등) 알 수 없어 응답 본문의 코드로 확인한다
+    try:
+        body = resp.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get("code") == DOC_NOT_FOUND
+
+
+def _post_bulk(callback_url: str, doc_id: int, items: List[dict]) -> Optional[List[int]]:
+    """
+    페이지 결과를 bulk callback으로 보내고 백엔드가 거절한 페이지 번호를 돌려준다.
+    일시적인 실패(연결 오류, 5xx, 문서 없음 코드가 없는 404)는 None (다음 flush에서 다시),
+    그 외 4xx는 묶음 전체를 거절로 본다.
+    """
+    t = time.time()
+    numbers = [item["page_number"] for item in items]
+    rejected: Optional[List[int]] = None
+    try:
+        resp = requests.post(
+            bulk_callback_url(callback_url),
+            json={
+                "doc_id": doc_id,
+                "pages": [
+                    {
+                        "page_number": item["page_number"],
+                        "image_url": item["image_url"],
+                        "thumbnail_url": item.get("thumbnail_url"),
+                        "ocr_text": item["ocr_text"],
+                    }
+                    for item in items
+                ],
+            },
+            timeout=30,
+        )
+        if resp.status_code == 404:
+            # 문서가 이미 삭제됨 → 더 보낼 필요 없음
+            if _doc_not_found(resp):
+                raise DocumentCancelled(doc_id)
+            resp.raise_for_status()
+        if 400 <= resp.status_code < 500:
+            print(f"[AI OCR] bulk callback 거절: doc={doc_id}, pages={numbers}, status={resp.status_code}")
+            rejected = numbers
+        else:
+            resp.raise_for_status()
+            try:
+                body = resp.json()
+            except ValueError:
+                body = {}
+            rejected = [n for n in (body.get("rejected") or []) if n in numbers]
+            if rejected:
+                print(f"[AI OCR] bulk callback 일부 거절: doc={doc_id}, pages={rejected}")
+    except DocumentCancelled:
+        raise
+    except Exception as e:
+        print(f"[AI OCR] bulk callback 실패: doc={doc_id}, pages={numbers}, error={e}")
+    print(f"[TIME] Bulk callback POST (pages {numbers}): {time.time() - t:.2f} sec")
+    return rejected
+
+
+def flush_outbox(
+    doc_id: int,
+    on_delivered: Optional[Callable[[List[int]], None]] = None,
+    owner: str = "",
+) -> bool:
+    """
+    outbox에 쌓인 페이지를 OUTBOX_BATCH_SIZE씩 묶어 bulk callback으로 보낸다.
+    전송된 항목만 지우므로, 실패한 묶음은 다음 flush에서 다시 보낸다 (뒤 묶음은 계속 보냄).
+    백엔드가 거절한 항목은 dead letter로 옮기고 전달 완료로 치지 않는다.
+    모두 보냈으면 True. 문서가 삭제되어 취소된 경우 남은 항목은 버리고 True.
+    """
+    key = outbox_key(doc_id, owner)
+    if is_cancelled(doc_id):
+        redis_client.delete(key)
+        return True
+    entries = redis_client.hgetall(key)
+    if not entries:
+        return True
+
+    items = sorted((json.loads(v) for v in entries.values()), key=lambda item: item["page_number"])
+    by_url: Dict[str, List[dict]] = {}
+    for item in items:
+        by_url.setdefault(item["callback_url"], []).append(item)
+
+    ok = True
+    for callback_url, url_items in by_url.items():
+        for start in range(0, len(url_items), OUTBOX_BATCH_SIZE):
+            batch = url_items[start:start + OUTBOX_BATCH_SIZE]
+            try:
+                rejected = _post_bulk(callback_url, doc_id, batch)
+            except DocumentCancelled:
+                print(f"[AI OCR] doc={doc_id} 백엔드에 문서가 없음 → 작업 취소")
+                mark_cancelled(doc_id)
+                redis_client.delete(key)
+                return True
+            if rejected is None:
+                ok = False
+                continue
+
+            numbers = [item["page_number"] for item in batch]
+            pipe = redis_client.pipeline()
+            if rejected:
+                dead = dead_letter_key(doc_id)
+                pipe.hset(dead, mapping={
+                    str(item["page_number"]): json.dumps(item, ensure_ascii=False)
+                    for item in batch if item["page_number"] in rejected
+                })
+                pipe.expire(dead, OUTBOX_TTL)
+            pipe.hdel(key, *[str(n) for n in numbers])
+            pipe.execute()
+
+            delivered = [n for n in numbers if n not in rejected]
+            if delivered and on_delivered is not None:
+                on_delivered(delivered)
+    return ok
+
+
+class CallbackOutbox:
+    """
+    페이지 결과를 Redis(outbox)에 먼저 기록하고, 백그라운드 스레드가 모아서 bulk callback으로 보낸다.
+    - 기록된 결과는 워커가 죽거나 백엔드가 잠시 응답하지 않아도 남아 있다.
+    - 실패하면 지수 백오프로 다시 보내고, 작업이 끝날 때까지 못 보낸 항목은 drain task가 이어서 보낸다.
+    """
+
+    def __init__(
+        self,
+        doc_id: int,
+        callback_url: str,
+        on_delivered: Optional[Callable[[List[int]], None]] = None,
+        owner: str = "",
+    ):
+        self.doc_id = doc_id
+        self.callback_url = callback_url
+        self.owner = owner
+        self.key = outbox_key(doc_id, owner)
+        self.on_delivered = on_delivered
+        self.batches = 0
+
+        self._added = 0
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="ocr-outbox", daemon=True)
+        self._thread.start()
+
+    def add(
+        self,
+        page_number: int,
+        image_url: Optional[str],
+        ocr_text: str,
+        thumbnail_url: Optional[str] = None,
+    ) -> None:
+        item = {
+            "callback_url": self.callback_url,
+            "page_number": page_number,
+            "image_url": image_url,
+            "thumbnail_url": thumbnail_url,
+            "ocr_text": ocr_text,
+        }
+        pipe = redis_client.pipeline()
+        pipe.hset(self.key, str(page_number), json.dumps(item, ensure_ascii=False))
+        pipe.expire(self.key, OUTBOX_TTL)
+        pipe.sadd(_index_key(self.doc_id), self.key)
+        pipe.expire(_index_key(self.doc_id), OUTBOX_TTL)
+        pipe.execute()
+
+        self._added += 1
+        if self._added % OUTBOX_BATCH_SIZE == 0:
+            self._wake.set()
+
+    def _flush(self) -> bool:
+        try:
+            ok = flush_outbox(self.doc_id, self._delivered, self.owner)
+        except Exception as e:
+            print(f"[AI OCR] outbox 처리 실패: doc={self.doc_id}, error={e}")
+            ok = False
+        return ok
+
+    def _delivered(self, page_numbers: List[int]) -> None:
+        self.batches += 1
+        if self.on_delivered is not None:
+            self.on_delivered(page_numbers)
+
+    def _loop(self) -> None:
+        delay = OUTBOX_FLUSH_SEC
+        while not self._closed.is_set():
+            self._wake.wait(timeout=delay)
+            self._wake.clear()
+            if self._closed.is_set():
+                break
+            if self._flush():
+                delay = OUTBOX_FLUSH_SEC
+            else:
+                delay = min(max(delay, OUTBOX_RETRY_BASE) * 2, OUTBOX_RETRY_MAX)
+
+    def close(self) -> bool:
+        # 남은 항목을 보내고, 끝내 못 보냈으면 False (항목은 outbox에 남는다)
+        self._closed.set()
+        self._wake.set()
+        self._thread.join()
+
+        delay = OUTBOX_RETRY_BASE
+        for attempt in range(OUTBOX_CLOSE_ATTEMPTS):
+            if self._flush():
+                return True
+            if attempt < OUTBOX_CLOSE_ATTEMPTS - 1:
+                time.sleep(delay)
+                delay *= 2
+        return False
@@ -0,0 +1,113 @@
+import base64
+import os
+from typing import List, Tuple, Union
+
+import fitz
+
+from ai_file_ocr.pipeline.ocr import client, open_document, page_title
+
+# 제목을 찾은 페이지 비율이 이보다 낮으면 저해상도 개요 호출로 대신한다
+OUTLINE_MIN_TITLE_RATIO = float(os.getenv("OCR_OUTLINE_MIN_TITLE_RATIO", "0.3"))
+OUTLINE_MAX_CHARS = 4000
+# 개요 호출에 보낼 최대 페이지 수 (고르게 샘플링)
+OUTLINE_OVERVIEW_PAGES = 20
+OUTLINE_OVERVIEW_DPI = 40
+OUTLINE_MODEL = "gpt-4o-mini"
+
+OVERVIEW_PROMPT = """
+다음은 강의 교안의 여러 페이지를 작은 이미지로 나열한 것이다. 각 이미지 앞에 페이지 번호가 있다.
+교안 전체의 흐름을 파악할 수 있도록 페이지별 주제를 한 줄씩 정리한 개요를 작성하라.
+형식: p.번호 - 주제
+"""
+
+
+def _toc_outline(toc: list) -> str:
+    lines = []
+    for level, title, page in toc:
+        title = (title or "").strip()
+        if title:
+            lines.append(f"{'  ' * (level - 1)}- {title} (p.{page})")
+    return "\n".join(lines)
+
+
+def _titles_outline(titles: List[Tuple[int, str]]) -> str:
+    # 같은 제목이 이어지는 페이지는 범위로 묶는다 (p.3-5 - 제목)
+    lines = []
+    start = prev = None
+    current = ""
+    for number, title in titles + [(None, None)]:
+        if title == current and number is not None and prev is not None and number == prev + 1:
+            prev = number
+            continue
+        if current:
+            span = f"p.{start}" if start == prev else f"p.{start}-{prev}"
+            lines.append(f"{span} - {current}")
+        start = prev = number
+        current = title
+    return "\n".join(lines)
+
+
+def _overview_outline(pdf: fitz.Document) -> str:
+    total = pdf.page_count
+    step = max(1, -(-total // OUTLINE_OVERVIEW_PAGES))
+    numbers = list(range(1, total + 1, step))[:OUTLINE_OVERVIEW_PAGES]
+
+    content = [{"type": "text", "text": "교안 페이지 목록"}]
+    for number in numbers:
+        pix = pdf[number - 1].get_pixmap(dpi=OUTLINE_OVERVIEW_DPI)
+        img_b64 = base64.b64encode(pix.tobytes("jpg", jpg_quality=60)).decode("utf-8")
+        content.append({"type": "text", "text": f"p.{number}"})
+        content.append(
+            {
+                "type": "image_url",
+                "image_url": {"url": f"data:image/jpeg;base64,{img_b64}", "detail": "low"},
+            }
+        )
+
+    try:
+        response = client.chat.completions.create(
+            model=OUTLINE_MODEL,
+            temperature=0.1,
+            messages=[
+                {"role": "system", "content": OVERVIEW_PROMPT},
+                {"role": "user", "content": content},
+            ],
+        )
+        return (response.choices[0].message.content or "").strip()
+    except Exception as e:
+        # 개요가 없어도 페이지 분석은 진행한다
+        print(f"[AI OCR] 문서 개요 생성 실패: {e}")
+        return ""
+
+
+def build_outline(source: Union[str, bytes]) -> str:
+    """
+    페이지를 서로 독립적으로 분석할 수 있도록 문서 전체 개요를 한 번 만든다.
+    1) PDF 목차(TOC) 2) 텍스트 레이어의 페이지 제목 3) 저해상도 개요 호출 순으로 시도한다.
+    """
+    pdf = open_document(source)
+    try:
+        total = pdf.page_count
+        toc = pdf.get_toc(simple=True)
+
+        if toc:
+            outline = _toc_outline(toc)
+        else:
+            titles = [(number, page_title(page)) for number, page in enumerate(pdf, start=1)]
+            found = [(number, title) for number, title in titles if title]
+            if found and len(found) >= total * OUTLINE_MIN_TITLE_RATIO:
+                outline = _titles_outline(found)
+            else:
+                outline = _overview_outline(pdf)
+    finally:
+        pdf.close()
+
+    if not outline:
+        outline = "(개요 없음)"
+
+    return f"[문서 개요] (총 {total}쪽)\n{outline[:OUTLINE_MAX_CHARS]}"
+
+
+def outline_context(outline: str, page_number: Union[int, str]) -> str:
+    # page_number는 여러 페이지를 함께 분석할 때 "3~5" 같은 범위도 된다
+    return f"{outline}\n\n지금 분석할 페이지: {page_number}쪽"
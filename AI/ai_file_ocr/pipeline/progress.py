@@ -0,0 +1,102 @@
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+from ai_file_ocr.redis_client import redis_client
+from ai_file_ocr.pipeline.ocr import PageAnalysis
+
+# 진행 기록 보관 기간 (완료되면 바로 지운다)
+PROGRESS_TTL = int(os.getenv("OCR_PROGRESS_TTL", str(7 * 24 * 3600)))
+
+
+def progress_key(doc_id: int, pdf_sha256: str) -> str:
+    return f"ocr:progress:{doc_id}:{pdf_sha256}"
+
+
+def clear_doc_progress(doc_id: int) -> None:
+    # 문서 취소 시: PDF 해시와 관계없이 이 문서의 진행 기록을 모두 지운다
+    try:
+        keys = list(redis_client.scan_iter(match=progress_key(doc_id, "*")))
+        if keys:
+            redis_client.delete(*keys)
+    except Exception as e:
+        print(f"[AI OCR] 진행 기록 삭제 실패: doc={doc_id}, error={e}")
+
+
+class DocProgress:
+    """
+    문서별 OCR 진행 기록 (Redis hash, 문서 id + PDF 해시 단위).
+    - page:{n}      분석이 끝난 페이지 결과 (text, summary)
+    - delivered:{n} callback까지 전달된 페이지
+    - memory        rolling 모드의 ContextMemory 스냅샷
+    - outline       문서 개요
+    재시도/재시작된 작업은 전달된 페이지는 건너뛰고, 분석만 끝난 페이지는 Vision 없이 전달만 다시 한다.
+    Redis 오류는 OCR 자체를 막지 않도록 로그만 남긴다.
+    """
+
+    def __init__(self, doc_id: int, pdf_sha256: str):
+        self.key = progress_key(doc_id, pdf_sha256)
+        self.pages: Dict[int, PageAnalysis] = {}
+        self.delivered = set()
+        self.memory: List[dict] = []
+        self.outline: Optional[str] = None
+
+    def _hset(self, field: str, value: str) -> None:
+        try:
+            pipe = redis_client.pipeline()
+            pipe.hset(self.key, field, value)
+            pipe.expire(self.key, PROGRESS_TTL)
+            pipe.execute()
+        except Exception as e:
+            print(f"[AI OCR] 진행 기록 저장 실패: {self.key} {field}, error={e}")
+
+    def load(self, page_numbers: Optional[Iterable[int]] = None) -> "DocProgress":
+        """
+        page_numbers를 주면 그 페이지의 기록만 HMGET으로 읽어 더한다
+        (fan-out subtask가 문서 전체 기록을 매번 읽지 않도록). 없으면 전체를 읽는다.
+        """
+        try:
+            if page_numbers is None:
+                data = redis_client.hgetall(self.key)
+            else:
+                fields = [f"{name}:{n}" for n in page_numbers for name in ("page", "delivered")]
+                values = redis_client.hmget(self.key, fields) if fields else []
+                data = {f: v for f, v in zip(fields, values) if v is not None}
+        except Exception as e:
+            print(f"[AI OCR] 진행 기록 조회 실패: {self.key}, error={e}")
+            data = {}
+
+        for field, value in data.items():
+            name, _, number = field.partition(":")
+            if name == "page":
+                item = json.loads(value)
+                self.pages[int(number)] = PageAnalysis(text=item["text"], summary=item["summary"])
+            elif name == "delivered":
+                self.delivered.add(int(number))
+            elif name == "memory":
+                self.memory = json.loads(value)
+            elif name == "outline":
+                self.outline = value
+        return self
+
+    def save_page(self, page_number: int, analysis: PageAnalysis) -> None:
+        self._hset(
+            f"page:{page_number}",
+            json.dumps({"text": analysis.text, "summary": analysis.summary}, ensure_ascii=False),
+        )
+
+    def mark_delivered(self, page_number: int) -> None:
+        self._hset(f"delivered:{page_number}", "1")
+
+    def save_memory(self, history: List[dict]) -> None:
+        self._hset("memory", json.dumps(history, ensure_ascii=False))
+
+    def save_outline(self, outline: str) -> None:
+        self.outline = outline
+        self._hset("outline", outline)
+
+    def clear(self) -> None:
+        try:
+            redis_client.delete(self.key)
+        except Exception as e:
+            print(f"[AI OCR] 진행 기록 삭제 실패: {self.key}, error={e}")
@@ -0,0 +1,166 @@
+import base64
+import io
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import fitz
+import numpy as np
+from PIL import Image
+
+from ai_file_ocr.pipeline.dedup import render_thumbnail
+
+# 학생용 페이지 이미지: "webp" | "jpeg" | "png"(기존 방식)
+RENDITION_FORMAT = os.getenv("OCR_RENDITION_FORMAT", "webp")
+DISPLAY_DPI = int(os.getenv("OCR_DISPLAY_DPI", "150"))
+DISPLAY_QUALITY = int(os.getenv("OCR_DISPLAY_QUALITY", "80"))
+# 목록/미리보기용 썸네일 가로 크기 (px)
+THUMBNAIL_WIDTH = int(os.getenv("OCR_THUMBNAIL_WIDTH", "320"))
+
+# Vision 입력: 글자 밀도에 따라 해상도 / detail을 고른다
+VISION_SPARSE_DPI = 100
+VISION_QUALITY = 90
+# 학생용 이미지를 그대로 보낼 때 base64 대신 업로드된 URL 사용 (버킷이 공개 읽기일 때)
+VISION_USE_URL = os.getenv("OCR_VISION_USE_URL", "1") == "1"
+# 글자 수 / 페이지 면적(inch²) 기준 (텍스트 레이어가 있을 때)
+SPARSE_CHARS_PER_INCH2 = float(os.getenv("OCR_SPARSE_CHARS_PER_INCH2", "3"))
+DENSE_CHARS_PER_INCH2 = float(os.getenv("OCR_DENSE_CHARS_PER_INCH2", "15"))
+# 잉크(배경과 다른 픽셀) 비율 기준 (텍스트 레이어가 없을 때)
+SPARSE_INK_RATIO = 0.03
+DENSE_INK_RATIO = 0.15
+INK_THRESHOLD = 32
+# 내용 영역이 페이지의 이 비율보다 작을 때만 여백을 잘라낸다
+CROP_MAX_AREA = 0.85
+CROP_MARGIN = 0.02
+
+MIME_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+
+
+def image_mime(data: bytes) -> str:
+    # 인코딩된 이미지의 앞부분으로 MIME 판별 (모르면 PNG로 본다)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return MIME_TYPES["webp"]
+    if data[:3] == b"\xff\xd8\xff":
+        return MIME_TYPES["jpeg"]
+    return MIME_TYPES["png"]
+
+
+@dataclass
+class VisionInput:
+    data: bytes
+    mime: str
+    detail: str                  # "low" | "high"
+    reuse_display: bool = False  # 학생용 이미지와 같음 → 업로드된 URL로 보낼 수 있음
+    url: Optional[str] = None
+
+    def data_url(self) -> str:
+        return f"data:{self.mime};base64,{base64.b64encode(self.data).decode('utf-8')}"
+
+
+@dataclass
+class PageRendition:
+    image: bytes                # 학생용 페이지 이미지
+    mime: str
+    thumbnail: bytes            # 목록용 작은 이미지 (같은 형식)
+    vision: VisionInput
+    density: str                # "sparse" | "normal" | "dense"
+
+
+def encode_image(img: Image.Image, fmt: str, quality: int) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "png":
+        img.save(buf, format="PNG", optimize=False)
+    elif fmt == "jpeg":
+        img.save(buf, format="JPEG", quality=quality, optimize=True)
+    else:
+        img.save(buf, format="WEBP", quality=quality, method=4)
+    return buf.getvalue()
+
+
+def _ink_mask(thumb: np.ndarray) -> np.ndarray:
+    # 가장자리 픽셀의 중앙값을 배경색으로 보고, 배경과 다른 픽셀을 잉크로 본다
+    border = np.concatenate([thumb[0], thumb[-1], thumb[:, 0], thumb[:, -1]])
+    background = float(np.median(border))
+    return np.abs(thumb.astype(np.int16) - background) > INK_THRESHOLD
+
+
+def text_density(page: fitz.Page, thumb: np.ndarray) -> str:
+    chars = len("".join(page.get_text("text").split()))
+    if chars:
+        area = max(page.rect.width * page.rect.height / (72 * 72), 1.0)
+        per_inch2 = chars / area
+        if per_inch2 < SPARSE_CHARS_PER_INCH2:
+            return "sparse"
+        return "dense" if per_inch2 > DENSE_CHARS_PER_INCH2 else "normal"
+
+    # 스캔본 / 그림 위주 페이지는 썸네일의 잉크 비율로 판단
+    ink = float(_ink_mask(thumb).mean())
+    if ink < SPARSE_INK_RATIO:
+        return "sparse"
+    return "dense" if ink > DENSE_INK_RATIO else "normal"
+
+
+def content_bbox(thumb: np.ndarray) -> Optional[Tuple[float, float, float, float]]:
+    # 여백을 뺀 내용 영역 (0~1 비율), 잘라낼 만큼 여백이 없으면 None
+    ys, xs = np.nonzero(_ink_mask(thumb))
+    if not len(xs):
+        return None
+    h, w = thumb.shape
+    x0, x1 = max(xs.min() / w - CROP_MARGIN, 0.0), min((xs.max() + 1) / w + CROP_MARGIN, 1.0)
+    y0, y1 = max(ys.min() / h - CROP_MARGIN, 0.0), min((ys.max() + 1) / h + CROP_MARGIN, 1.0)
+    if (x1 - x0) * (y1 - y0) > CROP_MAX_AREA:
+        return None
+    return x0, y0, x1, y1
+
+
+def _vision_input(
+    img: Image.Image,
+    display: bytes,
+    mime: str,
+    density: str,
+    bbox: Optional[Tuple[float, float, float, float]],
+    dpi: int,
+) -> VisionInput:
+    # 글자가 많고 여백도 없으면 학생용 이미지를 그대로 (업로드된 URL 재사용)
+    if density == "dense" and bbox is None:
+        return VisionInput(display, mime, "high", reuse_display=VISION_USE_URL)
+
+    if bbox is not None:
+        x0, y0, x1, y1 = bbox
+        w, h = img.size
+        img = img.crop((int(x0 * w), int(y0 * h), int(x1 * w), int(y1 * h)))
+
+    detail = "high"
+    if density == "sparse":
+        # 글자가 적은 페이지는 낮은 해상도 + low detail (고정 토큰)
+        scale = min(VISION_SPARSE_DPI / dpi, 1.0)
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.LANCZOS)
+        detail = "low"
+
+    return VisionInput(encode_image(img, "jpeg", VISION_QUALITY), "image/jpeg", detail)
+
+
+def render_page(page: fitz.Page, thumb: Optional[np.ndarray] = None, dpi: int = DISPLAY_DPI) -> PageRendition:
+    """
+    페이지를 한 번만 래스터화해서
+    학생용 이미지(WebP/JPEG) + 썸네일 + Vision 입력(해상도, 여백 crop, detail 조절)을 만든다.
+    """
+    pix = page.get_pixmap(dpi=dpi, alpha=False)
+    img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    pix = None
+
+    if thumb is None:
+        thumb = render_thumbnail(page)
+
+    fmt = RENDITION_FORMAT if RENDITION_FORMAT in MIME_TYPES else "webp"
+    mime = MIME_TYPES[fmt]
+    display = encode_image(img, fmt, DISPLAY_QUALITY)
+
+    small = img.copy()
+    small.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4), Image.LANCZOS)
+    thumbnail = encode_image(small, fmt, DISPLAY_QUALITY)
+
+    density = text_density(page, thumb)
+    vision = _vision_input(img, display, mime, density, content_bbox(thumb), dpi)
+
+    return PageRendition(display, mime, thumbnail, vision, density)
@@ -0,0 +1,485 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+
+from ai_file_ocr.storage import upload_s3
+from ai_file_ocr.pipeline.ocr import (
+    CASCADE_ENABLED,
+    VISION_MODEL,
+    PageAnalysis,
+    PdfPage,
+    Route,
+    VisionImage,
+    analyze_page,
+    analyze_page_cascade,
+    analyze_page_delta,
+    analyze_pages_batch,
+    batch_size_for,
+)
+from ai_file_ocr.pipeline.dedup import PageClass, PageDeduper, crop_region
+from ai_file_ocr.pipeline.cache import get_page_cache, page_cache_key
+from ai_file_ocr.pipeline.cancel import CancelFlag, DocumentCancelled
+from ai_file_ocr.pipeline.outline import outline_context
+from ai_file_ocr.pipeline.summarize import make_mini_summary
+from ai_file_ocr.pipeline.memory import ContextMemory
+from ai_file_ocr.pipeline.outbox import CallbackOutbox
+from ai_file_ocr.pipeline.progress import DocProgress
+from ai_file_ocr.pipeline.scheduler import PageScheduler
+
+# 페이지 문맥: "outline" (문서 개요, 페이지 병렬 분석) | "rolling" (직전 페이지 요약, 직렬)
+CONTEXT_MODE = os.getenv("OCR_CONTEXT_MODE", "outline")
+
+# 단계별 동시 실행 수
+VISION_CONCURRENCY = int(os.getenv("OCR_VISION_CONCURRENCY", "4"))
+UPLOAD_CONCURRENCY = int(os.getenv("OCR_UPLOAD_CONCURRENCY", "4"))
+CALLBACK_CONCURRENCY = int(os.getenv("OCR_CALLBACK_CONCURRENCY", "2"))
+# 렌더링은 끝났지만 분석/업로드/callback이 남아 있는 페이지 수 상한
+MAX_PENDING_PAGES = int(os.getenv("OCR_MAX_PENDING_PAGES", "8"))
+
+# 페이지 분석 실패 시 재시도 횟수 / 첫 대기 시간 (초, 시도마다 2배)
+PAGE_RETRIES = int(os.getenv("OCR_PAGE_RETRIES", "3"))
+PAGE_RETRY_BACKOFF = float(os.getenv("OCR_PAGE_RETRY_BACKOFF", "2.0"))
+
+BLANK_PAGE = PageAnalysis(text="[본문]\n(내용이 없는 페이지입니다.)", summary="(빈 페이지)")
+
+
+EXTENSIONS = {"image/webp": "webp", "image/jpeg": "jpg", "image/png": "png"}
+
+
+def upload_page(doc_id: int, page: PdfPage) -> Tuple[str, Optional[str]]:
+    # 학생용 페이지 이미지 + 썸네일 업로드 → (image_url, thumbnail_url)
+    t = time.time()
+    ext = EXTENSIONS.get(page.mime, "png")
+    image_url = upload_s3(page.image, f"docs/{doc_id}/pages/{page.number}.{ext}", content_type=page.mime)
+    thumbnail_url = None
+    if page.thumbnail:
+        thumbnail_url = upload_s3(
+            page.thumbnail, f"docs/{doc_id}/pages/{page.number}_thumb.{ext}", content_type=page.mime
+        )
+    print(f"[TIME] S3 upload (page {page.number}): {time.time() - t:.2f} sec")
+    return image_url, thumbnail_url
+
+
+class PageFailures(Exception):
+    """재시도 후에도 분석하지 못한 페이지가 남은 경우 (작업 단위 재시도 대상)"""
+
+    def __init__(self, doc_id: int, page_numbers: List[int]):
+        super().__init__(f"doc={doc_id} failed pages: {page_numbers}")
+        self.page_numbers = page_numbers
+
+
+def _enqueue_callback(outbox: CallbackOutbox, doc_id: int, page_number: int, upload: Future, ocr_text: str):
+    # 업로드가 실패해도 OCR 결과는 전달한다 (이미지는 비워둠)
+    try:
+        image_url, thumbnail_url = upload.result()
+    except Exception as e:
+        print(f"[AI OCR] S3 업로드 실패: doc={doc_id}, page={page_number}, error={e}")
+        image_url, thumbnail_url = None, None
+
+    try:
+        outbox.add(page_number, image_url, ocr_text, thumbnail_url)
+    except Exception as e:
+        print(f"[AI OCR] outbox 기록 실패: doc={doc_id}, page={page_number}, error={e}")
+
+
+class DocumentRunner:
+    """
+    한 문서의 페이지를 렌더링 순서대로 받아 분석 → S3 업로드 → callback까지 처리한다.
+
+    - rolling 모드: 직전 페이지 요약이 다음 페이지 문맥이므로 분석은 직렬,
+      업로드/callback만 백그라운드에서 겹쳐 실행한다.
+    - outline 모드: 문서 개요를 공통 문맥으로 쓰므로 페이지 분석도 병렬로 실행한다.
+      렌더링된 페이지 중 scheduler의 우선순위(화면에 띄운 페이지)가 높은 페이지부터 분석한다.
+
+    progress가 있으면 페이지마다 결과를 기록하고, 이전 시도에서 끝난 페이지는 다시 분석하지 않는다.
+    분석이 실패한 페이지는 다른 페이지를 막지 않고 따로 재시도한다.
+    """
+
+    def __init__(
+        self,
+        doc_id: int,
+        callback_url: str,
+        outline: Optional[str] = None,
+        progress: Optional[DocProgress] = None,
+        scheduler: Optional[PageScheduler] = None,
+        refresh: bool = False,
+        owner: str = "",
+    ):
+        self.doc_id = doc_id
+        self.callback_url = callback_url
+        self.outline = outline
+        self.concurrent = outline is not None
+
+        self.mem = ContextMemory(max_history=3)
+        # 빈 페이지 / 중복 페이지 분류, 처리 완료된 페이지 결과 (중복 페이지 재사용)
+        self.deduper = PageDeduper()
+        self.done: Dict[int, PageAnalysis] = {}
+        self.cache = get_page_cache()
+        # 다시 OCR 요청: 캐시된 결과를 쓰지 않고 새로 분석 (결과는 캐시에 덮어씀)
+        self.refresh = refresh
+        self.stats = {
+            "pages": 0,
+            "vision_calls": 0,
+            "vision_calls_saved": 0,
+            "delta_calls": 0,
+            "cheap_calls": 0,
+            "escalations": 0,
+            "batch_calls": 0,
+            "batched_pages": 0,
+            "resumed": 0,
+            "retries": 0,
+            "cancelled": 0,
+        }
+        self.failed: List[int] = []
+        # 문서가 삭제되면 남은 페이지는 분석하지 않는다 (페이지 사이에서 확인)
+        self.cancel = CancelFlag(doc_id)
+
+        # 이전 시도의 진행 기록 (끝난 페이지 결과는 중복 페이지 기준으로도 쓴다)
+        # fan-out subtask는 페이지 묶음을 꺼낼 때마다 기록을 더 읽으므로 같은 dict를 본다
+        self.progress = progress
+        self.resumed: Dict[int, PageAnalysis] = progress.pages if progress else {}
+        self.done.update(self.resumed)
+        if progress and progress.memory and not self.concurrent:
+            self.mem.restore(progress.memory)
+
+        self._lock = threading.Lock()
+        self._pending = threading.BoundedSemaphore(MAX_PENDING_PAGES)
+        self._futures: Dict[int, Future] = {}
+        # 분석 대기 중인 페이지 (병렬 모드, 워커가 비면 우선순위 순으로 꺼냄)
+        self.scheduler = scheduler
+        self._queued: List[Tuple[PdfPage, PageClass, Future]] = []
+
+        # 페이지 결과는 outbox에 기록되고 모아서 bulk callback으로 전달된다
+        # (fan-out subtask는 owner별 outbox라 다른 subtask의 페이지를 보내거나 전달 처리하지 않는다)
+        self.outbox = CallbackOutbox(doc_id, callback_url, on_delivered=self._mark_delivered, owner=owner)
+        self.outbox_drained = False
+
+        self._upload_pool = ThreadPoolExecutor(UPLOAD_CONCURRENCY, thread_name_prefix="ocr-upload")
+        self._callback_pool = ThreadPoolExecutor(CALLBACK_CONCURRENCY, thread_name_prefix="ocr-callback")
+        self._vision_pool = (
+            ThreadPoolExecutor(VISION_CONCURRENCY, thread_name_prefix="ocr-vision")
+            if self.concurrent else None
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        # 남은 분석 → 업로드 → outbox 기록 → bulk callback 순서로 모두 끝날 때까지 기다린다
+        if self._vision_pool is not None:
+            self._vision_pool.shutdown(wait=True)
+        self._upload_pool.shutdown(wait=True)
+        self._callback_pool.shutdown(wait=True)
+        self.outbox_drained = self.outbox.close()
+
+        self.stats["callback_batches"] = self.outbox.batches
+        self.stats["page_classes"] = self.deduper.stats
+        if self.cache is not None:
+            self.stats["cache"] = self.cache.stats()
+
+    def wait(self) -> None:
+        # 모든 페이지 분석이 끝난 뒤, 재시도 후에도 실패한 페이지가 있으면 예외를 올린다
+        for future in list(self._futures.values()):
+            future.result()
+        if self.cancel.is_set():
+            raise DocumentCancelled(self.doc_id)
+        if self.failed:
+            raise PageFailures(self.doc_id, sorted(self.failed))
+
+    def submit(self, page: PdfPage) -> None:
+        if self.cancel.is_set():
+            self.stats["cancelled"] += 1
+            return
+        # 분석/업로드/callback이 밀려 있으면 여기서 대기 (메모리 상한)
+        self._pending.acquire()
+
+        print(f"\n===== PAGE {page.number} START =====")
+
+        upload = self._upload_pool.submit(upload_page, self.doc_id, page)
+        # 분류는 렌더링 순서대로 (직전 페이지와 비교)
+        kind = self.deduper.classify(page.number, page.thumb, page.text_sig, page.image)
+
+        if self._vision_pool is not None:
+            with self._lock:
+                self._futures[page.number] = Future()
+                self._queued.append((page, kind, upload))
+            self._vision_pool.submit(self._run_next)
+        else:
+            self._process(page, kind, upload)
+
+    def _rank(self, page_number: int) -> Tuple[int, int]:
+        if self.scheduler is not None:
+            return self.scheduler.rank(page_number)
+        return 1, page_number
+
+    def _run_next(self) -> None:
+        with self._lock:
+            # 앞선 워커가 batch로 함께 가져갔으면 남은 페이지가 없을 수 있다
+            if not self._queued:
+                return
+            item = min(self._queued, key=lambda q: self._rank(q[0].number))
+            # 기준 페이지(duplicate / delta)가 아직 대기 중이면 기준 페이지부터 분석한다
+            # (워커가 시작도 안 한 페이지를 기다리며 멈추지 않도록)
+            queued = {q[0].number: q for q in self._queued}
+            while item[1].ref in queued:
+                item = queued[item[1].ref]
+            self._queued.remove(item)
+            batch = [item] + self._take_batch(item)
+
+        presets = self._analyze_batch(batch) if len(batch) > 1 and not self.cancel.is_set() else {}
+
+        for page, kind, upload in batch:
+            future = self._futures[page.number]
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self._process(page, kind, upload, preset=presets.get(page.number))
+                future.set_result(None)
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _batchable(self, page: PdfPage, kind: PageClass) -> bool:
+        # Vision으로 갈 새 페이지만 묶는다 (텍스트 레이어 / 빈 / 중복 / delta / 이어서 처리 제외)
+        return (
+            page.local is None
+            and kind.kind == "new"
+            and page.number not in self.resumed
+            and batch_size_for(page) > 1
+        )
+
+    def _take_batch(self, item: Tuple[PdfPage, PageClass, Future]) -> List[Tuple[PdfPage, PageClass, Future]]:
+        # 이미 렌더링되어 대기 중인 바로 다음 페이지들을 함께 가져온다 (lock 안에서 호출)
+        page, kind, _ = item
+        if not self._batchable(page, kind):
+            return []
+
+        # 묶음 크기는 포함된 페이지 중 가장 복잡한 페이지 기준
+        size = batch_size_for(page)
+        queued = {q[0].number: q for q in self._queued}
+        taken = []
+        number = page.number + 1
+        while len(taken) + 1 < size and number in queued:
+            nxt = queued[number]
+            size = min(size, batch_size_for(nxt[0]))
+            if not self._batchable(nxt[0], nxt[1]) or len(taken) + 2 > size:
+                break
+            taken.append(nxt)
+            self._queued.remove(nxt)
+            number += 1
+        return taken
+
+    def _analyze_batch(self, batch: List[Tuple[PdfPage, PageClass, Future]]) -> Dict[int, Tuple[PageAnalysis, str]]:
+        # 캐시에 없는 페이지만 한 번의 요청으로 분석, 실패하거나 빠진 페이지는 페이지 단위로 다시 처리
+        presets: Dict[int, Tuple[PageAnalysis, str]] = {}
+        todo = []
+        for page, kind, upload in batch:
+            if self.cache is not None and not self.refresh:
+                cached = self.cache.get(page_cache_key(page.vision.data if page.vision else page.image))
+                if cached is not None:
+                    presets[page.number] = (cached, "cache")
+                    continue
+            todo.append((page, upload))
+
+        if len(todo) < 2:
+            return presets
+
+        numbers = [page.number for page, _ in todo]
+        t = time.time()
+        try:
+            results = analyze_pages_batch(
+                [self._vision_image(page, upload) for page, upload in todo],
+                numbers,
+                outline_context(self.outline, f"{numbers[0]}~{numbers[-1]}"),
+                {n: self._context(n) for n in numbers},
+            )
+        except Exception as e:
+            print(f"[AI OCR] batch 분석 실패, 페이지 단위로 처리: pages={numbers}, error={e}")
+            return presets
+        print(f"[TIME] Batch analysis pages {numbers}: {time.time() - t:.2f} sec")
+
+        with self._lock:
+            self.stats["batch_calls"] += 1
+            self.stats["batched_pages"] += len(results)
+        for number, (analysis, route) in results.items():
+            self._record_route(number, route)
+            presets[number] = (analysis, "vision" if route.model == VISION_MODEL else "cheap")
+        return presets
+
+    def _context(self, page_number: int) -> str:
+        if self.outline is not None:
+            return outline_context(self.outline, page_number)
+        return self.mem.get_context()
+
+    def _reference(self, page_number: int) -> Optional[PageAnalysis]:
+        # 기준 페이지가 아직 분석 중이면 끝날 때까지 기다린다 (항상 먼저 제출된 페이지)
+        future = self._futures.get(page_number)
+        if future is not None:
+            try:
+                future.result()
+            except Exception:
+                return None
+        return self.done.get(page_number)
+
+    def _vision_image(self, page: PdfPage, upload: Future) -> VisionImage:
+        # 학생용 이미지와 같은 입력이면 base64 대신 업로드된 URL을 보낸다
+        vision = page.vision
+        if vision is None:
+            return page.image
+        if vision.reuse_display:
+            try:
+                image_url, _ = upload.result()
+                return replace(vision, url=image_url)
+            except Exception:
+                pass
+        return vision
+
+    def _analyze(
+        self, page: PdfPage, kind: PageClass, cache_key: Optional[str], upload: Future
+    ) -> Tuple[PageAnalysis, str]:
+        # 페이지 분류 / 캐시에 따라 Vision 호출을 생략하거나 바뀐 영역만 보낸다
+        if page.number in self.resumed:
+            return self.resumed[page.number], "resumed"
+        if page.local:
+            return page.local, "text-layer"
+        if kind.kind == "blank":
+            return BLANK_PAGE, "blank"
+
+        ref = self._reference(kind.ref) if kind.ref is not None else None
+        if kind.kind == "duplicate" and ref is not None:
+            return ref, "duplicate"
+
+        if self.cache is not None and not self.refresh:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached, "cache"
+
+        context = self._context(page.number)
+        if kind.kind == "delta" and ref is not None:
+            region = crop_region(page.image, kind.bbox)
+            return analyze_page_delta(region, ref.text, context), "delta"
+        image = self._vision_image(page, upload)
+        if CASCADE_ENABLED:
+            analysis, route = analyze_page_cascade(image, context, page.complexity)
+            self._record_route(page.number, route)
+            return analysis, "vision" if route.model == VISION_MODEL else "cheap"
+        return analyze_page(image, context), "vision"
+
+    def _record_route(self, page_number: int, route: Route) -> None:
+        # 임계값 조정을 위해 페이지별 라우팅 결과와 지연 시간을 남긴다
+        cheap = f", cheap {route.cheap_seconds:.2f} sec" if route.cheap_seconds else ""
+        print(
+            f"[AI OCR] route page {page_number}: {route.model} ({route.reason}) "
+            f"{route.seconds:.2f} sec{cheap}"
+        )
+        if route.escalated:
+            with self._lock:
+                self.stats["escalations"] += 1
+
+    def _analyze_with_retry(
+        self, page: PdfPage, kind: PageClass, cache_key: Optional[str], upload: Future
+    ) -> Tuple[PageAnalysis, str]:
+        for attempt in range(PAGE_RETRIES + 1):
+            try:
+                return self._analyze(page, kind, cache_key, upload)
+            except Exception as e:
+                if attempt == PAGE_RETRIES or self.cancel.is_set():
+                    raise
+                delay = PAGE_RETRY_BACKOFF * (2 ** attempt) + random.uniform(0, 1)
+                print(
+                    f"[AI OCR] page {page.number} 분석 실패 ({attempt + 1}/{PAGE_RETRIES}), "
+                    f"{delay:.1f}초 후 재시도: {e}"
+                )
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(delay)
+
+    def _mark_delivered(self, page_numbers: List[int]) -> None:
+        if self.progress is not None:
+            for page_number in page_numbers:
+                self.progress.mark_delivered(page_number)
+
+    def _process(
+        self,
+        page: PdfPage,
+        kind: PageClass,
+        upload: Future,
+        preset: Optional[Tuple[PageAnalysis, str]] = None,
+    ) -> None:
+        page_number = page.number
+        if self.cancel.is_set():
+            print(f"[AI OCR] doc={self.doc_id} 취소됨 → page {page_number} 건너뜀")
+            with self._lock:
+                self.stats["cancelled"] += 1
+            self._pending.release()
+            return
+        # 실제 Vision 입력 기준 (rendition 정책이 바뀌면 새 키)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = page_cache_key(page.vision.data if page.vision else page.image)
+
+        # 1) 페이지 분석 (fused 모드면 mini-summary까지 함께 받음)
+        t = time.time()
+        try:
+            # batch로 이미 분석된 페이지는 그 결과를 쓴다
+            analysis, source = preset or self._analyze_with_retry(page, kind, cache_key, upload)
+        except Exception as e:
+            # 이 페이지만 실패로 남기고 나머지 페이지는 계속 처리한다
+            print(f"[AI OCR] page {page_number} 분석 최종 실패: {e}")
+            with self._lock:
+                if not self.cancel.is_set():
+                    self.failed.append(page_number)
+            self._pending.release()
+            return
+        ocr_text = analysis.text
+        ref = f" of page {kind.ref}" if source in ("duplicate", "delta") else ""
+        print(f"[TIME] Page analysis {page_number} ({source}{ref}): {time.time() - t:.2f} sec")
+
+        # 2) outbox 기록 (백그라운드, 업로드 완료 후) → 모아서 bulk callback
+        callback = self._callback_pool.submit(
+            _enqueue_callback, self.outbox, self.doc_id, page_number, upload, ocr_text
+        )
+        callback.add_done_callback(lambda _: self._pending.release())
+
+        # 3) mini-summary 반영 (rolling 모드에서 다음 페이지 Vision 호출의 문맥)
+        #    빈 페이지 / 중복 페이지는 문맥에 다시 넣지 않는다
+        mini = analysis.summary
+        if not mini and not self.concurrent:
+            t = time.time()
+            mini = make_mini_summary(ocr_text)
+            print(f"[TIME] Mini summary: {time.time() - t:.2f} sec")
+
+        result = PageAnalysis(text=ocr_text, summary=mini)
+        with self._lock:
+            self.done[page_number] = result
+            self.stats["pages"] += 1
+            if source == "vision":
+                self.stats["vision_calls"] += 1
+            elif source == "delta":
+                self.stats["delta_calls"] += 1
+            elif source == "cheap":
+                self.stats["cheap_calls"] += 1
+            else:
+                self.stats["vision_calls_saved"] += 1
+                if source == "resumed":
+                    self.stats["resumed"] += 1
+            if not self.concurrent and source not in ("blank", "duplicate", "resumed"):
+                self.mem.add_summary(page_number, mini)
+            memory = self.mem.snapshot() if not self.concurrent else None
+
+        if self.progress is not None and source != "resumed":
+            self.progress.save_page(page_number, result)
+            if memory is not None:
+                self.progress.save_memory(memory)
+
+        if self.cache is not None and source in ("vision", "cheap", "delta"):
+            self.cache.put(cache_key, result)
+
+        print(f"===== PAGE {page_number} END =====\n")
@@ -0,0 +1,140 @@
+import json
+import os
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from ai_file_ocr.redis_client import redis_client
+
+# 우선순위 힌트 / 대기 페이지 큐 보관 기간
+SCHEDULE_TTL = int(os.getenv("OCR_SCHEDULE_TTL", str(24 * 3600)))
+# 힌트 페이지 점수 (항상 일반 페이지 번호보다 앞)
+HINT_BASE_SCORE = -1_000_000
+# 같은 문서의 힌트를 다시 읽는 간격 (초)
+HINT_REFRESH_SEC = 0.5
+
+
+def _keys(doc_id: int) -> Tuple[str, str, str]:
+    return f"ocr:queue:{doc_id}", f"ocr:priority:{doc_id}", f"ocr:claims:{doc_id}"
+
+
+def set_priority(doc_id: int, page_numbers: List[int]) -> int:
+    """
+    화면에 띄운 페이지(+ 다음 몇 페이지)를 대기 중인 페이지 맨 앞으로 옮긴다.
+    이미 처리를 시작한 페이지는 큐에 없으므로 건드리지 않는다 (ZADD XX).
+    앞선 힌트로 당겨졌던 페이지는 원래 순서(페이지 번호)로 되돌린다.
+    """
+    queue_key, hint_key, _ = _keys(doc_id)
+
+    previous = redis_client.get(hint_key)
+    pipe = redis_client.pipeline()
+    for number in json.loads(previous) if previous else []:
+        pipe.zadd(queue_key, {str(number): number}, xx=True)
+    for idx, number in enumerate(page_numbers):
+        pipe.zadd(queue_key, {str(number): HINT_BASE_SCORE + idx}, xx=True, ch=True)
+    pipe.set(hint_key, json.dumps(page_numbers), ex=SCHEDULE_TTL)
+    results = pipe.execute()
+
+    # 새 힌트 중 실제로 대기 중이던 페이지 수
+    return sum(results[-len(page_numbers) - 1 : -1]) if page_numbers else 0
+
+
+class PageScheduler:
+    """
+    문서의 남은 페이지를 Redis sorted set에 두고, 점수가 가장 낮은 페이지부터 꺼낸다.
+    기본 점수는 페이지 번호(앞에서부터 순서대로)이고, 백엔드가 보낸 우선순위 힌트
+    (현재 화면 페이지, 다음 페이지들)는 맨 앞 점수로 바뀐다.
+    여러 워커(subtask)가 같은 큐에서 꺼내 쓰므로 문서 전체에 대해 순서가 지켜진다.
+    """
+
+    def __init__(self, doc_id: int):
+        self.doc_id = doc_id
+        self.queue_key, self.hint_key, self.claims_key = _keys(doc_id)
+        self._hints: List[int] = []
+        self._hints_at = 0.0
+
+    def reset(self, page_numbers: List[int]) -> None:
+        pipe = redis_client.pipeline()
+        pipe.delete(self.queue_key, self.claims_key)
+        if page_numbers:
+            pipe.zadd(self.queue_key, {str(n): n for n in page_numbers})
+        pipe.expire(self.queue_key, SCHEDULE_TTL)
+        pipe.execute()
+
+        # 업로드 직후 들어온 힌트도 반영
+        hints = self.hints(refresh=True)
+        if hints:
+            set_priority(self.doc_id, hints)
+
+    def next_page(self) -> Optional[int]:
+        popped = redis_client.zpopmin(self.queue_key, 1)
+        if not popped:
+            return None
+        return int(popped[0][0])
+
+    def __iter__(self) -> Iterator[int]:
+        # 렌더링 스레드가 다음 페이지를 고를 때마다 큐에서 꺼낸다 (힌트가 바뀌면 바로 반영)
+        while True:
+            number = self.next_page()
+            if number is None:
+                return
+            yield number
+
+    def claimed(self, owner: str) -> List[int]:
+        # 같은 owner(task id)가 재시도/재전달되면 이전 시도에서 꺼낸 페이지를 그대로 돌려준다
+        previous = redis_client.hget(self.claims_key, owner)
+        return json.loads(previous) if previous else []
+
+    def claim(self, owner: str, count: int) -> List[int]:
+        """
+        subtask가 처리할 페이지를 꺼낸다: 우선순위가 가장 높은 페이지부터
+        번호가 이어지는 페이지를 count개까지 (중복 / delta 비교, batch 묶음, 문맥이 끊기지 않도록).
+        다른 subtask가 이미 꺼낸 번호에서 멈추므로 count보다 적을 수 있다.
+        꺼낸 페이지는 owner 기록에 덧붙인다.
+        """
+        popped = redis_client.zpopmin(self.queue_key, 1)
+        if not popped:
+            return []
+        numbers = [int(popped[0][0])]
+        # ZREM은 한 워커만 성공하므로 같은 페이지를 두 subtask가 가져가지 않는다
+        while len(numbers) < count and redis_client.zrem(self.queue_key, str(numbers[-1] + 1)):
+            numbers.append(numbers[-1] + 1)
+
+        pipe = redis_client.pipeline()
+        pipe.hset(self.claims_key, owner, json.dumps(self.claimed(owner) + numbers))
+        pipe.expire(self.claims_key, SCHEDULE_TTL)
+        pipe.execute()
+        return numbers
+
+    def claim_chunks(self, owner: str, count: int) -> Iterator[List[int]]:
+        """
+        subtask가 처리할 페이지 묶음: 이전 시도에서 꺼낸 페이지부터, 이후 큐가 빌 때까지 count개씩 이어서 꺼낸다.
+        (묶음이 짧게 끊겨도 남은 페이지는 먼저 끝난 subtask가 가져간다)
+        """
+        previous = self.claimed(owner)
+        if previous:
+            yield previous
+        while True:
+            numbers = self.claim(owner, count)
+            if not numbers:
+                return
+            yield numbers
+
+    def hints(self, refresh: bool = False) -> List[int]:
+        if refresh or time.time() - self._hints_at > HINT_REFRESH_SEC:
+            try:
+                value = redis_client.get(self.hint_key)
+                self._hints = json.loads(value) if value else []
+            except Exception as e:
+                print(f"[AI OCR] 우선순위 힌트 조회 실패: doc={self.doc_id}, error={e}")
+            self._hints_at = time.time()
+        return self._hints
+
+    def rank(self, page_number: int) -> Tuple[int, int]:
+        # 이미 렌더링된 페이지끼리 분석 순서를 정할 때 사용 (힌트 순서 → 페이지 번호)
+        hints = self.hints()
+        if page_number in hints:
+            return 0, hints.index(page_number)
+        return 1, page_number
+
+    def clear(self) -> None:
+        redis_client.delete(self.queue_key, self.hint_key, self.claims_key)
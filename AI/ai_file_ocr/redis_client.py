@@ -0,0 +1,9 @@
+import os
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+# 진행 상태 / 작업 레지스트리 등 워커 간 공유 상태 (기본은 Celery broker와 같은 Redis)
+REDIS_URL = os.getenv("OCR_REDIS_URL") or os.getenv("CELERY_BROKER_URL") or "redis://localhost:6379/0"
+
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
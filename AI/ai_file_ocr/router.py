@@ -1,24 +1,112 @@
 import traceback
+from typing import List, Optional
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from ai_file_ocr.tasks import run_pdf_ocr
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from ai_file_ocr.storage import has_pdf, put_pdf
+from ai_file_ocr.pipeline.cache import get_page_cache
+from ai_file_ocr.pipeline.jobs import submit_once
+from ai_file_ocr.pipeline.scheduler import set_priority
+from ai_file_ocr.tasks import cancel_pdf_ocr, run_pdf_ocr, run_pdf_ocr_deferred, submit_reocr
 
 router = APIRouter()
 
+# 힌트로 받는 최대 페이지 수 (현재 페이지 + 다음 몇 페이지)
+PRIORITY_MAX_PAGES = 5
+
+
+class PriorityRequest(BaseModel):
+    pages: List[int]   # 현재 화면 페이지, 다음 페이지들 순서
+
+
+class ReOcrRequest(BaseModel):
+    pdf_sha256: str    # 처음 업로드할 때 저장된 원본 PDF
+    callback_url: str
+    pages: List[int]
+
+
+def _parse_pages(pages: Optional[str]) -> Optional[List[int]]:
+    # "3,5,7" → [3, 5, 7]
+    if not pages:
+        return None
+    try:
+        return sorted({int(n) for n in pages.split(",") if n.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"잘못된 pages: {pages}")
+
+
 @router.post("/ocr/pdf")
 async def ocr_pdf(
     doc_id: int = Form(...),
     callback_url: str = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    deferred: bool = Form(False),
+    pages: Optional[str] = Form(None),
 ):
+    # 새 버전 업로드: 바뀐 페이지만 처리
+    page_numbers = _parse_pages(pages)
     try:
-        pdf_bytes = file.file.read()
+        # PDF는 저장소에 한 번만 올리고, 큐에는 참조 + 해시만 넘긴다
+        pdf_ref, pdf_sha256 = await run_in_threadpool(put_pdf, file.file)
 
-        if not pdf_bytes:
-            raise ValueError("Empty PDF file received")
-
-        run_pdf_ocr.delay(doc_id, pdf_bytes, callback_url)
+        # 급하지 않은 문서는 batch API로 (실시간 Vision 한도는 강의 중인 문서에 남겨 둔다)
+        task = run_pdf_ocr_deferred if deferred else run_pdf_ocr
+        existing = submit_once(
+            doc_id, pdf_sha256, task, doc_id, pdf_ref, pdf_sha256, callback_url, pages=page_numbers
+        )
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    if existing is not None:
+        return {"message": "이미 처리 중인 작업입니다.", "job": existing}
     return {"message": "OCR 작업이 큐에 등록되었습니다."}
+
+
+@router.get("/ocr/pdf/cache")
+def ocr_pdf_cache_stats():
+    cache = get_page_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@router.post("/ocr/pdf/{doc_id}/priority")
+def ocr_pdf_priority(doc_id: int, req: PriorityRequest):
+    # 강의 중 화면에 띄운 페이지를 대기 중인 페이지 맨 앞으로 (이미 처리된 페이지는 무시)
+    pages = list(dict.fromkeys(n for n in req.pages if n > 0))[:PRIORITY_MAX_PAGES]
+    try:
+        queued = set_priority(doc_id, pages)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"doc_id": doc_id, "pages": pages, "queued": queued}
+
+
+@router.post("/ocr/pdf/{doc_id}/reocr")
+def ocr_pdf_reocr(doc_id: int, req: ReOcrRequest):
+    # 저장된 원본 PDF로 지정한 페이지만 다시 OCR (캐시된 결과는 쓰지 않음)
+    pages = sorted({n for n in req.pages if n > 0})
+    if not pages:
+        raise HTTPException(status_code=400, detail="pages가 비어 있습니다.")
+    try:
+        if not has_pdf(req.pdf_sha256):
+            raise HTTPException(status_code=404, detail="저장된 PDF가 없습니다.")
+        existing = submit_reocr(doc_id, req.pdf_sha256, pages, req.callback_url)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if existing is not None:
+        # 같은 문서의 작업이 실행 중: 바로 큐에 넣지 않고 그 작업이 끝난 뒤 이어서 처리
+        return {"doc_id": doc_id, "pages": pages, "queued": False, "attached": True, "job": existing}
+    return {"doc_id": doc_id, "pages": pages, "queued": True, "attached": False}
+
+
+@router.post("/ocr/pdf/{doc_id}/cancel")
+def ocr_pdf_cancel(doc_id: int):
+    # 백엔드에서 교안이 삭제됨: 실행 중인 작업은 페이지 사이에서 멈추고 대기 중인 task는 revoke
+    try:
+        revoked = cancel_pdf_ocr(doc_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"doc_id": doc_id, "revoked": revoked}
@@ -0,0 +1,216 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from io import BytesIO
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: 열려 있는 파일은 어차피 지울 수 없다
+    fcntl = None
+
+import boto3
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_S3_BUCKET_NAME = os.getenv("AWS_BUCKET_NAME")
+AWS_S3_REGION = os.getenv("AWS_REGION")
+
+# 업로드된 PDF 보관소: "s3" 또는 "local" (로컬 디렉토리 / 공유 볼륨)
+OCR_STORAGE_BACKEND = os.getenv("OCR_STORAGE_BACKEND", "s3")
+OCR_LOCAL_STORAGE_DIR = os.getenv("OCR_LOCAL_STORAGE_DIR", "ocr_uploads")
+
+# s3 저장소일 때 워커 노드에 받아 둔 PDF (페이지 subtask마다 다시 받지 않도록)
+OCR_PDF_CACHE_DIR = os.getenv("OCR_PDF_CACHE_DIR", "ocr_pdf_cache")
+OCR_PDF_CACHE_MAX_FILES = int(os.getenv("OCR_PDF_CACHE_MAX_FILES", "20"))
+
+PDF_KEY_PREFIX = "uploads/pdf"
+CHUNK_SIZE = 1024 * 1024
+
+
+def s3_client():
+    return boto3.client(
+        "s3",
+        region_name=AWS_S3_REGION,
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+    )
+
+
+def upload_s3(image_bytes: bytes, key: str, content_type: str = "image/png") -> str:
+    s3_client().upload_fileobj(
+        Fileobj=BytesIO(image_bytes),
+        Bucket=AWS_S3_BUCKET_NAME,
+        Key=key,
+        ExtraArgs={"ContentType": content_type},
+    )
+    return f"https://{AWS_S3_BUCKET_NAME}.s3.{AWS_S3_REGION}.amazonaws.com/{key}"
+
+
+def pdf_key(sha256: str) -> str:
+    # 내용 해시 기반 키 → 같은 파일은 한 번만 저장된다
+    return f"{PDF_KEY_PREFIX}/{sha256}.pdf"
+
+
+def _local_path(key: str) -> str:
+    return os.path.join(OCR_LOCAL_STORAGE_DIR, key)
+
+
+def _s3_exists(s3, key: str) -> bool:
+    try:
+        s3.head_object(Bucket=AWS_S3_BUCKET_NAME, Key=key)
+        return True
+    except ClientError:
+        return False
+
+
+def put_pdf(fileobj: BinaryIO) -> Tuple[str, str]:
+    """
+    업로드 스트림을 청크 단위로 임시파일에 받으면서 sha256을 계산하고,
+    저장소에 한 번만 올린 뒤 (pdf_ref, sha256)을 반환한다.
+    Celery 메시지에는 PDF 바이트 대신 이 참조만 실린다.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+            tmp.write(chunk)
+            size += len(chunk)
+        tmp_path = tmp.name
+
+    try:
+        if size == 0:
+            raise ValueError("Empty PDF file received")
+
+        sha256 = hasher.hexdigest()
+        key = pdf_key(sha256)
+
+        if OCR_STORAGE_BACKEND == "local":
+            dest = _local_path(key)
+            if not os.path.exists(dest):
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                shutil.move(tmp_path, dest)
+        else:
+            s3 = s3_client()
+            if not _s3_exists(s3, key):
+                s3.upload_file(
+                    tmp_path,
+                    AWS_S3_BUCKET_NAME,
+                    key,
+                    ExtraArgs={"ContentType": "application/pdf"},
+                )
+
+        return key, sha256
+
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def has_pdf(sha256: str) -> bool:
+    # 다시 OCR할 때 원본 PDF가 저장소에 남아 있는지 확인
+    key = pdf_key(sha256)
+    if OCR_STORAGE_BACKEND == "local":
+        return os.path.exists(_local_path(key))
+    return _s3_exists(s3_client(), key)
+
+
+def _file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _pin(path: str) -> Optional[int]:
+    """
+    캐시 파일을 쓰는 동안 공유 잠금을 잡아 둔다 (같은 노드의 다른 워커가 정리하면서 지우지 않도록).
+    반환한 fd를 닫으면 풀린다. 그 사이 이미 지워졌으면 None.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        if os.fstat(fd).st_nlink == 0:
+            os.close(fd)
+            return None
+    return fd
+
+
+def _evict_pdf_cache() -> None:
+    # 오래 쓰지 않은 파일부터 지워 개수 상한을 지킨다 (다른 subtask가 열어 둔 파일은 건너뜀)
+    files = [
+        os.path.join(OCR_PDF_CACHE_DIR, name)
+        for name in os.listdir(OCR_PDF_CACHE_DIR)
+        if name.endswith(".pdf")
+    ]
+    files.sort(key=os.path.getmtime)
+    for path in files[: max(0, len(files) - OCR_PDF_CACHE_MAX_FILES)]:
+        try:
+            if fcntl is None:
+                os.remove(path)
+                continue
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.remove(path)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+@contextmanager
+def open_pdf(pdf_ref: str, sha256: str) -> Iterator[str]:
+    """
+    저장소의 PDF를 워커 로컬 경로로 제공한다.
+    local은 저장 경로를 그대로 쓰고, s3는 노드 로컬 캐시에 한 번만 스트리밍 다운로드한다.
+    내용 해시가 다르면 (부분 업로드, 키 충돌 등) 처리하지 않는다.
+    """
+    if OCR_STORAGE_BACKEND == "local":
+        path = _local_path(pdf_ref)
+        if not os.path.exists(path):
+            raise FileNotFoundError(pdf_ref)
+        if _file_sha256(path) != sha256:
+            raise ValueError(f"PDF 해시 불일치: {pdf_ref}")
+        yield path
+        return
+
+    # 해시 이름의 캐시 파일은 검증 후에만 만들어지므로 그대로 쓴다
+    cached = os.path.join(OCR_PDF_CACHE_DIR, f"{sha256}.pdf")
+    fd = _pin(cached)
+    if fd is None:
+        os.makedirs(OCR_PDF_CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile(suffix=".part", dir=OCR_PDF_CACHE_DIR, delete=False) as tmp:
+            s3_client().download_fileobj(AWS_S3_BUCKET_NAME, pdf_ref, tmp)
+            tmp_path = tmp.name
+
+        try:
+            if _file_sha256(tmp_path) != sha256:
+                raise ValueError(f"PDF 해시 불일치: {pdf_ref}")
+            os.replace(tmp_path, cached)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        fd = _pin(cached)
+        if fd is None:
+            raise FileNotFoundError(cached)
+        _evict_pdf_cache()
+
+    try:
+        os.utime(cached)
+        yield cached
+    finally:
+        os.close(fd)
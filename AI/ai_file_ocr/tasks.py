@@ -1,96 +1,384 @@
-import time
-from io import BytesIO 
 import os
-import requests
-import boto3
-from dotenv import load_dotenv
+import time
+from typing import Iterable, Iterator, List, Optional
+
+from celery import chord, group
 
 from ai_file_ocr.celery_app import celery_app
-from ai_file_ocr.pipeline.ocr import pdf_to_images, analyze_page_with_context
-from ai_file_ocr.pipeline.summarize import make_mini_summary
-from ai_file_ocr.pipeline.memory import ContextMemory  
-
-load_dotenv()
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_S3_BUCKET_NAME = os.getenv("AWS_BUCKET_NAME")
-AWS_S3_REGION = os.getenv("AWS_REGION")
-
-
-def upload_s3(image_bytes: bytes, key: str, content_type: str = "image/png") -> str:
-    s3 = boto3.client(
-        "s3",
-        region_name=AWS_S3_REGION,
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+from ai_file_ocr.storage import open_pdf, pdf_key
+from ai_file_ocr.pipeline.ocr import iter_pdf_pages, pdf_page_count
+from ai_file_ocr.pipeline.cancel import DocumentCancelled, cancel_document, is_cancelled, track_tasks
+from ai_file_ocr.pipeline.jobs import (
+    JOB_TTL,
+    add_pending_reocr,
+    job_exists,
+    pop_pending_reocr,
+    release_doc_jobs,
+    release_job,
+    submit_once,
+    touch_job,
+    update_job,
+)
+from ai_file_ocr.pipeline.deferred import cancel_deferred, collect_deferred, deferred_meta, submit_deferred
+from ai_file_ocr.pipeline.outbox import CallbackOutbox, delete_outboxes, flush_outbox
+from ai_file_ocr.pipeline.outline import build_outline
+from ai_file_ocr.pipeline.progress import DocProgress, clear_doc_progress
+from ai_file_ocr.pipeline.runner import CONTEXT_MODE, DocumentRunner, PageFailures
+from ai_file_ocr.pipeline.scheduler import PageScheduler
+
+# 이 페이지 수 이상인 문서는 페이지 단위 subtask로 나눠 여러 워커가 처리 (outline 모드)
+FANOUT_MIN_PAGES = int(os.getenv("OCR_FANOUT_MIN_PAGES", "20"))
+# subtask가 한 번에 꺼내는 이어진 페이지 수 (중복 / delta 비교, batch 묶음, 문맥이 묶음 안에서 유지된다)
+FANOUT_CHUNK_PAGES = int(os.getenv("OCR_FANOUT_CHUNK_PAGES", "12"))
+
+# 재시도 후에도 실패한 페이지가 남으면 작업 단위로 다시 실행 (끝난 페이지는 진행 기록으로 건너뜀)
+TASK_MAX_RETRIES = int(os.getenv("OCR_TASK_MAX_RETRIES", "3"))
+TASK_RETRY_BACKOFF = int(os.getenv("OCR_TASK_RETRY_BACKOFF", "30"))
+RETRY_OPTIONS = {
+    "autoretry_for": (PageFailures,),
+    "max_retries": TASK_MAX_RETRIES,
+    "retry_backoff": TASK_RETRY_BACKOFF,
+    "retry_backoff_max": 600,
+}
+
+# 작업이 끝날 때까지 전달하지 못한 callback을 다시 보내기 전 대기 (초)
+OUTBOX_DRAIN_DELAY = int(os.getenv("OCR_OUTBOX_DRAIN_DELAY", "60"))
+
+
+# 지연(deferred) 모드 batch 결과 확인 간격 (초)
+DEFERRED_POLL_SEC = int(os.getenv("OCR_DEFERRED_POLL_SEC", "300"))
+
+
+def _deferred_job_ttl() -> int:
+    # batch 결과를 기다리는 동안에는 poll 간격보다 길게 유지
+    return max(JOB_TTL, DEFERRED_POLL_SEC * 3)
+
+
+class OutboxNotDrained(Exception):
+    pass
+
+
+def _close_outbox(outbox: CallbackOutbox, doc_id: int) -> None:
+    # 백엔드가 응답하지 않아 outbox에 남은 결과는 나중에 따로 전달
+    if not outbox.close():
+        drain_ocr_outbox.apply_async((doc_id,), countdown=OUTBOX_DRAIN_DELAY)
+
+
+def _run_document(
+    doc_id: int,
+    pdf_sha256: str,
+    pdf_path: str,
+    callback_url: str,
+    outline: Optional[str],
+    progress: DocProgress,
+    pages: Iterable[int],
+    scheduler: Optional[PageScheduler] = None,
+    refresh: bool = False,
+    owner: str = "",
+) -> dict:
+    # PDF → 이미지 변환 (페이지 단위 스트리밍) → 분석 / 업로드 / callback
+    runner = DocumentRunner(
+        doc_id, callback_url, outline=outline, progress=progress, scheduler=scheduler, refresh=refresh,
+        owner=owner,
     )
-    s3.upload_fileobj(
-        Fileobj=BytesIO(image_bytes),
-        Bucket=AWS_S3_BUCKET_NAME,
-        Key=key,
-        ExtraArgs={"ContentType": content_type},
+    try:
+        with runner:
+            for page in iter_pdf_pages(pdf_path, pages=pages):
+                runner.submit(page)
+                # 작업 기록 heartbeat (중복 제출 방지 기록이 실행 중에 만료되지 않도록)
+                touch_job(doc_id, pdf_sha256)
+            runner.wait()
+    finally:
+        # 백엔드가 응답하지 않아 outbox에 남은 결과는 나중에 따로 전달
+        if not runner.outbox_drained:
+            drain_ocr_outbox.apply_async((doc_id, owner), countdown=OUTBOX_DRAIN_DELAY)
+    return runner.stats
+
+
+def _merge_stats(all_stats: List[dict]) -> dict:
+    merged: dict = {}
+    for stats in all_stats:
+        for key, value in stats.items():
+            if isinstance(value, int):
+                merged[key] = merged.get(key, 0) + value
+            elif key == "page_classes":
+                classes = merged.setdefault(key, {})
+                for kind, count in value.items():
+                    classes[kind] = classes.get(kind, 0) + count
+            else:
+                merged[key] = value
+    return merged
+
+
+def cancel_pdf_ocr(doc_id: int) -> int:
+    """
+    문서 OCR 취소: 취소 표시를 남기고(실행 중인 워커는 페이지 사이에서 멈춤),
+    아직 시작하지 않은 task는 revoke, 대기 중인 페이지와 전달 대기 결과는 지운다.
+    revoke된 subtask가 있으면 chord의 finish_pdf_ocr가 실행되지 않으므로 진행 기록 / 작업 기록도 여기서 지운다.
+    """
+    task_ids = cancel_document(doc_id)
+    if task_ids:
+        celery_app.control.revoke(task_ids)
+    PageScheduler(doc_id).clear()
+    delete_outboxes(doc_id)
+    clear_doc_progress(doc_id)
+    release_doc_jobs(doc_id)
+    print(f"[AI OCR] doc={doc_id} 취소: revoke {len(task_ids)} tasks")
+    return len(task_ids)
+
+
+def submit_reocr(doc_id: int, pdf_sha256: str, pages: List[int], callback_url: str) -> Optional[dict]:
+    """
+    저장된 원본 PDF로 pages만 다시 OCR (캐시된 결과는 쓰지 않음). 새로 등록했으면 None.
+    같은 문서의 작업이 실행 중이면 그 작업이 끝날 때 이어서 등록하도록 남기고 실행 중인 작업 정보를 반환한다.
+    """
+    existing = submit_once(
+        doc_id, pdf_sha256, run_pdf_ocr,
+        doc_id, pdf_key(pdf_sha256), pdf_sha256, callback_url, pages=pages, refresh=True,
     )
-    return f"https://{AWS_S3_BUCKET_NAME}.s3.{AWS_S3_REGION}.amazonaws.com/{key}"
+    if existing is None:
+        return None
+    add_pending_reocr(doc_id, pdf_sha256, pages, callback_url)
+    if job_exists(doc_id, pdf_sha256):
+        return existing
+
+    # 남기는 사이 작업이 끝났으면 직접 등록 (끝난 작업이 이미 가져갔으면 그쪽이 등록)
+    pending = pop_pending_reocr(doc_id, pdf_sha256)
+    if pending is None:
+        return existing
+    return submit_reocr(doc_id, pdf_sha256, *pending)
+
+
+def _finish_job(doc_id: int, pdf_sha256: str) -> None:
+    # 작업 기록을 지우고, 실행 중에 들어온 다시 OCR 요청이 있으면 이어서 등록한다
+    release_job(doc_id, pdf_sha256)
+    pending = pop_pending_reocr(doc_id, pdf_sha256)
+    if pending is not None:
+        print(f"[AI OCR] doc={doc_id} 대기 중이던 다시 OCR 등록: pages={pending[0]}")
+        submit_reocr(doc_id, pdf_sha256, *pending)
+
 
+def _cancelled(doc_id: int, pdf_sha256: str, progress: Optional[DocProgress] = None) -> dict:
+    if progress is not None:
+        progress.clear()
+    PageScheduler(doc_id).clear()
+    release_job(doc_id, pdf_sha256)
+    print(f"[AI OCR] doc={doc_id} 취소됨")
+    return {"doc_id": doc_id, "cancelled": True}
 
-@celery_app.task(name="ai_file_ocr.tasks.run_pdf_ocr")
-def run_pdf_ocr(doc_id: int, pdf_bytes: bytes, callback_url: str):
+
+@celery_app.task(name="ai_file_ocr.tasks.run_pdf_ocr", **RETRY_OPTIONS)
+def run_pdf_ocr(
+    doc_id: int,
+    pdf_ref: str,
+    pdf_sha256: str,
+    callback_url: str,
+    pages: Optional[List[int]] = None,
+    refresh: bool = False,
+):
 
     total_start = time.time()
+    if is_cancelled(doc_id):
+        return _cancelled(doc_id, pdf_sha256)
+    update_job(doc_id, pdf_sha256, status="running")
+    # 재시도 / 워커 재시작 시 이전 시도의 진행 기록을 이어 쓴다
+    progress = DocProgress(doc_id, pdf_sha256).load()
+
+    # 저장소에서 PDF를 받아 워커 로컬 경로로 처리
+    with open_pdf(pdf_ref, pdf_sha256) as pdf_path:
+        total_pages = pdf_page_count(pdf_path)
 
-    # 1) PDF → 이미지 변환
-    t0 = time.time()
-    pages = pdf_to_images(pdf_bytes)
-    print(f"[TIME] PDF to images: {time.time() - t0:.2f} sec")
+        # pages를 주면 그 페이지만, callback까지 끝난 페이지는 다시 렌더링하지 않는다
+        numbers = pages if pages is not None else range(1, total_pages + 1)
+        pending = [n for n in numbers if 1 <= n <= total_pages and n not in progress.delivered]
+        if progress.delivered:
+            print(f"[AI OCR] doc={doc_id} 이어서 처리: 남은 페이지 {len(pending)}개")
 
-    mem = ContextMemory(max_history=3)
+        # 1) 문서 개요 (outline 모드에서 모든 페이지의 공통 문맥)
+        outline = None
+        if CONTEXT_MODE == "outline":
+            outline = progress.outline
+            if outline is None:
+                t0 = time.time()
+                outline = build_outline(pdf_path)
+                progress.save_outline(outline)
+                print(f"[TIME] Document outline: {time.time() - t0:.2f} sec")
 
-    # 페이지 순회
-    for page_number, img_bytes in pages:
+        # outline 모드는 남은 페이지를 우선순위 큐에 넣고,
+        # 백엔드가 보낸 힌트(화면에 띄운 페이지)부터 꺼내 처리한다
+        scheduler = None
+        if outline is not None:
+            scheduler = PageScheduler(doc_id)
+            scheduler.reset(pending)
 
-        print(f"\n===== PAGE {page_number} START =====")
+        # 2) 큰 문서는 페이지 단위 subtask로 나눠 여러 워커에 분산 (각 subtask가 큐에서 페이지를 꺼냄)
+        if scheduler is not None and pending and total_pages >= FANOUT_MIN_PAGES:
+            subtasks = -(-len(pending) // FANOUT_CHUNK_PAGES)
+            signatures = [
+                ocr_pages.s(doc_id, pdf_ref, pdf_sha256, callback_url, outline, refresh)
+                for _ in range(subtasks)
+            ]
+            # 문서가 취소되면 아직 시작하지 않은 subtask를 revoke할 수 있도록 id를 남긴다
+            track_tasks(doc_id, [sig.freeze().id for sig in signatures])
+            chord(group(signatures))(finish_pdf_ocr.s(doc_id, pdf_sha256, total_start))
+            update_job(doc_id, pdf_sha256, status="fan-out", subtasks=subtasks)
 
-        # 2) S3 업로드
-        t1 = time.time()
-        s3_key = f"docs/{doc_id}/pages/{page_number}.png"
-        image_url = upload_s3(img_bytes, s3_key, content_type="image/png")
-        print(f"[TIME] S3 upload: {time.time() - t1:.2f} sec")
+            print(f"[AI OCR] doc={doc_id} fan-out: {len(pending)} pages → {subtasks} subtasks")
+            return {"doc_id": doc_id, "subtasks": subtasks}
+
+        # 3) 작은 문서는 이 워커에서 바로 처리
+        try:
+            stats = _run_document(
+                doc_id, pdf_sha256, pdf_path, callback_url, outline, progress,
+                pages=scheduler if scheduler is not None else pending,
+                scheduler=scheduler,
+                refresh=refresh,
+            )
+        except DocumentCancelled:
+            return _cancelled(doc_id, pdf_sha256, progress)
+
+    progress.clear()
+    if scheduler is not None:
+        scheduler.clear()
+    _finish_job(doc_id, pdf_sha256)
+    print(f"[AI OCR] doc={doc_id} stats: {stats}")
+    print(f"[TOTAL TIME] run_pdf_ocr total: {time.time() - total_start:.2f} sec")
+    return {"doc_id": doc_id, "stats": stats}
 
-        # 3) 컨텍스트 로드
-        t2 = time.time()
-        context = mem.get_context()
-        print(f"[TIME] Load context: {time.time() - t2:.2f} sec")
 
-        # 4) Vision GPT 분석
-        t3 = time.time()
-        ocr_text = analyze_page_with_context(img_bytes, context)
-        print(f"[TIME] Vision analysis: {time.time() - t3:.2f} sec")
+@celery_app.task(bind=True, name="ai_file_ocr.tasks.ocr_pages", **RETRY_OPTIONS)
+def ocr_pages(
+    self,
+    doc_id: int,
+    pdf_ref: str,
+    pdf_sha256: str,
+    callback_url: str,
+    outline: str,
+    refresh: bool = False,
+):
+    # 문서 일부 페이지만 처리하는 subtask (callback은 페이지 단위라 순서와 무관하게 반영된다)
+    # 우선순위가 가장 높은 페이지부터 이어진 페이지 묶음을 꺼내고, 큐가 빌 때까지 다음 묶음을 꺼낸다
+    # (재시도 시에는 이전 시도에서 꺼낸 페이지부터)
+    if is_cancelled(doc_id):
+        return {"pages": [], "stats": {}, "cancelled": True}
+    scheduler = PageScheduler(doc_id)
+    progress = DocProgress(doc_id, pdf_sha256)
 
-        # 5) callback POST
-        t4 = time.time()
+    page_numbers: List[int] = []
+
+    def claimed_pages() -> Iterator[int]:
+        for chunk in scheduler.claim_chunks(self.request.id, FANOUT_CHUNK_PAGES):
+            # 꺼낸 페이지의 진행 기록만 읽는다
+            progress.load(chunk)
+            for number in chunk:
+                if number not in progress.delivered:
+                    page_numbers.append(number)
+                    yield number
+
+    with open_pdf(pdf_ref, pdf_sha256) as pdf_path:
         try:
-            resp = requests.post(
-                callback_url,
-                json={
-                    "doc_id": doc_id,
-                    "page_number": page_number,
-                    "image_url": image_url,
-                    "ocr_text": ocr_text,
-                },
-                timeout=10,
+            stats = _run_document(
+                doc_id, pdf_sha256, pdf_path, callback_url, outline, progress,
+                pages=claimed_pages(), scheduler=scheduler, refresh=refresh, owner=self.request.id,
             )
-            resp.raise_for_status()
-        except Exception as e:
-            print(f"[AI OCR] callback 실패: doc={doc_id}, page={page_number}, error={e}")
-        print(f"[TIME] Callback POST: {time.time() - t4:.2f} sec")
+        except DocumentCancelled:
+            return {"pages": page_numbers, "stats": {}, "cancelled": True}
+    return {"pages": page_numbers, "stats": stats}
 
-        # 6) mini-summary 생성
-        t5 = time.time()
-        mini = make_mini_summary(ocr_text)
-        mem.add_summary(page_number, mini)
-        print(f"[TIME] Mini summary: {time.time() - t5:.2f} sec")
 
-        print(f"===== PAGE {page_number} END =====\n")
+@celery_app.task(name="ai_file_ocr.tasks.finish_pdf_ocr")
+def finish_pdf_ocr(results: List[dict], doc_id: int, pdf_sha256: str, started_at: float):
+    # subtask 결과를 모아 문서 단위 통계를 남긴다
+    stats = _merge_stats([r["stats"] for r in results])
+    DocProgress(doc_id, pdf_sha256).clear()
+    PageScheduler(doc_id).clear()
+    _finish_job(doc_id, pdf_sha256)
 
-    print(f"[TOTAL TIME] run_pdf_ocr total: {time.time() - total_start:.2f} sec")
-    return True
+    print(f"[AI OCR] doc={doc_id} stats: {stats}")
+    print(f"[TOTAL TIME] run_pdf_ocr total: {time.time() - started_at:.2f} sec")
+    return {"doc_id": doc_id, "pages": sorted(p for r in results for p in r["pages"]), "stats": stats}
+
+
+@celery_app.task(
+    name="ai_file_ocr.tasks.drain_ocr_outbox",
+    autoretry_for=(OutboxNotDrained,),
+    max_retries=20,
+    retry_backoff=OUTBOX_DRAIN_DELAY,
+    retry_backoff_max=3600,
+)
+def drain_ocr_outbox(doc_id: int, owner: str = ""):
+    # outbox에 남은 페이지 결과를 bulk callback으로 마저 전달한다
+    if not flush_outbox(doc_id, owner=owner):
+        raise OutboxNotDrained(f"doc={doc_id} owner={owner}")
+    return {"doc_id": doc_id}
+
+
+@celery_app.task(name="ai_file_ocr.tasks.run_pdf_ocr_deferred")
+def run_pdf_ocr_deferred(
+    doc_id: int,
+    pdf_ref: str,
+    pdf_sha256: str,
+    callback_url: str,
+    pages: Optional[List[int]] = None,
+):
+    # 급하지 않은 문서: Vision이 필요한 페이지는 batch 작업으로 제출하고 결과는 나중에 받는다
+    total_start = time.time()
+    if is_cancelled(doc_id):
+        return _cancelled(doc_id, pdf_sha256)
+    update_job(doc_id, pdf_sha256, status="running")
+    with open_pdf(pdf_ref, pdf_sha256) as pdf_path:
+        outline = build_outline(pdf_path)
+        outbox = CallbackOutbox(doc_id, callback_url)
+        try:
+            batch_id, stats = submit_deferred(
+                doc_id, pdf_ref, pdf_sha256, pdf_path, callback_url, outline, outbox, pages=pages
+            )
+        finally:
+            _close_outbox(outbox, doc_id)
+
+    if batch_id is not None:
+        poll = poll_deferred_ocr.apply_async((batch_id,), countdown=DEFERRED_POLL_SEC)
+        track_tasks(doc_id, [poll.id])
+        update_job(doc_id, pdf_sha256, ttl=_deferred_job_ttl(), status="deferred", batch_id=batch_id)
+    else:
+        _finish_job(doc_id, pdf_sha256)
+
+    print(f"[AI OCR] doc={doc_id} deferred stats: {stats}")
+    print(f"[TOTAL TIME] run_pdf_ocr_deferred submit: {time.time() - total_start:.2f} sec")
+    return {"doc_id": doc_id, "batch_id": batch_id, "stats": stats}
+
+
+@celery_app.task(bind=True, name="ai_file_ocr.tasks.poll_deferred_ocr", max_retries=None)
+def poll_deferred_ocr(self, batch_id: str):
+    meta = deferred_meta(batch_id)
+    if meta is None:
+        # 이미 처리했거나 보관 기간이 지남
+        return {"batch_id": batch_id, "collected": False}
+
+    doc_id = meta["doc_id"]
+    if is_cancelled(doc_id):
+        cancel_deferred(batch_id)
+        release_job(doc_id, meta["pdf_sha256"])
+        return {"batch_id": batch_id, "doc_id": doc_id, "cancelled": True}
+
+    outbox = CallbackOutbox(doc_id, meta["callback_url"])
+    try:
+        result = collect_deferred(batch_id, meta, outbox)
+    finally:
+        _close_outbox(outbox, doc_id)
+
+    if result is None:
+        update_job(doc_id, meta["pdf_sha256"], ttl=_deferred_job_ttl())
+        raise self.retry(countdown=DEFERRED_POLL_SEC)
+
+    # batch에서 결과를 받지 못한 페이지는 일반 경로로 다시 처리 (작업 기록은 그 작업이 정리)
+    if not result["missing"]:
+        _finish_job(doc_id, meta["pdf_sha256"])
+    else:
+        print(f"[AI OCR] doc={doc_id} deferred 누락 페이지 {result['missing']} → 일반 처리")
+        run_pdf_ocr.delay(
+            doc_id, meta["pdf_ref"], meta["pdf_sha256"], meta["callback_url"], pages=result["missing"]
+        )
+
+    print(f"[AI OCR] doc={doc_id} deferred batch {batch_id} collected: {result}")
+    return {"batch_id": batch_id, "doc_id": doc_id, **result}
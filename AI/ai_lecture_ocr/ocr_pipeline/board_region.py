@@ -0,0 +1,95 @@
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# 사진에서 칠판 / 스크린 영역(사각형)을 찾아 정면으로 펴고 그 안만 OCR한다
+RECTIFY_ENABLED = os.getenv("BOARD_OCR_RECTIFY", "1") == "1"
+# 사진 대비 칠판 사각형의 최소 / 최대 면적 비율 (최대 이상이면 이미 칠판만 찍힌 사진)
+MIN_BOARD_AREA = float(os.getenv("BOARD_OCR_MIN_BOARD_AREA", "0.2"))
+MAX_BOARD_AREA = 0.95
+# 사각형을 찾는 축소 이미지 크기 (긴 변)
+DETECT_SIDE = 800
+# 사각형 안쪽과 바로 바깥의 색 차이가 이보다 작으면 칠판 위에 그린 도형으로 본다
+MIN_EDGE_CONTRAST = 25.0
+
+
+def order_points(pts):
+    # 좌상, 우상, 우하, 좌하 순서
+    pts = np.asarray(pts, dtype=np.float32).reshape(4, 2)
+    s = pts.sum(axis=1)
+    d = np.diff(pts, axis=1).ravel()
+    return np.array(
+        [pts[np.argmin(s)], pts[np.argmin(d)], pts[np.argmax(s)], pts[np.argmax(d)]],
+        dtype=np.float32,
+    )
+
+
+def _is_board_edge(img, quad) -> bool:
+    # 칠판 테두리라면 안쪽(판면)과 바깥(벽 / 틀)의 색이 다르다
+    h, w = img.shape[:2]
+    inside = np.zeros((h, w), dtype=np.uint8)
+    cv2.fillConvexPoly(inside, quad.astype(np.int32), 255)
+    k = max(3, int(max(h, w) * 0.03))
+    band = cv2.dilate(inside, np.ones((k, k), dtype=np.uint8)) & ~inside
+    if not band.any():
+        return True
+    in_color = np.median(img[inside > 0], axis=0)
+    out_color = np.median(img[band > 0], axis=0)
+    return float(np.linalg.norm(in_color.astype(np.float32) - out_color.astype(np.float32))) >= MIN_EDGE_CONTRAST
+
+
+def find_board_quad(img) -> Optional[np.ndarray]:
+    """
+    가장 큰 볼록 사각형 윤곽을 칠판 / 스크린으로 본다. 원본 좌표의 네 꼭짓점(좌상부터 시계 방향), 못 찾으면 None.
+    """
+    h, w = img.shape[:2]
+    scale = min(1.0, DETECT_SIDE / max(h, w))
+    small = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1 else img
+    sh, sw = small.shape[:2]
+
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(gray, 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), dtype=np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    total = float(sh * sw)
+    for cnt in sorted(contours, key=cv2.contourArea, reverse=True)[:10]:
+        area = cv2.contourArea(cnt)
+        if area < total * MIN_BOARD_AREA:
+            break
+        approx = cv2.approxPolyDP(cnt, 0.02 * cv2.arcLength(cnt, True), True)
+        if len(approx) != 4 or not cv2.isContourConvex(approx):
+            continue
+        if area > total * MAX_BOARD_AREA:
+            return None
+        quad = order_points(approx)
+        if not _is_board_edge(small, quad):
+            continue
+        return quad / scale
+    return None
+
+
+def rectify(img, quad):
+    tl, tr, br, bl = quad
+    w = int(max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl)))
+    h = int(max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr)))
+    dst = np.array([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]], dtype=np.float32)
+    m = cv2.getPerspectiveTransform(quad.astype(np.float32), dst)
+    return cv2.warpPerspective(img, m, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def crop_board(img):
+    # 칠판을 찾으면 정면으로 편 칠판 영역, 못 찾으면 원본 그대로
+    if not RECTIFY_ENABLED:
+        return img
+    try:
+        quad = find_board_quad(img)
+    except cv2.error as e:
+        print(f"[AI OCR] 칠판 영역 검출 실패: {e}")
+        return img
+    if quad is None:
+        return img
+    return rectify(img, quad)
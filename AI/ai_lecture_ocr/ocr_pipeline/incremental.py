@@ -0,0 +1,299 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from .rapid_ocr_blocks import MIN_BOX_SIDE
+from .tiling import detect_tiled
+
+# 같은 페이지의 판서를 다시 찍은 경우: 이전 사진에 맞춰 정렬하고 바뀐 부분만 다시 OCR한다
+INCREMENTAL_ENABLED = os.getenv("BOARD_OCR_INCREMENTAL", "1") == "1"
+# 페이지별 마지막 판서 결과 보관 개수 / 기간 (초)
+HISTORY_MAX = int(os.getenv("BOARD_OCR_HISTORY_MAX", "256"))
+HISTORY_TTL = int(os.getenv("BOARD_OCR_HISTORY_TTL", str(3 * 3600)))
+# 보관 결과 전체 크기 상한 (MB, 축소 흑백 이미지가 대부분: 페이지당 약 0.5~1MB)
+HISTORY_MAX_MB = float(os.getenv("BOARD_OCR_HISTORY_MAX_MB", "64"))
+# 바뀐 면적이 이 비율을 넘으면 (판서를 거의 다 지우고 새로 쓴 경우) 전체 OCR
+MAX_CHANGED_RATIO = float(os.getenv("BOARD_OCR_MAX_CHANGED", "0.5"))
+
+# 정렬 / 비교용 축소 흑백 이미지 크기 (긴 변)
+ALIGN_SIDE = 1024
+# 정렬에 필요한 최소 일치 특징점 수
+MIN_MATCHES = 30
+# 비교 칸 크기 (축소 이미지 px), 밝기 차이 기준, 칸 안에서 바뀐 픽셀 비율 기준
+DIFF_CELL = 32
+DIFF_LEVEL = 40
+DIFF_RATIO = 0.02
+
+
+@dataclass
+class BoardPlan:
+    """
+    한 장의 판서 사진에서 인식할 이미지와 박스.
+    recognize_boxes 결과를 finish()에 넘기면 응답 / 다음 비교에 쓸 상태를 만든다.
+    """
+
+    image: np.ndarray
+    quads: list
+    preview: np.ndarray
+    size: tuple
+    incremental: bool = False
+    kept: List[dict] = field(default_factory=list)
+    replaced: List[dict] = field(default_factory=list)
+
+    def finish(self, boxes: List[dict]) -> dict:
+        if not self.incremental:
+            added, removed = boxes, []
+        else:
+            added, removed = _delta(boxes, self.replaced)
+        return {
+            "boxes": self.kept + boxes,
+            "added": added,
+            "removed": removed,
+            "incremental": self.incremental,
+            "preview": self.preview,
+            "size": self.size,
+        }
+
+
+def make_preview(img):
+    h, w = img.shape[:2]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    scale = ALIGN_SIDE / max(h, w)
+    if scale < 1:
+        gray = cv2.resize(gray, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def align(prev_gray, gray) -> Optional[np.ndarray]:
+    # 새 사진 → 이전 사진 좌표로의 homography (ORB 특징점 + RANSAC), 못 맞추면 None
+    orb = cv2.ORB_create(2000)
+    kp1, des1 = orb.detectAndCompute(gray, None)
+    kp2, des2 = orb.detectAndCompute(prev_gray, None)
+    if des1 is None or des2 is None or len(kp1) < MIN_MATCHES or len(kp2) < MIN_MATCHES:
+        return None
+
+    pairs = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(des1, des2, k=2)
+    good = [p[0] for p in pairs if len(p) == 2 and p[0].distance < 0.75 * p[1].distance]
+    if len(good) < MIN_MATCHES:
+        return None
+
+    src = np.float32([kp1[m.queryIdx].pt for m in good]).reshape(-1, 1, 2)
+    dst = np.float32([kp2[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+    h, mask = cv2.findHomography(src, dst, cv2.RANSAC, 4.0)
+    if h is None or int(mask.sum()) < MIN_MATCHES:
+        return None
+    return h
+
+
+def changed_grid(prev_gray, warped, valid):
+    # 칸마다 바뀌었는지 (True / False) 2차원 배열
+    a = cv2.GaussianBlur(prev_gray, (5, 5), 0).astype(np.float32)
+    b = cv2.GaussianBlur(warped, (5, 5), 0).astype(np.float32)
+    mask = valid > 0
+    # 조명 / 노출 차이는 평균 밝기를 맞춰 무시
+    if mask.any():
+        b *= a[mask].mean() / max(1.0, b[mask].mean())
+    changed = ((np.abs(a - b) > DIFF_LEVEL) & mask).astype(np.float32)
+
+    h, w = changed.shape
+    rows, cols = -(-h // DIFF_CELL), -(-w // DIFF_CELL)
+    padded = np.zeros((rows * DIFF_CELL, cols * DIFF_CELL), dtype=np.float32)
+    padded[:h, :w] = changed
+    ratio = padded.reshape(rows, DIFF_CELL, cols, DIFF_CELL).mean(axis=(1, 3))
+    return ratio > DIFF_RATIO
+
+
+def _intersects(bbox, region) -> bool:
+    return bbox[0] < region[2] and region[0] < bbox[2] and bbox[1] < region[3] and region[1] < bbox[3]
+
+
+def changed_regions(grid, sx: float, sy: float, boxes: List[dict], size) -> List[tuple]:
+    """
+    바뀐 칸을 한 칸씩 넓혀 이어진 덩어리마다 사각형으로 (원본 좌표).
+    이전 박스가 걸치면 그 박스 전체가 들어가도록 넓힌다 (줄 중간에서 잘리지 않게).
+    """
+    w, h = size
+    grown = cv2.dilate(grid.astype(np.uint8), np.ones((3, 3), dtype=np.uint8))
+    n, _, stats, _ = cv2.connectedComponentsWithStats(grown)
+    regions = []
+    for x, y, cw, ch, _ in stats[1:n]:
+        regions.append([
+            x * DIFF_CELL / sx, y * DIFF_CELL / sy,
+            (x + cw) * DIFF_CELL / sx, (y + ch) * DIFF_CELL / sy,
+        ])
+
+    for region in regions:
+        for b in boxes:
+            bbox = b["bbox"]
+            if _intersects(bbox, region):
+                region[0], region[1] = min(region[0], bbox[0]), min(region[1], bbox[1])
+                region[2], region[3] = max(region[2], bbox[2]), max(region[3], bbox[3])
+    return [
+        (max(0, int(r[0])), max(0, int(r[1])), min(w, int(np.ceil(r[2]))), min(h, int(np.ceil(r[3]))))
+        for r in regions
+    ]
+
+
+def _iou(a, b) -> float:
+    ix = min(a[2], b[2]) - max(a[0], b[0])
+    iy = min(a[3], b[3]) - max(a[1], b[1])
+    if ix <= 0 or iy <= 0:
+        return 0.0
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / max(1.0, union)
+
+
+def _delta(new_boxes: List[dict], old_boxes: List[dict]):
+    # 다시 읽은 영역에서 같은 자리 / 같은 글자는 변화 없음으로 본다
+    unmatched = list(old_boxes)
+    added = []
+    for b in new_boxes:
+        for old in unmatched:
+            if old["text"].strip() == b["text"].strip() and _iou(old["bbox"], b["bbox"]) >= 0.5:
+                unmatched.remove(old)
+                break
+        else:
+            added.append(b)
+    return added, unmatched
+
+
+def appended_below(boxes: List[dict], added: List[dict]) -> bool:
+    # 새로 쓴 박스가 모두 기존 박스보다 아래에 있는지 (이전 정리 결과 뒤에 붙여도 읽는 순서가 맞는지)
+    others = [b for b in boxes if b not in added]
+    if not added or not others:
+        return True
+    return min(a["bbox"][1] for a in added) >= max(b["bbox"][3] for b in others)
+
+
+def full_plan(session, img) -> BoardPlan:
+    h, w = img.shape[:2]
+    return BoardPlan(image=img, quads=detect_tiled(session, img), preview=make_preview(img), size=(w, h))
+
+
+def incremental_plan(session, img, prev: dict) -> Optional[BoardPlan]:
+    """
+    prev: 같은 페이지의 이전 결과 ({"preview", "size", "boxes"}).
+    새 사진을 이전 사진 좌표로 정렬해 바뀐 영역만 다시 검출한다. 정렬이 안 되거나 많이 바뀌었으면 None (전체 OCR).
+    """
+    prev_gray = prev["preview"]
+    pw, ph = prev["size"]
+    gh, gw = prev_gray.shape
+
+    gray = make_preview(img)
+    h_small = align(prev_gray, gray)
+    if h_small is None:
+        return None
+
+    warped = cv2.warpPerspective(gray, h_small, (gw, gh))
+    valid = cv2.warpPerspective(np.full_like(gray, 255), h_small, (gw, gh))
+    valid = cv2.erode(valid, np.ones((5, 5), dtype=np.uint8))
+    if (valid > 0).mean() < 0.8:
+        # 다른 각도 / 범위로 찍혀 겹치는 부분이 적음
+        return None
+
+    grid = changed_grid(prev_gray, warped, valid)
+    if grid.mean() > MAX_CHANGED_RATIO:
+        return None
+
+    # 다음 비교 기준: 이전 좌표계에 맞춘 새 사진 (겹치지 않는 가장자리는 이전 그대로)
+    preview = np.where(valid > 0, warped, prev_gray)
+    prev_boxes = prev["boxes"]
+    if not grid.any():
+        return BoardPlan(
+            image=img, quads=[], preview=preview, size=(pw, ph), incremental=True, kept=list(prev_boxes)
+        )
+
+    # 원본 해상도: 새 사진 → 축소 → (정렬) → 이전 축소 → 이전 원본
+    ih, iw = img.shape[:2]
+    s_new = np.diag([gray.shape[1] / iw, gray.shape[0] / ih, 1.0])
+    s_prev = np.diag([gw / pw, gh / ph, 1.0])
+    h_full = np.linalg.inv(s_prev) @ h_small @ s_new
+    image = cv2.warpPerspective(img, h_full, (pw, ph), borderMode=cv2.BORDER_REPLICATE)
+
+    regions = changed_regions(grid, gw / pw, gh / ph, prev_boxes, (pw, ph))
+    kept = [b for b in prev_boxes if not any(_intersects(b["bbox"], r) for r in regions)]
+    replaced = [b for b in prev_boxes if any(_intersects(b["bbox"], r) for r in regions)]
+
+    quads = []
+    for x1, y1, x2, y2 in regions:
+        if x2 - x1 < MIN_BOX_SIDE or y2 - y1 < MIN_BOX_SIDE:
+            continue
+        crop = np.ascontiguousarray(image[y1:y2, x1:x2])
+        quads.extend(np.asarray(q, dtype=np.float32).reshape(4, 2) + (x1, y1) for q in detect_tiled(session, crop))
+
+    return BoardPlan(
+        image=image, quads=quads, preview=preview, size=(pw, ph),
+        incremental=True, kept=kept, replaced=replaced,
+    )
+
+
+def _state_bytes(state: dict) -> int:
+    # 보관 결과의 대략적인 크기: 축소 이미지 + 박스 / 글자 (박스당 좌표 등 약 200 bytes)
+    size = state["preview"].nbytes + len(state.get("text") or "") * 3
+    for b in state.get("boxes") or []:
+        size += 200 + len(b.get("text") or "") * 3
+    return size
+
+
+class BoardHistory:
+    """
+    페이지별 마지막 판서 결과 {"preview", "size", "boxes", "text"}.
+    서버 프로세스 메모리에 두므로 API 서버는 워커 하나(또는 페이지별 sticky 라우팅)를 전제로 한다.
+    워커가 여럿이면 워커마다 따로 보관되어, 다른 워커로 간 요청은 전체 OCR로 처리된다 (결과는 같고 느릴 뿐).
+    오래 쓰지 않은 순으로 HISTORY_MAX개 / HISTORY_MAX_MB까지 보관한다.
+    """
+
+    def __init__(
+        self,
+        max_pages: int = HISTORY_MAX,
+        ttl: int = HISTORY_TTL,
+        max_bytes: int = int(HISTORY_MAX_MB * 1024 * 1024),
+    ):
+        self._items: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max = max_pages
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._bytes = 0
+
+    def get(self, page_id: int) -> Optional[dict]:
+        with self._lock:
+            item = self._items.get(page_id)
+            if item is None:
+                return None
+            saved_at, state, _ = item
+            if time.time() - saved_at > self._ttl:
+                self._pop(page_id)
+                return None
+            self._items.move_to_end(page_id)
+            return state
+
+    def put(self, page_id: int, state: dict) -> None:
+        size = _state_bytes(state)
+        with self._lock:
+            self._pop(page_id)
+            if size > self._max_bytes:
+                return
+            self._items[page_id] = (time.time(), state, size)
+            self._bytes += size
+            while len(self._items) > self._max or self._bytes > self._max_bytes:
+                self._pop(next(iter(self._items)))
+
+    def _pop(self, page_id: int) -> None:
+        item = self._items.pop(page_id, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+
+board_history = BoardHistory()
@@ -0,0 +1,261 @@
+import atexit
+import itertools
+import math
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .rapid_ocr_blocks import create_session, recognize_boxes
+from .board_region import crop_board
+from .incremental import full_plan, incremental_plan
+from .tiling import prepare_image
+
+# 판서 OCR 전용 워커 프로세스 수 (프로세스마다 ONNX 세션 하나를 미리 띄워 둔다)
+BOARD_OCR_WORKERS = int(os.getenv("BOARD_OCR_WORKERS", "2"))
+# 처리 중 + 대기 중 요청 상한, 넘으면 PoolBusy (429)
+BOARD_OCR_QUEUE_MAX = int(os.getenv("BOARD_OCR_QUEUE_MAX", "16"))
+# 워커가 요청을 더 모으기 위해 기다리는 최대 시간 (ms) / 한 번에 모으는 요청 수
+BOARD_OCR_BATCH_WAIT_MS = float(os.getenv("BOARD_OCR_BATCH_WAIT_MS", "5"))
+BOARD_OCR_BATCH_MAX = int(os.getenv("BOARD_OCR_BATCH_MAX", "4"))
+# 인식 모델에 한 번에 넣는 글자 영역 수
+BOARD_OCR_REC_BATCH = int(os.getenv("BOARD_OCR_REC_BATCH", "16"))
+# 요청 하나를 기다리는 최대 시간 (초), 지나면 대기 중인 요청은 워커가 건너뛴다
+BOARD_OCR_TIMEOUT = float(os.getenv("BOARD_OCR_TIMEOUT", "10"))
+
+
+class PoolBusy(Exception):
+    """대기열이 가득 찬 경우 (retry_after초 뒤 재시도 권장)"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"board OCR queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class WorkerLost(Exception):
+    """요청을 처리하던 워커 프로세스가 죽은 경우 (다시 시도하면 새 워커가 처리)"""
+
+
+def _warm_up(session) -> None:
+    # 첫 요청이 모델 초기화 비용을 내지 않도록 검출 / 인식을 한 번씩 돌려 둔다
+    session.text_det(np.full((640, 640, 3), 255, dtype=np.uint8))
+    session.text_rec([np.full((48, 320, 3), 255, dtype=np.uint8)])
+
+
+def _plan(session, image, prev):
+    # 디코딩 / 칠판 영역 펴기 / 검출까지 (서버 프로세스는 바이트만 넘긴다)
+    img = crop_board(prepare_image(image))
+    plan = None
+    if prev is not None:
+        plan = incremental_plan(session, img, prev)
+    return plan or full_plan(session, img)
+
+
+def _run_jobs(session, jobs, results) -> None:
+    t = time.time()
+    plans = []
+    for job_id, image, prev, deadline in jobs:
+        if t > deadline:
+            # 요청한 쪽이 이미 포기한 작업
+            continue
+        try:
+            plans.append((job_id, _plan(session, image, prev)))
+        except Exception as e:
+            results.put(("done", job_id, None, str(e), 0.0))
+    if not plans:
+        return
+
+    try:
+        outputs = recognize_boxes(session, [p.image for _, p in plans], [p.quads for _, p in plans])
+    except Exception as e:
+        if len(plans) == 1:
+            results.put(("done", plans[0][0], None, str(e), time.time() - t))
+            return
+        # 어느 이미지 때문인지 모르므로 하나씩 다시
+        for job_id, plan in plans:
+            try:
+                boxes = recognize_boxes(session, [plan.image], [plan.quads])[0]
+                results.put(("done", job_id, plan.finish(boxes), None, time.time() - t))
+            except Exception as e1:
+                results.put(("done", job_id, None, str(e1), time.time() - t))
+        return
+
+    elapsed = time.time() - t
+    for (job_id, plan), boxes in zip(plans, outputs):
+        results.put(("done", job_id, plan.finish(boxes), None, elapsed))
+
+
+def _serve(requests, results) -> None:
+    session = create_session()
+    if hasattr(session, "text_rec"):
+        session.text_rec.rec_batch_num = BOARD_OCR_REC_BATCH
+    _warm_up(session)
+    print(f"[AI OCR] board OCR worker ready: pid={os.getpid()}")
+
+    wait = BOARD_OCR_BATCH_WAIT_MS / 1000
+    while True:
+        job = requests.get()
+        if job is None:
+            break
+
+        # 짧게 기다리며 다른 강의의 요청을 모아 인식 단계를 한 번에 돌린다
+        jobs = [job]
+        stop = False
+        until = time.time() + wait
+        while len(jobs) < BOARD_OCR_BATCH_MAX:
+            remaining = until - time.time()
+            if remaining <= 0:
+                break
+            try:
+                job = requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                stop = True
+                break
+            jobs.append(job)
+
+        # 이 워커가 가져간 요청 (워커가 죽으면 서버가 바로 실패 처리한다)
+        results.put(("started", os.getpid(), [j[0] for j in jobs]))
+        _run_jobs(session, jobs, results)
+        if stop:
+            break
+
+
+class BoardOcrPool:
+    """
+    판서 OCR 전용 실행기. 요청은 공유 대기열에 넣고, 워커 프로세스가 꺼내 처리한다.
+    처리 중 + 대기 중 요청이 queue_max개를 넘으면 PoolBusy를 던진다.
+    워커가 죽으면 그 워커가 처리 중이던 요청은 시간 초과까지 기다리지 않고 WorkerLost로 끝낸다.
+    """
+
+    def __init__(self, workers: int = BOARD_OCR_WORKERS, queue_max: int = BOARD_OCR_QUEUE_MAX):
+        # 스레드가 도는 서버 프로세스를 fork하지 않도록 spawn
+        self._ctx = mp.get_context("spawn")
+        self._requests = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._workers: List = []
+        self._pending: Dict[int, Future] = {}
+        # 워커 pid → 처리 중인 요청 id
+        self._running: Dict[int, set] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._queue_max = queue_max
+        # 배치 하나 처리 시간 이동 평균 (Retry-After 추정용)
+        self._service_sec = 1.0
+        self._closed = False
+
+        for _ in range(max(1, workers)):
+            self._spawn()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def _spawn(self) -> None:
+        proc = self._ctx.Process(target=_serve, args=(self._requests, self._results), daemon=True)
+        proc.start()
+        self._workers.append(proc)
+
+    def _check_workers(self) -> None:
+        for proc in list(self._workers):
+            if proc.is_alive() or self._closed:
+                continue
+            print(f"[AI OCR] board OCR worker exited (code={proc.exitcode}), restarting")
+            self._workers.remove(proc)
+            with self._lock:
+                lost = [self._pending.pop(job_id, None) for job_id in self._running.pop(proc.pid, ())]
+            for fut in lost:
+                if fut is not None:
+                    fut.set_exception(WorkerLost(f"board OCR worker exited (code={proc.exitcode})"))
+            self._spawn()
+
+    def _collect(self) -> None:
+        last_check = time.time()
+        while not self._closed:
+            try:
+                message = self._results.get(timeout=1.0)
+            except (queue.Empty, OSError, EOFError):
+                message = None
+
+            if message is not None and message[0] == "started":
+                _, pid, job_ids = message
+                with self._lock:
+                    self._running.setdefault(pid, set()).update(job_ids)
+                message = None
+
+            if time.time() - last_check >= 1.0:
+                self._check_workers()
+                last_check = time.time()
+            if message is None:
+                continue
+
+            _, job_id, output, error, elapsed = message
+            with self._lock:
+                for running in self._running.values():
+                    running.discard(job_id)
+                fut = self._pending.pop(job_id, None)
+                if elapsed:
+                    self._service_sec = 0.8 * self._service_sec + 0.2 * elapsed
+            if fut is None:
+                continue
+            if error is not None:
+                fut.set_exception(RuntimeError(error))
+            else:
+                fut.set_result(output)
+
+    def retry_after(self) -> int:
+        # 지금 쌓인 요청이 워커 수만큼 나눠 처리될 때까지의 대략적인 시간
+        backlog = len(self._pending) / max(1, len(self._workers))
+        return max(1, math.ceil(backlog * self._service_sec))
+
+    def run(self, image: bytes, prev: Optional[dict] = None, timeout: float = BOARD_OCR_TIMEOUT) -> dict:
+        """
+        image: 인코딩된 이미지 바이트 (jpg / png 등), prev: 같은 페이지의 이전 결과 (있으면 바뀐 부분만 OCR)
+        반환: incremental.BoardPlan.finish() 결과
+        """
+        with self._lock:
+            if len(self._pending) >= self._queue_max:
+                raise PoolBusy(self.retry_after())
+            job_id = next(self._ids)
+            fut: Future = Future()
+            self._pending[job_id] = fut
+
+        self._requests.put((job_id, image, prev, time.time() + timeout))
+        try:
+            return fut.result(timeout=timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._pending.pop(job_id, None)
+            raise TimeoutError(f"board OCR timed out after {timeout}s")
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._requests.put(None)
+        for proc in self._workers:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+
+
+_pool: Optional[BoardOcrPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_board_pool() -> BoardOcrPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BoardOcrPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+def run_board_ocr(image: bytes, prev: Optional[dict] = None) -> dict:
+    return get_board_pool().run(image, prev=prev)
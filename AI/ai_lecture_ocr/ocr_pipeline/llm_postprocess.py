@@ -1,5 +1,5 @@
 import os
-from ai_file_ocr.pipeline.rewrite import process_latex, code_rewrite
+from ai_file_ocr.pipeline.rewrite import tag_text
 from openai import OpenAI
 from dotenv import load_dotenv
 
@@ -88,8 +88,6 @@ def call_gpt_from_blocks(blocks):
     raw = resp.choices[0].message.content
     clean = strip_think_block(raw)
 
-    clean = code_rewrite(clean)
-    
-    clean = process_latex(clean)
+    clean = tag_text(clean)
 
     return clean
\ No newline at end of file
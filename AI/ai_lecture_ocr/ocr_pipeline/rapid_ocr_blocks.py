@@ -4,12 +4,47 @@ from rapidocr_onnxruntime import RapidOCR
 import re
 import statistics
 
-ocr = RapidOCR(det_use_cuda=False, rec_use_cuda=False)
+from .board_region import crop_board
 
-def load_and_resize(img_path: str, max_side: int = 1600):
-    img = cv2.imread(img_path)
+# 인식 결과에서 제외하는 기준 (낮은 신뢰도 / 작은 박스)
+MIN_SCORE = 0.5
+MIN_BOX_SIDE = 8
+
+_ocr = None
+
+
+def create_session():
+    return RapidOCR(det_use_cuda=False, rec_use_cuda=False)
+
+
+def get_ocr():
+    # import 시점이 아니라 처음 쓸 때 세션을 만든다 (서버에서는 inference_pool 워커가 각자 만든다)
+    global _ocr
+    if _ocr is None:
+        _ocr = create_session()
+    return _ocr
+
+
+def decode_image(src):
+    """
+    파일 경로 / 인코딩된 이미지 바이트 / 이미 디코딩된 BGR 배열을 BGR 배열로.
+    바이트는 cv2.imdecode로 메모리에서 바로 디코딩한다 (임시 파일 없이).
+    """
+    if isinstance(src, np.ndarray):
+        return src
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        img = cv2.imdecode(np.frombuffer(src, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("이미지를 디코딩할 수 없습니다.")
+        return img
+    img = cv2.imread(src)
     if img is None:
-        raise FileNotFoundError(img_path)
+        raise FileNotFoundError(src)
+    return img
+
+
+def load_and_resize(src, max_side: int = 1600):
+    img = decode_image(src)
 
     h, w = img.shape[:2]
     scale = max_side / max(h, w)
@@ -20,52 +55,105 @@ def load_and_resize(img_path: str, max_side: int = 1600):
     return img
 
 
-def run_ocr(img):
-    out = ocr(img)
-    if not out:
-        return []
+def box_bbox(box):
+    pts = np.array(box).reshape(-1, 2)
+    xs = pts[:, 0]
+    ys = pts[:, 1]
+    return float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max())
 
-    if isinstance(out, tuple) and len(out) == 2:
-        ocr_result, _ = out
-    else:
-        ocr_result = out
 
-    if not ocr_result:
+def crop_box(img, box):
+    # 검출된 사각형(좌상단부터 시계 방향)을 똑바로 편 글자 영역 이미지
+    pts = np.array(box, dtype=np.float32).reshape(4, 2)
+    w = int(max(np.linalg.norm(pts[0] - pts[1]), np.linalg.norm(pts[2] - pts[3])))
+    h = int(max(np.linalg.norm(pts[0] - pts[3]), np.linalg.norm(pts[1] - pts[2])))
+    dst = np.array([[0, 0], [w, 0], [w, h], [0, h]], dtype=np.float32)
+    m = cv2.getPerspectiveTransform(pts, dst)
+    crop = cv2.warpPerspective(
+        img, m, (w, h), borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC
+    )
+    # 세로로 긴 영역은 세로쓰기로 보고 눕힌다
+    if h / max(w, 1) >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def detect_quads(session, img):
+    """
+    RapidOCR.__call__과 같은 검출 단계: 전처리(긴 변 / 짧은 변 맞추기) → 납작한 이미지 letterbox →
+    검출 + 위→아래 정렬 → 원본 좌표로 되돌리기. 작은 박스도 그대로 돌려준다.
+    """
+    raw_h, raw_w = img.shape[:2]
+    det_img, ratio_h, ratio_w = session.preprocess(img)
+    op_record = {"preprocess": {"ratio_h": ratio_h, "ratio_w": ratio_w}}
+    det_img, op_record = session.maybe_add_letterbox(det_img, op_record)
+    dt_boxes, _ = session.auto_text_det(det_img)
+    if dt_boxes is None:
         return []
+    return list(session._get_origin_points(dt_boxes, op_record, raw_h, raw_w))
 
-    results = []
 
-    for item in ocr_result:
-        if not isinstance(item, (list, tuple)) or len(item) < 2:
+def detect_boxes(session, img):
+    boxes = []
+    for box in detect_quads(session, img):
+        x1, y1, x2, y2 = box_bbox(box)
+        # 어차피 버릴 작은 박스는 인식 단계에 넣지 않는다
+        if x2 - x1 < MIN_BOX_SIDE or y2 - y1 < MIN_BOX_SIDE:
             continue
+        boxes.append(box)
+    return boxes
 
-        box = item[0]
-        text = item[1]
-        score = float(item[2]) if len(item) >= 3 else 1.0
 
-        # 너무 낮은 신뢰도 / 작은 박스는 제외
-        if score < 0.5:
-            continue
+def recognize_crops(session, crops):
+    # 글자 영역 이미지들을 방향 분류 → 인식 (RapidOCR.__call__과 같은 순서, 여러 이미지의 영역을 한 번에)
+    if not crops:
+        return []
+    if getattr(session, "use_cls", True):
+        crops, _, _ = session.text_cls(crops)
+    rec_res, _ = session.text_rec(crops)
+    return [(str(r[0]), float(r[1])) for r in rec_res]
 
-        pts = np.array(box).reshape(-1, 2)
-        xs = pts[:, 0]
-        ys = pts[:, 1]
-        x1, y1 = float(xs.min()), float(ys.min())
-        x2, y2 = float(xs.max()), float(ys.max())
-        w, h = x2 - x1, y2 - y1
 
-        if w < 8 or h < 8:
-            continue
+def ocr_images(session, imgs, detect=detect_boxes):
+    """
+    여러 이미지를 한 번에 OCR한다. 검출은 이미지마다, 인식은 모든 이미지의 글자 영역을 모아 한 번에 돌린다.
+    detect(session, img)로 검출 방식을 바꿀 수 있다 (예: tiling.detect_tiled).
+    이미지마다 [{"text", "confidence", "bbox": [x1, y1, x2, y2]}, ...] 목록을 반환.
+    """
+    return recognize_boxes(session, imgs, [detect(session, img) for img in imgs])
+
+
+def recognize_boxes(session, imgs, boxes_per_img):
+    # 이미 검출한 박스들을 이미지에 걸쳐 한 번에 인식
+    crops = []
+    for img, boxes in zip(imgs, boxes_per_img):
+        crops.extend(crop_box(img, box) for box in boxes)
+
+    rec_res = iter(recognize_crops(session, crops))
+    # RapidOCR 기본 결과와 같은 기준으로 거른다
+    min_score = getattr(session, "text_score", MIN_SCORE)
+
+    outputs = []
+    for boxes in boxes_per_img:
+        results = []
+        for box in boxes:
+            text, score = next(rec_res)
+            if score < min_score:
+                continue
+            x1, y1, x2, y2 = box_bbox(box)
+            results.append(
+                {
+                    "text": text,
+                    "confidence": score,
+                    "bbox": [int(x1), int(y1), int(x2), int(y2)],
+                }
+            )
+        outputs.append(results)
+    return outputs
 
-        results.append(
-            {
-                "text": str(text),
-                "confidence": score,
-                "bbox": [int(x1), int(y1), int(x2), int(y2)],
-            }
-        )
 
-    return results
+def run_ocr(img):
+    return ocr_images(get_ocr(), [img])[0]
 
 
 def reading_order(boxes):
@@ -276,17 +364,20 @@ def classify_blocks(lines):
     return blocks
 
 
-def process_page(img_path: str):
-    img = load_and_resize(img_path)
-    ocr_boxes = run_ocr(img)
-
+def blocks_from_boxes(ocr_boxes):
     if not ocr_boxes:
-        return {"page": img_path, "blocks": []}
-
+        return []
     lines = reading_order(ocr_boxes)
-    blocks = classify_blocks(lines)
+    return classify_blocks(lines)
+
+
+def process_page(src):
+    # src: 이미지 경로, 인코딩된 이미지 바이트 또는 BGR 배열
+    # 칠판 / 스크린 영역만 정면으로 펴서 OCR
+    img = crop_board(load_and_resize(src))
+    ocr_boxes = run_ocr(img)
 
     return {
-        "page": img_path,
-        "blocks": blocks,
+        "page": src if isinstance(src, str) else None,
+        "blocks": blocks_from_boxes(ocr_boxes),
     }
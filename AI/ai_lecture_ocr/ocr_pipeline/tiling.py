@@ -0,0 +1,169 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .rapid_ocr_blocks import MIN_BOX_SIDE, box_bbox, detect_boxes, detect_quads, load_and_resize
+
+# 판서 사진을 원본 해상도 타일로 나눠 검출한다 (뒷자리에서 찍은 작은 글씨가 축소 과정에서 사라지지 않도록)
+TILE_ENABLED = os.getenv("BOARD_OCR_TILED", "1") == "1"
+# 긴 변이 이보다 큰 사진만 타일로 나눈다 (작은 사진은 기존처럼 한 번에 검출)
+TILE_MIN_SIDE = int(os.getenv("BOARD_OCR_TILE_MIN_SIDE", "2000"))
+# 원본 긴 변 상한 (이보다 큰 사진은 여기까지만 줄인다)
+TILE_MAX_SIDE = int(os.getenv("BOARD_OCR_TILE_MAX_SIDE", "4096"))
+TILE_SIZE = int(os.getenv("BOARD_OCR_TILE_SIZE", "1280"))
+# 타일 경계에 걸친 글자가 한쪽 타일에는 온전히 들어오도록 겹치는 폭
+TILE_OVERLAP = int(os.getenv("BOARD_OCR_TILE_OVERLAP", "192"))
+# 워커 프로세스 안에서 타일 검출을 동시에 돌리는 스레드 수
+TILE_THREADS = int(os.getenv("BOARD_OCR_TILE_THREADS", "2"))
+# 글씨가 있는 타일을 고르는 저해상도 검출 크기 (긴 변)
+PREVIEW_SIDE = int(os.getenv("BOARD_OCR_PREVIEW_SIDE", "1024"))
+# 작은 박스 면적 대비 겹침이 이 이상이면 같은 글자로 보고 하나만 남긴다
+NMS_OVERLAP = 0.5
+
+Tile = Tuple[int, int, int, int]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, TILE_THREADS))
+        return _executor
+
+
+def _starts(length: int, size: int, step: int) -> List[int]:
+    if length <= size:
+        return [0]
+    starts = list(range(0, length - size, step))
+    starts.append(length - size)
+    return starts
+
+
+def tile_grid(w: int, h: int, size: int = TILE_SIZE, overlap: int = TILE_OVERLAP) -> List[Tile]:
+    step = max(1, size - overlap)
+    return [
+        (x, y, min(x + size, w), min(y + size, h))
+        for y in _starts(h, size, step)
+        for x in _starts(w, size, step)
+    ]
+
+
+def _intersects(a, b) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def select_tiles(tiles: List[Tile], regions) -> List[Tile]:
+    # 글씨 영역과 겹치는 타일만
+    return [t for t in tiles if any(_intersects(t, r) for r in regions)]
+
+
+def _area(b) -> float:
+    return max(0.0, b[2] - b[0]) * max(0.0, b[3] - b[1])
+
+
+def _quad(b):
+    x1, y1, x2, y2 = b
+    return np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float32)
+
+
+def merge_boxes(found):
+    """
+    found: [(quad, cut), ...]  cut = 타일 안쪽 경계에 닿아 잘렸을 수 있는 박스
+    겹치는 타일에서 두 번 잡힌 글자는 하나만 남기고 (NMS),
+    경계에서 잘린 조각은 같은 줄에서 겹치는 박스와 합친다 (겹침 폭보다 긴 줄).
+    """
+    items = sorted(
+        ((box_bbox(quad), quad, cut) for quad, cut in found),
+        key=lambda it: _area(it[0]),
+        reverse=True,
+    )
+    kept = []
+    for bbox, quad, cut in items:
+        for k in kept:
+            kb = k[0]
+            ix = min(bbox[2], kb[2]) - max(bbox[0], kb[0])
+            iy = min(bbox[3], kb[3]) - max(bbox[1], kb[1])
+            if ix <= 0 or iy <= 0:
+                continue
+            same_line = iy / max(1.0, min(bbox[3] - bbox[1], kb[3] - kb[1])) >= 0.5
+            if (cut or k[2]) and same_line:
+                union = (min(bbox[0], kb[0]), min(bbox[1], kb[1]), max(bbox[2], kb[2]), max(bbox[3], kb[3]))
+                if union != kb:
+                    k[0], k[1] = union, _quad(union)
+                k[2] = k[2] or cut
+                break
+            if ix * iy / max(1.0, min(_area(bbox), _area(kb))) >= NMS_OVERLAP:
+                break
+        else:
+            kept.append([bbox, quad, cut])
+    return [k[1] for k in kept]
+
+
+def _detect_tile(session, img, tile: Tile):
+    x1, y1, x2, y2 = tile
+    h, w = img.shape[:2]
+    dt_boxes = detect_quads(session, np.ascontiguousarray(img[y1:y2, x1:x2]))
+
+    found = []
+    edge = 2
+    for box in dt_boxes:
+        quad = np.asarray(box, dtype=np.float32).reshape(4, 2) + (x1, y1)
+        bx1, by1, bx2, by2 = box_bbox(quad)
+        # 사진 가장자리가 아닌 타일 경계에 닿은 박스
+        cut = (
+            (x1 > 0 and bx1 <= x1 + edge) or (x2 < w and bx2 >= x2 - edge)
+            or (y1 > 0 and by1 <= y1 + edge) or (y2 < h and by2 >= y2 - edge)
+        )
+        found.append((quad, cut))
+    return found
+
+
+def detect_tiled(session, img):
+    """
+    큰 사진: 저해상도로 한 번 검출해 글씨가 있는 타일만 고르고,
+    그 타일들을 원본 해상도로 병렬 검출한 뒤 경계에서 겹친 박스를 합친다.
+    작은 사진은 detect_boxes와 같다.
+    """
+    h, w = img.shape[:2]
+    if max(h, w) <= TILE_MIN_SIDE:
+        return detect_boxes(session, img)
+
+    scale = PREVIEW_SIDE / max(h, w)
+    preview = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    dt_boxes = detect_quads(session, preview)
+    if not dt_boxes:
+        return []
+
+    # 저해상도에서는 작은 박스도 버리지 않는다 (원본에서 다시 검출할 후보)
+    margin = TILE_OVERLAP / 2
+    regions = []
+    for box in dt_boxes:
+        x1, y1, x2, y2 = box_bbox(box)
+        regions.append((x1 / scale - margin, y1 / scale - margin, x2 / scale + margin, y2 / scale + margin))
+    tiles = select_tiles(tile_grid(w, h), regions)
+
+    found = []
+    for part in _get_executor().map(lambda t: _detect_tile(session, img, t), tiles):
+        found.extend(part)
+
+    boxes = []
+    for quad in merge_boxes(found):
+        x1, y1, x2, y2 = box_bbox(quad)
+        if x2 - x1 < MIN_BOX_SIDE or y2 - y1 < MIN_BOX_SIDE:
+            continue
+        boxes.append(quad)
+    return boxes
+
+
+def prepare_image(src):
+    # 타일 모드면 원본 해상도 그대로 (TILE_MAX_SIDE까지), 아니면 기존처럼 1600으로 축소
+    if TILE_ENABLED:
+        return load_and_resize(src, max_side=TILE_MAX_SIDE)
+    return load_and_resize(src)
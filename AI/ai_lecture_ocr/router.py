@@ -1,30 +1,82 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from pydantic import BaseModel
-import base64, tempfile
+from typing import Optional
+import base64, time
 
-from .ocr_pipeline.rapid_ocr_blocks import process_page
+from .ocr_pipeline.rapid_ocr_blocks import blocks_from_boxes
+from .ocr_pipeline.inference_pool import PoolBusy, WorkerLost, run_board_ocr
+from .ocr_pipeline.incremental import INCREMENTAL_ENABLED, appended_below, board_history
 from .ocr_pipeline.llm_postprocess import call_gpt_from_blocks
 
 router = APIRouter()
 
 class BoardOcrRequest(BaseModel):
     image_base64: str
+    page_id: Optional[int] = None
 
 
-@router.post("/ocr/board")
-def board_ocr(request: BoardOcrRequest):
+def _board_text(img_bytes: bytes, page_id: Optional[int] = None) -> dict:
     try:
-        img_bytes = base64.b64decode(request.image_base64)
+        t = time.time()
+        # 같은 페이지를 다시 찍은 사진이면 이전 결과와 비교해 바뀐 부분만 OCR
+        prev = board_history.get(page_id) if page_id is not None and INCREMENTAL_ENABLED else None
+
+        # 전용 워커 프로세스에서 메모리 위 이미지를 바로 디코딩해 OCR (대기열이 가득 차면 429)
+        result = run_board_ocr(img_bytes, prev=prev)
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
-            tmp.write(img_bytes)
-            tmp.flush()
-            img_path = tmp.name
+        delta = None
+        if not result["incremental"]:
+            text = call_gpt_from_blocks(blocks_from_boxes(result["boxes"]))
+        elif not result["added"] and not result["removed"]:
+            # 바뀐 내용 없음
+            text, delta = prev["text"], ""
+        elif not result["removed"] and appended_below(result["boxes"], result["added"]):
+            # 기존 판서 아래에 새로 쓴 부분만 LLM에 보내고 이전 결과 뒤에 붙인다
+            delta = call_gpt_from_blocks(blocks_from_boxes(result["added"]))
+            text = f"{prev['text']}\n\n{delta}" if prev["text"] else delta
+        else:
+            # 지우거나 고친 부분이 있거나 기존 판서 사이 / 옆에 새로 썼으면
+            # 이전 정리 결과 뒤에 붙이면 순서가 틀어지므로 전체를 다시 정리 (OCR은 바뀐 부분만)
+            text = call_gpt_from_blocks(blocks_from_boxes(result["boxes"]))
 
-        page = process_page(img_path)
-        text = call_gpt_from_blocks(page["blocks"])
+        if page_id is not None:
+            board_history.put(page_id, {
+                "preview": result["preview"],
+                "size": result["size"],
+                "boxes": result["boxes"],
+                "text": text,
+            })
+        mode = "incremental" if result["incremental"] else "full"
+        print(f"[TIME] Board OCR ({mode}, page={page_id}): {time.time() - t:.2f} sec")
 
-        return {"text": text}
+        return {"text": text, "delta": delta, "incremental": result["incremental"]}
 
+    except PoolBusy as e:
+        raise HTTPException(
+            status_code=429,
+            detail="판서 OCR 요청이 많습니다. 잠시 후 다시 시도해 주세요.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except WorkerLost:
+        raise HTTPException(
+            status_code=503,
+            detail="판서 OCR 처리 중 오류가 발생했습니다. 다시 시도해 주세요.",
+            headers={"Retry-After": "1"},
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OCR 실패: {e}")
+
+
+@router.post("/ocr/board")
+def board_ocr(request: BoardOcrRequest):
+    try:
+        img_bytes = base64.b64decode(request.image_base64)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"이미지 디코딩 실패: {e}")
+    return _board_text(img_bytes, request.page_id)
+
+
+@router.post("/ocr/board/file")
+def board_ocr_file(image: UploadFile = File(...), page_id: Optional[int] = Form(None)):
+    # multipart 업로드 (base64로 부풀리지 않고 바이트 그대로)
+    return _board_text(image.file.read(), page_id)
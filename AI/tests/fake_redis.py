@@ -0,0 +1,149 @@
+import fnmatch
+
+
+class FakeRedis:
+    """
+    테스트용 메모리 Redis (decode_responses=True처럼 문자열로 돌려준다).
+    OCR 파이프라인이 쓰는 명령만 구현하고, 만료(expire)는 기록만 한다.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.ttl = {}
+
+    # keys
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            if self.data.pop(key, None) is not None:
+                removed += 1
+            self.ttl.pop(key, None)
+        return removed
+
+    def exists(self, *keys):
+        return sum(1 for key in keys if key in self.data)
+
+    def expire(self, key, seconds):
+        if key not in self.data:
+            return False
+        self.ttl[key] = seconds
+        return True
+
+    def scan_iter(self, match="*", count=None):
+        return [key for key in list(self.data) if fnmatch.fnmatchcase(key, match)]
+
+    # strings
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False, xx=False):
+        if nx and key in self.data:
+            return None
+        if xx and key not in self.data:
+            return None
+        self.data[key] = str(value)
+        if ex is not None:
+            self.ttl[key] = ex
+        return True
+
+    # hashes
+    def hset(self, key, field=None, value=None, mapping=None):
+        h = self.data.setdefault(key, {})
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        added = sum(1 for f in items if f not in h)
+        h.update({f: str(v) for f, v in items.items()})
+        return added
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def hmget(self, key, fields):
+        h = self.data.get(key, {})
+        return [h.get(f) for f in fields]
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hdel(self, key, *fields):
+        h = self.data.get(key, {})
+        removed = sum(1 for f in fields if h.pop(f, None) is not None)
+        if key in self.data and not h:
+            self.delete(key)
+        return removed
+
+    def hkeys(self, key):
+        return list(self.data.get(key, {}))
+
+    # sets
+    def sadd(self, key, *members):
+        s = self.data.setdefault(key, set())
+        added = sum(1 for m in members if str(m) not in s)
+        s.update(str(m) for m in members)
+        return added
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def sismember(self, key, member):
+        return str(member) in self.data.get(key, set())
+
+    def smismember(self, key, members):
+        s = self.data.get(key, set())
+        return [int(str(m) in s) for m in members]
+
+    # sorted sets
+    def zadd(self, key, mapping, nx=False, xx=False, ch=False):
+        z = self.data.setdefault(key, {})
+        changed = 0
+        for member, score in mapping.items():
+            if (nx and member in z) or (xx and member not in z):
+                continue
+            if z.get(member) != score:
+                changed += 1
+            z[member] = float(score)
+        if not z:
+            self.delete(key)
+        return changed
+
+    def zrem(self, key, *members):
+        z = self.data.get(key, {})
+        removed = sum(1 for m in members if z.pop(m, None) is not None)
+        if key in self.data and not z:
+            self.delete(key)
+        return removed
+
+    def zpopmin(self, key, count=1):
+        z = self.data.get(key, {})
+        popped = sorted(z.items(), key=lambda item: (item[1], item[0]))[:count]
+        for member, _ in popped:
+            del z[member]
+        if key in self.data and not z:
+            self.delete(key)
+        return popped
+
+    def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self._client = client
+        self._calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._calls.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        calls, self._calls = self._calls, []
+        return [method(*args, **kwargs) for method, args, kwargs in calls]
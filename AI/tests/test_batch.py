@@ -0,0 +1,32 @@
+import json
+import unittest
+
+from ai_file_ocr.pipeline.batch import LocalBatchProvider, OpenAIBatchProvider, get_batch_provider, split_requests
+
+
+class SplitRequestsTest(unittest.TestCase):
+    def lines(self, parts):
+        return [[json.loads(line)["custom_id"] for line in part] for part in parts]
+
+    def test_request_count_limit(self):
+        requests = [{"custom_id": str(i)} for i in range(5)]
+        parts = list(split_requests(requests, max_requests=2, max_bytes=10 ** 6))
+        self.assertEqual(self.lines(parts), [["0", "1"], ["2", "3"], ["4"]])
+
+    def test_byte_limit(self):
+        requests = [{"custom_id": str(i), "body": "x" * 100} for i in range(3)]
+        size = len(json.dumps(requests[0]).encode("utf-8")) + 1
+        parts = list(split_requests(requests, max_requests=100, max_bytes=size * 2))
+        self.assertEqual(self.lines(parts), [["0", "1"], ["2"]])
+        self.assertTrue(all(sum(map(len, part)) <= size * 2 for part in parts))
+
+    def test_provider_follows_batch_id(self):
+        # 제출한 제공자로 확인하고, 자리표시 결과는 캐시하지 않는다
+        self.assertIsInstance(get_batch_provider("local_abc"), LocalBatchProvider)
+        self.assertIsInstance(get_batch_provider("batch_1,batch_2"), OpenAIBatchProvider)
+        self.assertFalse(get_batch_provider("local_abc").cacheable)
+        self.assertTrue(get_batch_provider("batch_1").cacheable)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+
+from ai_file_ocr import tasks
+from ai_file_ocr.pipeline import cancel, jobs, outbox, progress, scheduler
+from ai_file_ocr.pipeline.jobs import claim_job, job_key
+from ai_file_ocr.pipeline.ocr import PageAnalysis
+from ai_file_ocr.pipeline.progress import DocProgress
+
+from tests.fake_redis import FakeRedis
+
+
+class CancelPdfOcrTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        for module in (cancel, jobs, outbox, progress, scheduler):
+            patcher = mock.patch.object(module, "redis_client", self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(tasks.celery_app.control, "revoke")
+        self.revoke = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cancel_clears_progress_and_releases_job(self):
+        # revoke된 subtask 때문에 finish_pdf_ocr가 돌지 않아도 다시 제출할 수 있어야 한다
+        self.assertIsNone(claim_job(1, "sha"))
+        claim_job(2, "sha")
+        DocProgress(1, "sha").save_page(1, PageAnalysis(text="a", summary=""))
+        DocProgress(1, "old").save_page(1, PageAnalysis(text="b", summary=""))
+        DocProgress(2, "sha").save_page(1, PageAnalysis(text="c", summary=""))
+        cancel.track_tasks(1, ["t1", "t2"])
+
+        self.assertEqual(tasks.cancel_pdf_ocr(1), 2)
+        self.revoke.assert_called_once_with(["t1", "t2"])
+        self.assertEqual(DocProgress(1, "sha").load().pages, {})
+        self.assertEqual(DocProgress(1, "old").load().pages, {})
+        self.assertFalse(self.redis.exists(job_key(1, "sha")))
+        self.assertIsNone(claim_job(1, "sha"))
+
+        # 다른 문서는 그대로
+        self.assertEqual(sorted(DocProgress(2, "sha").load().pages), [1])
+        self.assertTrue(self.redis.exists(job_key(2, "sha")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from ai_file_ocr.pipeline.dedup import PageDeduper, crop_region
+
+
+def _page(lines):
+    img = np.full((768, 1024, 3), 255, dtype=np.uint8)
+    cv2.putText(img, "Lecture 3: Sorting", (60, 100), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 4)
+    for i, line in enumerate(lines):
+        cv2.putText(img, line, (80, 220 + i * 60), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+def _thumb(image):
+    gray = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    return cv2.resize(gray, (128, 96), interpolation=cv2.INTER_AREA)
+
+
+BASE = ["- merge sort is stable", "- quick sort is not stable"]
+# 128px 썸네일에서는 거의 보이지 않는 한 글자 수정
+EDITED = ["- merge sort is stabie", "- quick sort is not stable"]
+
+
+class PageDeduperTest(unittest.TestCase):
+    def test_identical_page_is_duplicate(self):
+        image = _page(BASE)
+        deduper = PageDeduper()
+        self.assertEqual(deduper.classify(1, _thumb(image), "sig", image).kind, "new")
+        result = deduper.classify(2, _thumb(image), "sig", image)
+        self.assertEqual((result.kind, result.ref), ("duplicate", 1))
+
+    def test_small_edit_is_not_duplicate(self):
+        a, b = _page(BASE), _page(EDITED)
+        deduper = PageDeduper()
+        deduper.classify(1, _thumb(a), None, a)
+        result = deduper.classify(2, _thumb(b), None, b)
+        self.assertNotEqual(result.kind, "duplicate")
+
+    def test_different_text_layer_is_not_duplicate(self):
+        image = _page(BASE)
+        deduper = PageDeduper()
+        deduper.classify(1, _thumb(image), "a", image)
+        self.assertNotEqual(deduper.classify(2, _thumb(image), "b", image).kind, "duplicate")
+
+    def test_added_line_is_delta(self):
+        a, b = _page(BASE), _page(BASE + ["- heap sort is in-place"])
+        deduper = PageDeduper()
+        deduper.classify(1, _thumb(a), None, a)
+        result = deduper.classify(2, _thumb(b), None, b)
+        self.assertEqual((result.kind, result.ref), ("delta", 1))
+        x0, y0, x1, y1 = result.bbox
+        self.assertGreater(y0, 0.3)
+
+    def test_distant_duplicate_needs_text_layer(self):
+        # 사이에 전혀 다른 페이지가 있어 직전 페이지 비교(delta)로는 잡히지 않는 경우
+        section, other = _page(["- Part 2"]), _page(["- " + "x" * 40] * 9)
+        deduper = PageDeduper()
+        deduper.classify(1, _thumb(section), None, section)
+        deduper.classify(2, _thumb(other), None, other)
+        self.assertEqual(deduper.classify(3, _thumb(section), None, section).kind, "new")
+
+        deduper = PageDeduper()
+        deduper.classify(1, _thumb(section), "part2", section)
+        deduper.classify(2, _thumb(other), "body", other)
+        result = deduper.classify(3, _thumb(section), "part2", section)
+        self.assertEqual((result.kind, result.ref), ("duplicate", 1))
+
+    def test_blank_page(self):
+        blank = np.full((96, 128), 255, dtype=np.uint8)
+        self.assertEqual(PageDeduper().classify(1, blank).kind, "blank")
+
+
+class CropRegionTest(unittest.TestCase):
+    def test_crop(self):
+        image = _page(BASE)
+        crop = cv2.imdecode(np.frombuffer(crop_region(image, (0.0, 0.0, 0.5, 0.25)), dtype=np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(crop.shape[:2], (192, 512))
+
+    def test_crop_from_webp_rendition(self):
+        # 학생용 이미지는 기본이 WebP rendition
+        img = cv2.imdecode(np.frombuffer(_page(BASE), dtype=np.uint8), cv2.IMREAD_COLOR)
+        image = cv2.imencode(".webp", img)[1].tobytes()
+        crop = cv2.imdecode(np.frombuffer(crop_region(image, (0.5, 0.5, 1.0, 1.0)), dtype=np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(crop.shape[:2], (384, 512))
+
+    def test_undecodable_image_falls_back(self):
+        self.assertEqual(crop_region(b"not an image", (0.1, 0.1, 0.2, 0.2)), b"not an image")
+
+
+if __name__ == "__main__":
+    unittest.main()
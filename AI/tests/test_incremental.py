@@ -0,0 +1,96 @@
+import unittest
+
+import numpy as np
+
+from ai_lecture_ocr.ocr_pipeline.incremental import (
+    DIFF_CELL,
+    BoardHistory,
+    _delta,
+    appended_below,
+    changed_regions,
+)
+
+
+def box(text, x1, y1, x2, y2):
+    return {"text": text, "bbox": [x1, y1, x2, y2]}
+
+
+def state(side=10, boxes=()):
+    return {"preview": np.zeros((side, side), dtype=np.uint8), "size": (side, side), "boxes": list(boxes), "text": ""}
+
+
+class DeltaTest(unittest.TestCase):
+    def test_same_text_same_place_is_unchanged(self):
+        old = [box("a+b", 0, 0, 50, 20), box("x=1", 0, 30, 50, 50)]
+        new = [box("a+b", 2, 1, 51, 21), box("x=2", 0, 30, 50, 50)]
+        added, removed = _delta(new, old)
+        self.assertEqual([b["text"] for b in added], ["x=2"])
+        self.assertEqual([b["text"] for b in removed], ["x=1"])
+
+    def test_same_text_elsewhere_is_added(self):
+        added, removed = _delta([box("a", 200, 200, 250, 220)], [box("a", 0, 0, 50, 20)])
+        self.assertEqual((len(added), len(removed)), (1, 1))
+
+
+class ChangedRegionsTest(unittest.TestCase):
+    def test_region_grows_to_cover_crossing_boxes(self):
+        grid = np.zeros((4, 4), dtype=bool)
+        grid[1, 1] = True
+        # 한 칸씩 넓혀 3x3 칸, 걸친 박스 전체가 들어가도록 오른쪽으로 확장
+        boxes = [box("t", 90, 10, 150, 30), box("far", 180, 180, 190, 190)]
+        regions = changed_regions(grid, 1.0, 1.0, boxes, (200, 200))
+        self.assertEqual(regions, [(0, 0, 150, 3 * DIFF_CELL)])
+
+    def test_scaled_to_original_and_clipped(self):
+        grid = np.zeros((2, 2), dtype=bool)
+        grid[1, 1] = True
+        regions = changed_regions(grid, 0.5, 0.5, [], (100, 100))
+        self.assertEqual(regions, [(0, 0, 100, 100)])
+
+
+class AppendedBelowTest(unittest.TestCase):
+    def test_added_below_existing(self):
+        kept = [box("1", 0, 0, 100, 20), box("2", 0, 30, 100, 50)]
+        added = [box("3", 0, 60, 100, 80)]
+        self.assertTrue(appended_below(kept + added, added))
+
+    def test_added_between_or_beside_existing(self):
+        kept = [box("1", 0, 0, 100, 20), box("2", 0, 60, 100, 80)]
+        between = [box("1.5", 0, 30, 100, 50)]
+        beside = [box("1'", 150, 0, 250, 20)]
+        self.assertFalse(appended_below(kept + between, between))
+        self.assertFalse(appended_below(kept + beside, beside))
+
+
+class BoardHistoryTest(unittest.TestCase):
+    def test_bounded_by_bytes(self):
+        history = BoardHistory(max_pages=100, ttl=60, max_bytes=450)
+        for page_id in (1, 2, 3):
+            history.put(page_id, state())
+        self.assertIsNotNone(history.get(1))
+        # 100 + 박스 하나 (200 + 글자) → 가장 오래 쓰지 않은 2번부터 밀려난다
+        history.put(4, state(boxes=[box("ab", 0, 0, 1, 1)]))
+        self.assertIsNone(history.get(2))
+        self.assertIsNone(history.get(3))
+        self.assertIsNotNone(history.get(1))
+        self.assertEqual(history.nbytes, 100 + 306)
+
+    def test_replace_and_oversized(self):
+        history = BoardHistory(max_pages=100, ttl=60, max_bytes=350)
+        history.put(1, state())
+        history.put(1, state())
+        self.assertEqual(history.nbytes, 100)
+        # 상한보다 큰 결과는 보관하지 않는다 (이전 결과도 지움)
+        history.put(1, state(side=20))
+        self.assertIsNone(history.get(1))
+        self.assertEqual(history.nbytes, 0)
+
+    def test_expired(self):
+        history = BoardHistory(max_pages=100, ttl=-1, max_bytes=10 ** 6)
+        history.put(1, state())
+        self.assertIsNone(history.get(1))
+        self.assertEqual(history.nbytes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
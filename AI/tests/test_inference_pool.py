@@ -0,0 +1,61 @@
+import threading
+import unittest
+from concurrent.futures import Future
+
+from ai_lecture_ocr.ocr_pipeline.inference_pool import BoardOcrPool, WorkerLost
+
+
+class FakeProc:
+    def __init__(self, pid, alive):
+        self.pid = pid
+        self.alive = alive
+        self.exitcode = None if alive else -9
+
+    def is_alive(self):
+        return self.alive
+
+
+def make_pool(workers):
+    # 프로세스를 띄우지 않고 워커 감시 부분만 확인한다
+    pool = BoardOcrPool.__new__(BoardOcrPool)
+    pool._closed = False
+    pool._lock = threading.Lock()
+    pool._workers = list(workers)
+    pool._pending = {}
+    pool._running = {}
+    pool.spawned = 0
+
+    def spawn():
+        pool.spawned += 1
+        pool._workers.append(FakeProc(1000 + pool.spawned, True))
+
+    pool._spawn = spawn
+    return pool
+
+
+class CheckWorkersTest(unittest.TestCase):
+    def test_dead_worker_fails_its_requests_at_once(self):
+        pool = make_pool([FakeProc(1, False), FakeProc(2, True)])
+        futs = {job_id: Future() for job_id in (10, 11, 12)}
+        pool._pending.update(futs)
+        pool._running = {1: {10, 11}, 2: {12}}
+
+        pool._check_workers()
+
+        for job_id in (10, 11):
+            self.assertIsInstance(futs[job_id].exception(timeout=0), WorkerLost)
+        self.assertFalse(futs[12].done())
+        self.assertEqual(set(pool._pending), {12})
+        self.assertEqual(pool._running, {2: {12}})
+        self.assertEqual(pool.spawned, 1)
+        self.assertEqual([p.pid for p in pool._workers], [2, 1001])
+
+    def test_restarts_every_dead_worker(self):
+        pool = make_pool([FakeProc(1, False), FakeProc(2, False)])
+        pool._check_workers()
+        self.assertEqual(pool.spawned, 2)
+        self.assertTrue(all(p.is_alive() for p in pool._workers))
+
+
+if __name__ == "__main__":
+    unittest.main()
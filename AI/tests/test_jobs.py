@@ -0,0 +1,72 @@
+import unittest
+from unittest import mock
+
+from ai_file_ocr import tasks
+from ai_file_ocr.pipeline import cancel, jobs
+from ai_file_ocr.pipeline.jobs import job_exists, reocr_key
+
+from tests.fake_redis import FakeRedis
+
+CALLBACK_URL = "http://be/docs/1/ocr-callback/"
+
+
+class ReOcrSingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        for module in (cancel, jobs):
+            patcher = mock.patch.object(module, "redis_client", self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.submitted = []
+        patcher = mock.patch.object(tasks.run_pdf_ocr, "delay", side_effect=self._delay)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _delay(self, *args, **kwargs):
+        self.submitted.append((args, kwargs))
+        return mock.Mock(id=f"task-{len(self.submitted)}")
+
+    def test_new_request_is_queued(self):
+        self.assertIsNone(tasks.submit_reocr(1, "sha", [3, 5], CALLBACK_URL))
+        self.assertEqual(self.submitted[0][1], {"pages": [3, 5], "refresh": True})
+
+    def test_request_during_running_job_runs_after_it(self):
+        tasks.submit_reocr(1, "sha", [1], CALLBACK_URL)
+
+        # 실행 중인 작업에 붙으면 바로 등록하지 않고 남겨 둔다
+        existing = tasks.submit_reocr(1, "sha", [4, 2], CALLBACK_URL)
+        self.assertEqual(existing["task_id"], "task-1")
+        self.assertEqual(len(self.submitted), 1)
+        tasks.submit_reocr(1, "sha", [2, 7], CALLBACK_URL)
+
+        # 실행 중인 작업이 끝나면 남은 페이지를 한 작업으로 이어서 등록
+        tasks._finish_job(1, "sha")
+        self.assertEqual(len(self.submitted), 2)
+        args, kwargs = self.submitted[1]
+        self.assertEqual(args[2:], ("sha", CALLBACK_URL))
+        self.assertEqual(kwargs, {"pages": [2, 4, 7], "refresh": True})
+        self.assertTrue(job_exists(1, "sha"))
+        self.assertFalse(self.redis.exists(reocr_key(1, "sha")))
+
+        # 이어서 등록한 작업이 끝나면 더 할 일이 없다
+        tasks._finish_job(1, "sha")
+        self.assertEqual(len(self.submitted), 2)
+        self.assertFalse(job_exists(1, "sha"))
+
+    def test_job_finishing_while_attaching(self):
+        tasks.submit_reocr(1, "sha", [1], CALLBACK_URL)
+        # 요청을 남기기 직전에 실행 중이던 작업이 끝난 경우
+        add = jobs.add_pending_reocr
+
+        def finish_then_add(*args):
+            jobs.release_job(1, "sha")
+            add(*args)
+
+        with mock.patch.object(tasks, "add_pending_reocr", side_effect=finish_then_add):
+            self.assertIsNone(tasks.submit_reocr(1, "sha", [6], CALLBACK_URL))
+        self.assertEqual(self.submitted[-1][1], {"pages": [6], "refresh": True})
+        self.assertFalse(self.redis.exists(reocr_key(1, "sha")))
+
+
+if __name__ == "__main__":
+    unittest.main()
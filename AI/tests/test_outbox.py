@@ -0,0 +1,147 @@
+import json
+import unittest
+from unittest import mock
+
+import requests
+
+from ai_file_ocr.pipeline import cancel, outbox
+from ai_file_ocr.pipeline.outbox import (
+    CallbackOutbox, dead_letter_key, delete_outboxes, flush_outbox, outbox_key,
+)
+
+from tests.fake_redis import FakeRedis
+
+CALLBACK_URL = "http://be/docs/1/ocr-callback/"
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self._body = body if body is not None else {"rejected": []}
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}")
+
+
+class OutboxTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        for module in (outbox, cancel):
+            patcher = mock.patch.object(module, "redis_client", self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(outbox, "OUTBOX_BATCH_SIZE", 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.posted = []
+        self.responses = []
+        patcher = mock.patch.object(outbox.requests, "post", side_effect=self._post)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, url, json=None, timeout=None):
+        self.posted.append((url, [p["page_number"] for p in json["pages"]]))
+        response = self.responses.pop(0) if self.responses else FakeResponse()
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def _add(self, numbers, owner=""):
+        key = outbox_key(1, owner)
+        for n in numbers:
+            item = {
+                "callback_url": CALLBACK_URL, "page_number": n,
+                "image_url": f"https://img/{n}", "thumbnail_url": None, "ocr_text": f"p{n}",
+            }
+            self.redis.hset(key, str(n), json.dumps(item))
+
+    def test_sends_sorted_batches(self):
+        self._add([5, 1, 4, 2, 3])
+        delivered = []
+        self.assertTrue(flush_outbox(1, delivered.append))
+        self.assertEqual(self.posted, [
+            ("http://be/docs/1/ocr-callback/bulk/", [1, 2, 3]),
+            ("http://be/docs/1/ocr-callback/bulk/", [4, 5]),
+        ])
+        self.assertEqual(delivered, [[1, 2, 3], [4, 5]])
+        self.assertEqual(self.redis.hgetall(outbox_key(1)), {})
+
+    def test_failed_batch_does_not_block_later_batches(self):
+        self._add(range(1, 8))
+        self.responses = [requests.ConnectionError("down"), FakeResponse(503), FakeResponse()]
+        delivered = []
+        self.assertFalse(flush_outbox(1, delivered.append))
+        self.assertEqual([pages for _, pages in self.posted], [[1, 2, 3], [4, 5, 6], [7]])
+        self.assertEqual(delivered, [[7]])
+        self.assertEqual(sorted(self.redis.hkeys(outbox_key(1)), key=int), [str(n) for n in range(1, 7)])
+
+        # 다음 flush에서 남은 항목만 다시 보낸다
+        self.posted.clear()
+        self.assertTrue(flush_outbox(1, delivered.append))
+        self.assertEqual([pages for _, pages in self.posted], [[1, 2, 3], [4, 5, 6]])
+
+    def test_client_error_is_dead_lettered(self):
+        self._add([1, 2, 3, 4])
+        self.responses = [FakeResponse(400, {"error": "bad"}), FakeResponse()]
+        delivered = []
+        self.assertTrue(flush_outbox(1, delivered.append))
+        self.assertEqual(delivered, [[4]])
+        self.assertEqual(self.redis.hgetall(outbox_key(1)), {})
+        self.assertEqual(sorted(self.redis.hkeys(dead_letter_key(1))), ["1", "2", "3"])
+
+    def test_rejected_pages_are_dead_lettered(self):
+        self._add([1, 2, 3])
+        self.responses = [FakeResponse(200, {"updated": 2, "rejected": [2]})]
+        delivered = []
+        self.assertTrue(flush_outbox(1, delivered.append))
+        self.assertEqual(delivered, [[1, 3]])
+        self.assertEqual(self.redis.hkeys(dead_letter_key(1)), ["2"])
+
+    def test_missing_document_cancels(self):
+        self._add([1, 2, 3, 4])
+        self.responses = [FakeResponse(404, {"error": "문서 없음", "code": "doc_not_found"})]
+        self.assertTrue(flush_outbox(1))
+        self.assertEqual(len(self.posted), 1)
+        self.assertTrue(cancel.is_cancelled(1))
+        self.assertEqual(self.redis.hgetall(outbox_key(1)), {})
+
+    def test_unidentified_404_is_retried(self):
+        # 문서 없음 코드가 없는 404 (잘못된 주소, 프록시 등)는 취소하지 않고 다음에 다시 보낸다
+        self._add([1, 2])
+        self.responses = [FakeResponse(404, {"detail": "Not found."})]
+        self.assertFalse(flush_outbox(1))
+        self.assertFalse(cancel.is_cancelled(1))
+        self.assertEqual(sorted(self.redis.hkeys(outbox_key(1))), ["1", "2"])
+
+    def test_owner_flushes_only_its_pages(self):
+        self._add([1, 2], owner="task-a")
+        self._add([3, 4], owner="task-b")
+        delivered = []
+        self.assertTrue(flush_outbox(1, delivered.append, owner="task-a"))
+        self.assertEqual(delivered, [[1, 2]])
+        self.assertEqual(sorted(self.redis.hkeys(outbox_key(1, "task-b"))), ["3", "4"])
+
+    def test_callback_outbox_close_delivers_and_cancel_cleans_up(self):
+        delivered = []
+        box = CallbackOutbox(1, CALLBACK_URL, on_delivered=delivered.extend, owner="task-a")
+        other = CallbackOutbox(1, CALLBACK_URL, owner="task-b")
+        self.responses = [requests.ConnectionError("down")] * 20
+        with mock.patch.object(outbox, "OUTBOX_RETRY_BASE", 0.0):
+            box.add(1, "https://img/1", "p1")
+            other.add(2, "https://img/2", "p2")
+            self.assertFalse(box.close())
+        self.assertEqual(delivered, [])
+
+        delete_outboxes(1)
+        self.assertEqual(self.redis.hgetall(outbox_key(1, "task-a")), {})
+        self.assertEqual(self.redis.hgetall(outbox_key(1, "task-b")), {})
+        other.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+
+from ai_file_ocr.pipeline import progress as progress_module
+from ai_file_ocr.pipeline.ocr import PageAnalysis
+from ai_file_ocr.pipeline.progress import DocProgress
+
+from tests.fake_redis import FakeRedis
+
+
+class DocProgressTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch.object(progress_module, "redis_client", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_load_pages_reads_only_requested_fields(self):
+        saved = DocProgress(1, "sha")
+        for n in range(1, 6):
+            saved.save_page(n, PageAnalysis(text=f"p{n}", summary=""))
+        saved.mark_delivered(2)
+        saved.save_outline("outline")
+
+        with mock.patch.object(self.redis, "hgetall", side_effect=AssertionError("full read")):
+            loaded = DocProgress(1, "sha").load([2, 3])
+        self.assertEqual(sorted(loaded.pages), [2, 3])
+        self.assertEqual(loaded.delivered, {2})
+        self.assertIsNone(loaded.outline)
+
+        # 다음 묶음은 기존 기록에 더해진다
+        loaded.load([5])
+        self.assertEqual(sorted(loaded.pages), [2, 3, 5])
+
+    def test_full_load(self):
+        saved = DocProgress(1, "sha")
+        saved.save_page(1, PageAnalysis(text="a", summary="s"))
+        saved.mark_delivered(1)
+        saved.save_outline("outline")
+        loaded = DocProgress(1, "sha").load()
+        self.assertEqual(loaded.pages[1].summary, "s")
+        self.assertEqual((loaded.delivered, loaded.outline), ({1}, "outline"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from ai_lecture_ocr.ocr_pipeline.rapid_ocr_blocks import box_bbox, create_session, ocr_images
+
+
+def board(size, lines, scale=1.6):
+    # 어두운 칠판에 흰 글씨
+    w, h = size
+    img = np.full((h, w, 3), 40, dtype=np.uint8)
+    for i, text in enumerate(lines):
+        cv2.putText(img, text, (40, 70 + int(50 * scale) * i), cv2.FONT_HERSHEY_SIMPLEX, scale, (235, 235, 235), 3)
+    return img
+
+
+class PooledPathTest(unittest.TestCase):
+    # 워커에서 나눠 부르는 검출 / 인식이 RapidOCR 기본 호출(session(img))과 같은 결과를 내는지
+
+    @classmethod
+    def setUpClass(cls):
+        cls.session = create_session()
+
+    def assert_same_as_baseline(self, img):
+        baseline, _ = self.session(img)
+        expected = [(text, [int(v) for v in box_bbox(box)]) for box, text, _ in baseline or []]
+        result = ocr_images(self.session, [img])[0]
+        self.assertEqual([(r["text"], r["bbox"]) for r in result], expected)
+        self.assertTrue(expected)
+
+    def test_board(self):
+        self.assert_same_as_baseline(board((900, 600), ["f(x) = x^2 + 1", "Gradient descent", "loss = 0.25"]))
+
+    def test_wide_strip_is_letterboxed(self):
+        # 가로로 긴 이미지는 RapidOCR가 위아래를 덧대서 검출한다
+        self.assert_same_as_baseline(board((1300, 100), ["a long line of board text here"], scale=1.4))
+
+    def test_large_photo_is_reduced(self):
+        # 긴 변이 max_side_len보다 크면 줄여서 검출하고 원본 좌표로 되돌린다
+        self.assert_same_as_baseline(board((2600, 1200), ["Large board photo"], scale=3))
+
+    def test_batch_matches_single(self):
+        imgs = [board((900, 300), ["first board"]), board((900, 300), ["second board"])]
+        # 인식 배치의 폭 맞춤 때문에 confidence는 조금 달라질 수 있다
+        def strip(results):
+            return [(r["text"], r["bbox"]) for r in results]
+
+        batched = ocr_images(self.session, imgs)
+        self.assertEqual([strip(r) for r in batched], [strip(ocr_images(self.session, [img])[0]) for img in imgs])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import base64
+import unittest
+
+import cv2
+import numpy as np
+
+from ai_file_ocr.pipeline.ocr import _image_part
+from ai_file_ocr.pipeline.rendition import image_mime
+
+
+def _encode(ext):
+    img = np.full((32, 48, 3), 255, dtype=np.uint8)
+    return cv2.imencode(ext, img)[1].tobytes()
+
+
+class ImageMimeTest(unittest.TestCase):
+    def test_detects_format(self):
+        self.assertEqual(image_mime(_encode(".webp")), "image/webp")
+        self.assertEqual(image_mime(_encode(".jpg")), "image/jpeg")
+        self.assertEqual(image_mime(_encode(".png")), "image/png")
+
+    def test_inline_bytes_keep_their_format(self):
+        # 텍스트 레이어가 없는 페이지는 학생용 rendition(기본 WebP)을 그대로 보낸다
+        image = _encode(".webp")
+        url = _image_part(image)["image_url"]["url"]
+        self.assertEqual(url, "data:image/webp;base64," + base64.b64encode(image).decode("utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import time
+import unittest
+
+from ai_file_ocr.bench_rewrite import _PIECES, legacy_tag
+from ai_file_ocr.pipeline.rewrite import tag_text
+
+# 이전 방식과 결과가 달라지는 조각 (닫히지 않은 괄호, 환경 안의 \\[2pt] 줄바꿈)
+_EDGE_PIECES = [p for p in _PIECES if "닫히지 않은" in p or "[2pt]" in p]
+_ORDINARY_PIECES = [p for p in _PIECES if p not in _EDGE_PIECES]
+
+# 이전 방식과 같아야 하는 경우 → 기대 결과 (BE lecture_docs/tests.py에 같은 목록이 있다)
+LEGACY_CASES = {
+    # 짝이 없는 바깥 환경은 처음 나오는 \end까지 (안쪽 환경의 짝 찾기 실패를 기억해 두면 안 된다)
+    "\\begin{a} 앞 \\begin{a} x \\end{a}": "<수식>\n\\begin{a} 앞 \\begin{a} x \\end{a}\n</수식>",
+    "\\begin{a} 앞 \\begin{a} x \\end{a} 뒤 \\begin{b} y \\end{b}": (
+        "<수식>\n\\begin{a} 앞 \\begin{a} x \\end{a}\n</수식> 뒤 <수식>\n\\begin{b} y \\end{b}\n</수식>"
+    ),
+    "\\end{a} \\begin{a} x \\end{a}": "\\end{a} <수식>\n\\begin{a} x \\end{a}\n</수식>",
+    "\\begin{a} x \\end{a} \\begin{a} 끝 없음": "<수식>\n\\begin{a} x \\end{a}\n</수식> \\begin{a} 끝 없음",
+    "식 \\(a\\)와 $$b$$": "식 <수식>\na\n</수식>와 <수식>\nb\n</수식>",
+    "\\textbf{굵게} \\(\\text{in}\\)": "굵게 <수식>\n\\text{in}\n</수식>",
+    "미완성 \\( 괄호 \\[x\\]": "미완성 \\( 괄호 <수식>\nx\n</수식>",
+}
+
+
+class TagTextTest(unittest.TestCase):
+    def test_matches_legacy_on_ordinary_text(self):
+        for a in _ORDINARY_PIECES:
+            for b in _ORDINARY_PIECES:
+                self.assertEqual(tag_text(a + b), legacy_tag(a + b), msg=repr(a + b))
+        for piece in _PIECES:
+            self.assertEqual(tag_text(piece), legacy_tag(piece), msg=repr(piece))
+        for text, expected in LEGACY_CASES.items():
+            self.assertEqual(legacy_tag(text), expected, msg=repr(text))
+            self.assertEqual(tag_text(text), expected, msg=repr(text))
+
+    def test_examples(self):
+        cases = {
+            "이미 <수식>\nx\n</수식> 뒤 \\[y\\]": "이미 <수식>\nx\n</수식> 뒤 <수식>\ny\n</수식>",
+            "```py\nprint(1)\n```": "<코드>\npy\nprint(1)\n</코드>",
+            "": "",
+        }
+        for text, expected in cases.items():
+            self.assertEqual(tag_text(text), expected, msg=repr(text))
+
+    def test_changed_edge_cases(self):
+        # 코드 블록 안은 수식으로 바꾸지 않는다 (이전: 코드 안에 <수식> 태그)
+        self.assertEqual(tag_text("```\n\\(x\\)\n```"), "<코드>\n\\(x\\)\n</코드>")
+        # 같은 이름의 중첩 환경은 짝을 맞춘다 (이전: 안쪽 \\end에서 끊김)
+        self.assertEqual(
+            tag_text("\\begin{a}\\begin{a}x\\end{a}\\end{a}"),
+            "<수식>\n\\begin{a}\\begin{a}x\\end{a}\\end{a}\n</수식>",
+        )
+        # 수식 안의 구분자는 바깥 수식 하나로 합친다
+        self.assertEqual(tag_text("\\(a \\[b\\] c\\)"), "<수식>\na b c\n</수식>")
+        # 환경 안의 \\[2pt]는 줄바꿈 (이전: 다음 \\]까지 수식으로 잘못 묶음)
+        text = "\\begin{align} a \\\\[2pt] b \\end{align}\n\\[c\\]"
+        self.assertEqual(
+            tag_text(text),
+            "<수식>\n\\begin{align} a \\\\[2pt] b \\end{align}\n</수식>\n<수식>\nc\n</수식>",
+        )
+
+    def test_flags(self):
+        text = "\\textbf{a} \\(b\\) ```c```"
+        self.assertEqual(tag_text(text, math=False), "\\textbf{a} \\(b\\) <코드>\nc\n</코드>")
+        self.assertEqual(tag_text(text, code=False), "a <수식>\nb\n</수식> ```c```")
+
+    def test_unclosed_delimiters_stay_linear(self):
+        # 닫히지 않은 구분자가 많아도 같은 구간을 다시 훑지 않는다
+        text = "\\( \\[ \\begin{x} 본문 " * 20000 + "\\begin{y} " * 20000
+        t = time.perf_counter()
+        self.assertEqual(tag_text(text), text)
+        self.assertLess(time.perf_counter() - t, 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
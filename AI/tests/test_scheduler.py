@@ -0,0 +1,62 @@
+import unittest
+from unittest import mock
+
+from ai_file_ocr.pipeline import scheduler
+from ai_file_ocr.pipeline.scheduler import PageScheduler, set_priority
+
+from tests.fake_redis import FakeRedis
+
+
+class PageSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(scheduler, "redis_client", FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scheduler = PageScheduler(1)
+
+    def test_claim_takes_contiguous_pages(self):
+        self.scheduler.reset(list(range(1, 31)))
+        self.assertEqual(self.scheduler.claim("a", 12), list(range(1, 13)))
+        self.assertEqual(self.scheduler.claim("b", 12), list(range(13, 25)))
+        self.assertEqual(self.scheduler.claim("c", 12), list(range(25, 31)))
+        self.assertEqual(self.scheduler.claim("d", 12), [])
+
+    def test_claim_stops_at_gap(self):
+        self.scheduler.reset([1, 2, 3, 5, 6, 7])
+        self.assertEqual(self.scheduler.claim("a", 12), [1, 2, 3])
+        self.assertEqual(self.scheduler.claim("b", 12), [5, 6, 7])
+
+    def test_claim_starts_at_hint(self):
+        self.scheduler.reset(list(range(1, 41)))
+        set_priority(1, [20, 21])
+        self.assertEqual(self.scheduler.claim("a", 8), list(range(20, 28)))
+        self.assertEqual(self.scheduler.claim("b", 8), list(range(1, 9)))
+
+    def test_retry_returns_previous_claim_first(self):
+        self.scheduler.reset(list(range(1, 21)))
+        first = self.scheduler.claim("a", 8)
+        # 같은 task id로 재시도: 이전에 꺼낸 페이지부터, 그 다음 큐의 나머지
+        pages = [n for chunk in self.scheduler.claim_chunks("a", 8) for n in chunk]
+        self.assertEqual(pages[: len(first)], first)
+        self.assertEqual(sorted(pages), list(range(1, 21)))
+        self.assertEqual(self.scheduler.claimed("a"), list(range(1, 21)))
+
+    def test_subtasks_cover_every_page_once(self):
+        pages = list(range(1, 51))
+        self.scheduler.reset(pages)
+        workers = [
+            (n for chunk in self.scheduler.claim_chunks(owner, 12) for n in chunk) for owner in "abcde"
+        ]
+        seen = []
+        # 워커가 번갈아 한 페이지씩 처리한다고 보고 모두 소진
+        while workers:
+            for it in list(workers):
+                try:
+                    seen.append(next(it))
+                except StopIteration:
+                    workers.remove(it)
+        self.assertEqual(sorted(seen), pages)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from ai_lecture_ocr.ocr_pipeline.rapid_ocr_blocks import box_bbox
+from ai_lecture_ocr.ocr_pipeline.tiling import _quad, merge_boxes, tile_grid
+
+
+def bboxes(quads):
+    return sorted(box_bbox(q) for q in quads)
+
+
+class TileGridTest(unittest.TestCase):
+    def test_covers_image_with_overlap(self):
+        tiles = tile_grid(3000, 1000, size=1280, overlap=192)
+        self.assertEqual([t[0] for t in tiles], [0, 1088, 1720])
+        self.assertEqual({(t[1], t[3]) for t in tiles}, {(0, 1000)})
+        self.assertEqual(max(t[2] for t in tiles), 3000)
+
+
+class MergeBoxesTest(unittest.TestCase):
+    def test_duplicate_from_overlapping_tiles(self):
+        # 겹치는 두 타일에서 같은 글자를 잡은 경우 하나만 남긴다
+        quads = merge_boxes([(_quad((100, 10, 200, 40)), False), (_quad((102, 11, 199, 40)), False)])
+        self.assertEqual(bboxes(quads), [(100.0, 10.0, 200.0, 40.0)])
+
+    def test_cut_pieces_on_same_line_are_joined(self):
+        # 타일 경계에서 잘린 긴 줄의 두 조각은 하나로 합친다
+        quads = merge_boxes([(_quad((0, 10, 1290, 40)), True), (_quad((1100, 12, 2000, 41)), True)])
+        self.assertEqual(bboxes(quads), [(0.0, 10.0, 2000.0, 41.0)])
+
+    def test_separate_lines_are_kept(self):
+        found = [(_quad((0, 10, 500, 40)), True), (_quad((0, 60, 500, 90)), True)]
+        self.assertEqual(len(merge_boxes(found)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LectureDocsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lecture_docs'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,3 +1,5 @@
+import asyncio
+import requests
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from urllib.parse import parse_qs
 from rest_framework_simplejwt.tokens import UntypedToken
@@ -5,9 +7,13 @@ from jwt import decode as jwt_decode
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from asgiref.sync import sync_to_async
+from .models import Page
 
 User = get_user_model()
 
+# 화면 페이지와 함께 우선 OCR을 요청할 다음 페이지 수
+OCR_PRIORITY_LOOKAHEAD = 2
+
 async def user_from_token(token):
         UntypedToken(token)
 
@@ -23,6 +29,24 @@ async def user_from_token(token):
         return user
 
 
+def request_ocr_priority(doc_id, page):
+    # OCR이 아직 끝나지 않은 교안이면 화면 페이지부터 처리하도록 AI 서버에 알림
+    if not settings.AI_OCR_PRIORITY_URL:
+        return
+    if not Page.objects.filter(doc_id=doc_id, ocr__isnull=True).exists():
+        return
+
+    pages = [page + i for i in range(OCR_PRIORITY_LOOKAHEAD + 1)]
+    try:
+        requests.post(
+            settings.AI_OCR_PRIORITY_URL.format(doc_id=doc_id),
+            json={"pages": pages},
+            timeout=3,
+        )
+    except Exception as e:
+        print(f"OCR priority 요청 실패: doc={doc_id}, page={page}, error={e}")
+
+
 class DocSync(AsyncJsonWebsocketConsumer):
 
     async def connect(self):
@@ -77,6 +101,12 @@ class DocSync(AsyncJsonWebsocketConsumer):
                     "page": page,
                 },
             )
+
+            # 페이지 이동은 기다리지 않고 백그라운드로 전달
+            if isinstance(page, int):
+                asyncio.ensure_future(
+                    sync_to_async(request_ocr_priority, thread_sensitive=False)(self.doc_id, page)
+                )
             return
         
         #판서
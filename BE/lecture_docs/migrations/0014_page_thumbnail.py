@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lecture_docs', '0013_doc_doc_tts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='thumbnail',
+            field=models.URLField(blank=True, null=True),
+        ),
+    ]
@@ -13,6 +13,10 @@ class Doc(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     end_time = models.CharField(max_length=10, blank=True, null=True)
     users = models.ManyToManyField("users.User", blank=True, related_name="hidden_docs")
+    # 같은 교안을 고쳐 다시 올리면 이전 버전을 parent로 연결
+    parent = models.ForeignKey("self", on_delete=models.SET_NULL, related_name="versions", null=True, blank=True)
+    version = models.PositiveIntegerField(default=1)
+    pdf_sha256 = models.CharField(max_length=64, blank=True, null=True)  # AI 서버에 저장된 원본 PDF 참조
     def __str__(self):
         return f"{self.title}"
 
@@ -22,10 +26,12 @@ class Page(models.Model):
     doc = models.ForeignKey(Doc, on_delete=models.CASCADE, related_name='pages', null=True, blank=True)
     page_number = models.IntegerField()
     image = models.URLField(blank=True, null=True)
+    thumbnail = models.URLField(blank=True, null=True)  # 목록/미리보기용 작은 이미지
     ocr = models.TextField(blank=True, null=True)  # OCR 결과 텍스트
     page_tts =  models.JSONField(blank=True, null=True) 
     summary = models.TextField(blank=True, null=True) 
     summary_tts = models.JSONField(blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True, null=True)  # 새 버전에서 바뀌지 않은 페이지 찾기용
     created_at = models.DateTimeField(auto_now_add=True)
     @property
     def lecture(self):
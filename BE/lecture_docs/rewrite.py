@@ -0,0 +1,158 @@
+import re
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+# 수식 / 코드 태깅 (AI ai_file_ocr/pipeline/rewrite.py와 같은 내용, 한쪽을 고치면 같이 고친다)
+#
+# 텍스트를 앞에서부터 한 번만 훑으면서
+#   ``` ... ```                            → <코드> ... </코드>
+#   \( ... \), \[ ... \], $$ ... $$,
+#   \begin{env} ... \end{env}              → <수식> ... </수식>
+#   수식 밖의 \textbf{...} 등 텍스트용 명령   → 내용만 남김
+# 으로 바꾼다. 이미 태그된 <수식>/<코드> 구간과 코드 블록 안은 다시 바꾸지 않는다.
+
+TEXT_COMMANDS = [
+    "textbf", "textit", "textrm", "textsf",
+    "texttt", "text", "mathrm", "mathbf"
+]
+
+_TOKEN = re.compile(
+    r"```"
+    r"|<코드>|<수식>"
+    r"|(?<!\\)\\\(|(?<!\\)\\\[|\$\$"
+    r"|\\begin\{([^{}]*)\}"
+    r"|\\(" + "|".join(TEXT_COMMANDS) + r")\{([^{}]+)\}"
+)
+_CLOSERS = {
+    "```": "```",
+    "<코드>": "</코드>",
+    "<수식>": "</수식>",
+    "\\(": "\\)",
+    "\\[": "\\]",
+    "$$": "$$",
+}
+# 수식 안에 다시 나온 구분자 / 태그 (바깥 수식 하나로 합친다)
+_NESTED_MATH = re.compile(r"(?<!\\)\\[()\[\]]|\$\$|</?수식>")
+
+# 태깅 결과가 달라지게 고치면 올린다 (AI 서버 페이지 결과 캐시 키에 들어감)
+REWRITE_VERSION = "2"
+
+# 환경 시작 / 끝 (이름별로 짝을 맞춘다)
+_ENV = re.compile(r"\\(begin|end)\{([^{}]*)\}")
+
+
+def _wrap(tag: str, inner: str) -> str:
+    return f"<{tag}>\n{inner.strip()}\n</{tag}>"
+
+
+class _Scanner:
+    """
+    닫는 구분자 탐색 위치를 기억해, 닫히지 않은 구분자가 많아도 같은 구간을 다시 훑지 않는다.
+    (pos 이후에 닫는 구분자가 없으면 그보다 뒤에서도 없다)
+    환경은 중첩 깊이가 위치마다 달라 이 방식을 쓸 수 없으므로, 처음 필요할 때 전체를 한 번 훑어 짝을 맞춰 둔다.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.missing: Dict[str, int] = {}
+        self._envs: Optional[Dict[str, Tuple[Dict[int, int], List[int]]]] = None
+
+    def close(self, opener: str, start: int) -> Optional[int]:
+        # opener 다음의 닫는 구분자를 찾아 그 끝 위치를 반환, 없으면 None
+        closer = _CLOSERS[opener]
+        if start >= self.missing.get(closer, len(self.text) + 1):
+            return None
+        idx = self.text.find(closer, start)
+        if idx == -1:
+            self.missing[closer] = start
+            return None
+        return idx + len(closer)
+
+    def _index_envs(self) -> Dict[str, Tuple[Dict[int, int], List[int]]]:
+        # 이름별 {\begin 끝 위치: 짝이 맞는 \end 끝 위치}, \end 끝 위치 목록
+        envs: Dict[str, Tuple[Dict[int, int], List[int]]] = {}
+        stacks: Dict[str, List[int]] = {}
+        for m in _ENV.finditer(self.text):
+            pairs, ends = envs.setdefault(m.group(2), ({}, []))
+            stack = stacks.setdefault(m.group(2), [])
+            if m.group(1) == "begin":
+                stack.append(m.end())
+                continue
+            ends.append(m.end())
+            if stack:
+                pairs[stack.pop()] = m.end()
+        return envs
+
+    def close_env(self, name: str, start: int) -> Optional[int]:
+        """
+        start(begin{name} 끝)와 짝이 맞는 end{name}의 끝 위치.
+        짝이 없으면 (닫히지 않은 바깥 환경) 처음 나오는 end{name}까지, 그것도 없으면 None.
+        """
+        if self._envs is None:
+            self._envs = self._index_envs()
+        pairs, ends = self._envs.get(name, ({}, []))
+        end = pairs.get(start)
+        if end is not None:
+            return end
+        idx = bisect_left(ends, start)
+        return ends[idx] if idx < len(ends) else None
+
+
+def tag_text(text: str, math: bool = True, code: bool = True) -> str:
+    """
+    수식 / 코드 구간을 한 번의 스캔으로 태깅한다 (텍스트 길이에 선형).
+    math=False면 수식 관련 변환을, code=False면 코드 블록 변환을 하지 않는다
+    (변환하지 않아도 코드 블록 안은 수식으로 바꾸지 않는다).
+    """
+    if not text:
+        return text
+
+    scanner = _Scanner(text)
+    out = []
+    pos = 0
+    while True:
+        m = _TOKEN.search(text, pos)
+        if m is None:
+            break
+        start, token = m.start(), m.group(0)
+
+        # 수식 밖의 \textbf{...} 등 → 내용만
+        if m.group(2) is not None:
+            out.append(text[pos:start])
+            out.append(m.group(3) if math else token)
+            pos = m.end()
+            continue
+
+        if m.group(1) is not None:
+            end = scanner.close_env(m.group(1), m.end())
+        else:
+            end = scanner.close(token, m.end())
+
+        if end is None:
+            if token == "<수식>":
+                # 닫히지 않은 수식 태그 뒤쪽은 수식 안으로 보고 건드리지 않는다
+                break
+            # 닫히지 않은 구분자는 일반 텍스트로 두고 다음 글자부터
+            out.append(text[pos:m.end()])
+            pos = m.end()
+            continue
+
+        out.append(text[pos:start])
+        segment = text[start:end]
+        if token == "```":
+            out.append(_wrap("코드", segment[3:-3]) if code else segment)
+        elif token == "<코드>":
+            out.append(segment)
+        elif not math:
+            out.append(segment)
+        elif m.group(1) is not None:
+            # 환경은 \begin{...} ... \end{...} 전체가 수식
+            out.append(_wrap("수식", _NESTED_MATH.sub("", segment)))
+        else:
+            inner = segment[len(token):-len(_CLOSERS[token])]
+            out.append(_wrap("수식", _NESTED_MATH.sub("", inner)))
+        pos = end
+
+    out.append(text[pos:])
+    return "".join(out)
+
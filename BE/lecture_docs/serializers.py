@@ -7,10 +7,11 @@ class DocSerializer(serializers.ModelSerializer):
     review = serializers.SerializerMethodField()
     createdAt = serializers.SerializerMethodField()
     timestamp = serializers.SerializerMethodField()  
+    parentId = serializers.IntegerField(source="parent_id", allow_null=True)
 
     class Meta:
         model = Doc
-        fields = ["docId", "title", "doc_tts", "review", "createdAt", "timestamp"]
+        fields = ["docId", "title", "doc_tts", "review", "createdAt", "timestamp", "version", "parentId"]
 
     def get_review(self, obj):
         return self.get_timestamp(obj) is not None
@@ -46,6 +47,7 @@ class PageSerializer(serializers.ModelSerializer):
             "totalPage",
             "pagId",
             "image",
+            "thumbnail",
             "ocr",
             "status"
         ]
@@ -54,7 +56,7 @@ class PageSerializer(serializers.ModelSerializer):
         return obj.doc.pages.count()
 
     def get_status(self, obj):
-        return "done" if obj.ocr else "processing"
+        return "processing" if obj.ocr is None else "done"
 
 
 
@@ -0,0 +1,27 @@
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import Doc, Page
+
+
+def request_ocr_cancel(doc_id):
+    # AI 서버에 OCR 작업 취소 요청 (남은 페이지의 Vision 호출 / callback 중단)
+    try:
+        requests.post(settings.AI_OCR_CANCEL_URL.format(doc_id=doc_id), timeout=3)
+    except Exception as e:
+        print(f"OCR 취소 요청 실패: doc={doc_id}, error={e}")
+
+
+@receiver(pre_delete, sender=Doc)
+def cancel_doc_ocr(sender, instance, **kwargs):
+    # 교안 삭제 / 강의 삭제로 함께 지워지는 교안 중 OCR이 끝나지 않은 교안만 취소
+    if not settings.AI_OCR_CANCEL_URL:
+        return
+    if not Page.objects.filter(doc=instance, ocr__isnull=True).exists():
+        return
+
+    doc_id = instance.id
+    transaction.on_commit(lambda: request_ocr_cancel(doc_id))
@@ -1,3 +1,165 @@
-from django.test import TestCase
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from lectures.models import Lecture
+from users.models import User
+from .models import Doc, Page
+from .rewrite import tag_text
+from .serializers import PageSerializer
+
+
+class OcrBulkCallbackTest(TestCase):
+    # AI outbox → bulk callback 계약
+
+    def setUp(self):
+        self.client = APIClient()
+        self.doc = Doc.objects.create(title="교안")
+        Page.objects.create(doc=self.doc, page_number=1)
+        Page.objects.create(doc=self.doc, page_number=2, ocr="이전 결과", summary="요약")
+
+    def post(self, pages, doc_id=None):
+        url = reverse("doc-ocr-callback-bulk", kwargs={"docId": doc_id or self.doc.id})
+        return self.client.post(url, {"doc_id": doc_id or self.doc.id, "pages": pages}, format="json")
+
+    def test_saves_pages(self):
+        resp = self.post([
+            {"page_number": 1, "image_url": "https://img/1.webp", "thumbnail_url": None, "ocr_text": "본문"},
+            {"page_number": 3, "image_url": "https://img/3.webp", "ocr_text": "새 페이지"},
+        ])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["updated"], 2)
+        self.assertEqual(resp.data["rejected"], [])
+        self.assertEqual(Page.objects.get(doc=self.doc, page_number=1).ocr, "본문")
+        self.assertEqual(Page.objects.get(doc=self.doc, page_number=3).image, "https://img/3.webp")
+
+    def test_empty_text_is_valid(self):
+        resp = self.post([{"page_number": 1, "image_url": None, "ocr_text": ""}])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["rejected"], [])
+        page = Page.objects.get(doc=self.doc, page_number=1)
+        self.assertEqual(page.ocr, "")
+
+        # 빈 결과도 처리가 끝난 페이지
+        self.assertEqual(PageSerializer(page).data["status"], "done")
+
+    def test_invalid_items_are_rejected_individually(self):
+        resp = self.post([
+            {"page_number": 1, "ocr_text": "본문"},
+            {"page_number": 4},
+            {"ocr_text": "번호 없음"},
+            {"page_number": 0, "ocr_text": "잘못된 번호"},
+            "not an object",
+        ])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["updated"], 1)
+        self.assertEqual(resp.data["rejected"], [4, None, 0, None])
+        self.assertEqual(Page.objects.get(doc=self.doc, page_number=1).ocr, "본문")
+        self.assertFalse(Page.objects.filter(doc=self.doc, page_number=4).exists())
+
+    def test_all_rejected(self):
+        resp = self.post([{"page_number": 1}])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.data["updated"], resp.data["rejected"]), (0, [1]))
+
+    def test_changed_text_clears_summary(self):
+        self.post([{"page_number": 2, "ocr_text": "새 결과"}])
+        page = Page.objects.get(doc=self.doc, page_number=2)
+        self.assertEqual(page.ocr, "새 결과")
+        self.assertIsNone(page.summary)
+
+    def test_same_text_keeps_summary(self):
+        self.post([{"page_number": 2, "ocr_text": "이전 결과"}])
+        self.assertEqual(Page.objects.get(doc=self.doc, page_number=2).summary, "요약")
+
+    def test_missing_doc_is_identified(self):
+        # AI 서버는 이 코드가 있을 때만 문서 작업을 취소한다
+        resp = self.post([{"page_number": 1, "ocr_text": "본문"}], doc_id=self.doc.id + 100)
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(resp.data["code"], "doc_not_found")
+
+    def test_pages_must_be_list(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post({"page_number": 1}).status_code, 400)
+
+
+@override_settings(AI_OCR_REOCR_URL="http://ai/ocr/pdf/{doc_id}/reocr")
+class DocReOcrTest(TestCase):
+    # AI 서버가 진행 중인 작업에 붙였는지 (바로 시작하지 않음) 응답에 드러나야 한다
+
+    def setUp(self):
+        user = User.objects.create_user(username="student", password="pw")
+        lecture = Lecture.objects.create(title="강의", student=user)
+        self.doc = Doc.objects.create(title="교안", lecture=lecture, pdf_sha256="sha")
+        for n in (1, 2, 3):
+            Page.objects.create(doc=self.doc, page_number=n, ocr="")
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def reocr(self, ai_result):
+        ai_resp = mock.Mock(status_code=200)
+        ai_resp.json.return_value = ai_result
+        with mock.patch("lecture_docs.views.requests.post", return_value=ai_resp) as post:
+            resp = self.client.post(
+                reverse("doc-reocr", kwargs={"docId": self.doc.id}), {"pages": [3, 2]}, format="json"
+            )
+        self.assertEqual(post.call_args.kwargs["json"]["pages"], [2, 3])
+        return resp
+
+    def test_queued(self):
+        resp = self.reocr({"doc_id": self.doc.id, "pages": [2, 3], "queued": True, "attached": False})
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual((resp.data["queued"], resp.data["attached"]), (True, False))
+
+    def test_attached_to_running_job(self):
+        resp = self.reocr({"doc_id": self.doc.id, "pages": [2, 3], "queued": False, "attached": True, "job": {}})
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual((resp.data["queued"], resp.data["attached"]), (False, True))
+        self.assertEqual(resp.data["pages"], [2, 3])
+
+
+# AI tests/test_rewrite.py와 같은 목록 (이전 정규식 방식의 결과)
+LEGACY_CASES = {
+    # 짝이 없는 바깥 환경은 처음 나오는 \end까지 (안쪽 환경의 짝 찾기 실패를 기억해 두면 안 된다)
+    "\\begin{a} 앞 \\begin{a} x \\end{a}": "<수식>\n\\begin{a} 앞 \\begin{a} x \\end{a}\n</수식>",
+    "\\begin{a} 앞 \\begin{a} x \\end{a} 뒤 \\begin{b} y \\end{b}": (
+        "<수식>\n\\begin{a} 앞 \\begin{a} x \\end{a}\n</수식> 뒤 <수식>\n\\begin{b} y \\end{b}\n</수식>"
+    ),
+    "\\end{a} \\begin{a} x \\end{a}": "\\end{a} <수식>\n\\begin{a} x \\end{a}\n</수식>",
+    "\\begin{a} x \\end{a} \\begin{a} 끝 없음": "<수식>\n\\begin{a} x \\end{a}\n</수식> \\begin{a} 끝 없음",
+    "식 \\(a\\)와 $$b$$": "식 <수식>\na\n</수식>와 <수식>\nb\n</수식>",
+    "\\textbf{굵게} \\(\\text{in}\\)": "굵게 <수식>\n\\text{in}\n</수식>",
+    "미완성 \\( 괄호 \\[x\\]": "미완성 \\( 괄호 <수식>\nx\n</수식>",
+}
+
+
+AI_REWRITE = Path(__file__).resolve().parents[2] / "AI" / "ai_file_ocr" / "pipeline" / "rewrite.py"
+
+
+def _rewrite_source(path) -> list:
+    # 서로를 가리키는 첫 주석 줄만 빼고 비교
+    return [line for line in Path(path).read_text(encoding="utf-8").splitlines() if "와 같은 내용" not in line]
+
+
+class RewriteTest(SimpleTestCase):
+    # AI 서버의 태깅(ai_file_ocr/pipeline/rewrite.py)을 옮겨 온 사본
+
+    def test_matches_legacy_cases(self):
+        for text, expected in LEGACY_CASES.items():
+            self.assertEqual(tag_text(text), expected, msg=repr(text))
+
+    def test_changed_edge_cases(self):
+        self.assertEqual(tag_text("```\n\\(x\\)\n```"), "<코드>\n\\(x\\)\n</코드>")
+        self.assertEqual(
+            tag_text("\\begin{a}\\begin{a}x\\end{a}\\end{a}"),
+            "<수식>\n\\begin{a}\\begin{a}x\\end{a}\\end{a}\n</수식>",
+        )
+        self.assertEqual(tag_text("\\(a \\[b\\] c\\)"), "<수식>\na b c\n</수식>")
+
+    @skipUnless(AI_REWRITE.exists(), "AI 서버 코드가 같은 저장소에 없음")
+    def test_same_as_ai_copy(self):
+        # 한쪽만 고치면 실패한다
+        self.assertEqual(_rewrite_source(Path(__file__).with_name("rewrite.py")), _rewrite_source(AI_REWRITE))
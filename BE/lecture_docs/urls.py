@@ -5,6 +5,8 @@ urlpatterns = [
     # BE <> FE
     path('lecture/<int:lectureId>/doc/', DocUploadView.as_view(), name='doc-upload'),
     path('doc/<int:docId>/', DocDetailView.as_view(), name='doc-detail'),
+    path('doc/<int:docId>/version/', DocVersionView.as_view(), name='doc-version'),
+    path('doc/<int:docId>/reocr/', DocReOcrView.as_view(), name='doc-reocr'),
     path('doc/<int:docId>/<int:pageNumber>/', PageDetailView.as_view(), name='page-detail'),
     
     path('page/<int:pageId>/tts/', PageTTSView.as_view(), name='tts-upload'),
@@ -25,4 +27,5 @@ urlpatterns = [
 
     ## BE <> AI
     path("docs/<int:docId>/ocr-callback/", OcrCallbackView.as_view(), name="doc-ocr-callback"),
+    path("docs/<int:docId>/ocr-callback/bulk/", OcrBulkCallbackView.as_view(), name="doc-ocr-callback-bulk"),
 ]
\ No newline at end of file
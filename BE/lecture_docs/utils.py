@@ -1,6 +1,7 @@
-import re
+import hashlib
 from google.cloud import texttospeech
-from classes.utils import text_to_speech, time_to_seconds, math_pattern
+from classes.utils import text_to_speech, time_to_seconds
+from lecture_docs.rewrite import tag_text
 from lecture_docs.models import *
 from project.vertexai import gemini_model
 from users.models import User
@@ -8,22 +9,6 @@ from django.conf import settings
 from botocore.exceptions import NoCredentialsError
 import boto3
 
-latex_patterns = [
-    r'\\\((.*?)\\\)',
-    r'\\\[(.*?)\\\]',
-    r'\$\$(.*?)\$\$',
-    r'(\\begin\{.*?\}.*?\\end\{.*?\})',
-]
-
-text_commands = [
-    "textbf", "textit", "textrm", "textsf",
-    "texttt", "text", "mathrm", "mathbf"
-]
-
-text_pattern = r'\\(' + '|'.join(text_commands) + r')\{([^{}]+)\}'
-
-code_pattern = r"```(.*?)```"
-
 tts_client = texttospeech.TextToSpeechClient(transport="rest")
 
 def summarize_stt(doc_id: int, user: User) -> tuple[str, str]:
@@ -111,90 +96,10 @@ def summarize_doc(doc_id: int, ocr_text: str) -> str:
 
     response = summarize(prompt).strip()
 
-    response = latex_rewrite(remove_text(response))
-    response = code_rewrite(response)
+    response = tag_text(response)
 
     return response
 
-# 수식 치환 함수
-def safe_sub(pattern, repl, text):
-    def wrapper(match):
-        start = match.start()
-        # 이미 <수식> 태그 안에 있는지 검사
-        open_tag = text.rfind("<수식>", 0, start)
-        close_tag = text.rfind("</수식>", 0, start)
-
-        # <수식>은 보였지만 </수식>이 안 보였다 → 수식 내부
-        if open_tag != -1 and (close_tag == -1 or close_tag < open_tag):
-            return match.group(0)
-        return repl(match)
-
-    return re.sub(pattern, wrapper, text, flags=re.DOTALL)
-
-#수식 밖 Latex 제거
-def remove_text(text: str) -> str:
-    math_spans = []
-    for pattern in latex_patterns:
-        for m in re.finditer(pattern, text, flags=re.DOTALL):
-            math_spans.append((m.start(), m.end()))
-
-    def is_inside_math(pos):
-        for start, end in math_spans:
-            if start <= pos < end:
-                return True
-        return False
-
-    def replacer(match):
-        cmd = match.group(1)
-        inner = match.group(2)
-        start = match.start()
-
-        if is_inside_math(start):
-            return match.group(0)
-        return inner
-
-    return re.sub(text_pattern, replacer, text)
-
-#수식 후처리
-def latex_rewrite(text: str) -> str:
-    def latex_replace(match):
-        inner = match.group(1).strip()
-        return f"<수식>\n{inner}\n</수식>"
-
-    for pattern in latex_patterns:
-        text = safe_sub(pattern, latex_replace, text)
-
-    text = remove_tag(text)
-
-    return text
-
-#중첩된 수식 제거
-def remove_tag(text: str) -> str:
-    while True:
-        new_text = text
-        new_text = re.sub(r'<수식>\s*<수식>', '<수식>', new_text)
-        new_text = re.sub(r'</수식>\s*</수식>', '</수식>', new_text)
-        new_text = math_pattern.sub(
-            lambda m: f"<수식>\n{re.sub(r'</?수식>', '', m.group(1)).strip()}\n</수식>", 
-            new_text
-        )
-        
-        if new_text == text:
-            break
-        text = new_text
-        
-    return text
-
-#코드 후처리
-def code_rewrite(text: str) -> str:
-    def code_replace(match):
-        inner = match.group(1).strip()
-        return f"<코드>\n{inner}\n</코드>"
-    
-    text = re.sub(code_pattern, code_replace, text, flags=re.DOTALL)
-
-    return text
-
 def summarize(prompt) -> str:
     """
     Gemini 호출 요약본 생성 함수
@@ -237,6 +142,23 @@ def upload_s3(file_obj, file_name, folder=None, content_type=None):
     except Exception as e:
         raise Exception(f"S3 업로드 실패: {e}")
 
+def page_content_hashes(pdf_doc) -> list[str]:
+    """
+    페이지별 내용 해시 (페이지 크기 + 그리기 명령 + 포함된 이미지/폼).
+    렌더링 없이 계산되며, 같은 내용의 페이지는 다시 내보낸 PDF에서도 같은 값이 된다.
+    """
+    hashes = []
+    for page in pdf_doc:
+        hasher = hashlib.sha256()
+        hasher.update(f"{page.rect.width:.1f}x{page.rect.height:.1f}".encode())
+        hasher.update(page.read_contents())
+        xrefs = [img[0] for img in page.get_images(full=True)]
+        xrefs += [xobj[0] for xobj in page.get_xobjects()]
+        for xref in xrefs:
+            hasher.update(pdf_doc.xref_stream_raw(xref) or b"")
+        hashes.append(hasher.hexdigest())
+    return hashes
+
 def exam_tts(text: str, user: User):
     synthesis_input = texttospeech.SynthesisInput(text=text)
 
@@ -1,9 +1,11 @@
+import hashlib
 import json
 import os
 from urllib.parse import unquote
 from io import BytesIO
 import time
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 import fitz
@@ -25,6 +27,34 @@ from datetime import datetime, timedelta, timezone
 import redis
 from dotenv import load_dotenv
 
+
+def is_deferred(request) -> bool:
+    # 급하지 않은 문서(미리 올려 두는 강의 자료 등)는 지연 모드로 처리
+    return str(request.data.get("deferred", "")).lower() in ("1", "true")
+
+
+def request_doc_ocr(doc, file, pdf_bytes, pages=None, deferred=False):
+    # 교안 PDF를 AI 서버로 전송 (pages를 주면 그 페이지만 OCR)
+    callback_url = f"{settings.BACKEND_BASE_URL}/docs/{doc.id}/ocr-callback/"
+    #로컬 테스트용
+    #callback_url = request.build_absolute_uri(f"/docs/{doc.id}/ocr-callback/")
+    files = {
+        "file": (file.name, pdf_bytes, file.content_type),
+    }
+
+    data = {
+        "doc_id": doc.id,
+        "callback_url": callback_url,
+    }
+    if pages is not None:
+        data["pages"] = ",".join(str(n) for n in pages)
+    if deferred:
+        data["deferred"] = "true"
+
+    resp = requests.post(settings.AI_OCR_URL, files=files, data=data, timeout=60)
+    resp.raise_for_status()
+
+
 #교안 업로드/조회
 class DocUploadView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsLectureMember]
@@ -60,58 +90,202 @@ class DocUploadView(APIView):
         except Exception as e:
             return Response({"error": f"TTS 오류: {e}"}, status=500)
 
+        pdf_bytes = file.read()
+        pdf_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        hashes = page_content_hashes(pdf_doc)
+        pdf_doc.close()
+
         # Doc 레코드 생성
         doc = Doc.objects.create(
             lecture=lecture, 
             title=file.name,
             doc_tts = tts_url,
+            pdf_sha256=hashlib.sha256(pdf_bytes).hexdigest(),
             )
-        pdf_bytes = file.read() 
-
-        pdf_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        total_pages = pdf_doc.page_count
-        pdf_doc.close()
 
         # page 객체 생성
-        for page_num in range(1, total_pages + 1):
+        for page_num, content_hash in enumerate(hashes, start=1):
             Page.objects.create(
                 doc=doc,
                 page_number=page_num,
                 ocr=None,
                 image=None,
+                content_hash=content_hash,
         )
         # AI로 전송
-        ai_ocr_url = settings.AI_OCR_URL
-        callback_url = f"{settings.BACKEND_BASE_URL}/docs/{doc.id}/ocr-callback/"
-        #로컬 테스트용
-        #callback_url = request.build_absolute_uri(f"/docs/{doc.id}/ocr-callback/")
-        files = {
-            "file": (file.name, pdf_bytes, file.content_type),
-        }
+        try:
+            request_doc_ocr(doc, file, pdf_bytes, deferred=is_deferred(request))
+        except Exception as e:
+            return Response(
+                {"error": f"AI 서버 요청 실패: {e}"},
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
 
-        data = {
-            "doc_id": doc.id,
-            "callback_url": callback_url,
-        }
+        return Response({"docId": doc.id, "title": doc.title}, status=201)
+
+
+#교안 새 버전 업로드
+class DocVersionView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsLectureMember]
+
+    def post(self, request, docId):
+        parent = get_object_or_404(Doc, id=docId)
+        self.check_object_permissions(request, parent)
+        file = request.FILES.get("file")
+
+        if not file:
+            return Response({"error": "file 필드가 비어 있습니다."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # 제목이 같으면 이전 버전의 제목 TTS 재사용
+        tts_url = parent.doc_tts
+        if file.name != parent.title or not tts_url:
+            try:
+                tts_url = text_to_speech(file.name, user=request.user, s3_folder="tts/doc/")
+            except Exception as e:
+                return Response({"error": f"TTS 오류: {e}"}, status=500)
+
+        pdf_bytes = file.read()
+        pdf_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        hashes = page_content_hashes(pdf_doc)
+        pdf_doc.close()
+
+        # 이전 버전에서 OCR이 끝난 페이지를 내용 해시로 찾는다
+        previous = {}
+        for page in parent.pages.filter(content_hash__isnull=False, ocr__isnull=False):
+            previous.setdefault(page.content_hash, page)
+
+        changed = []
+        with transaction.atomic():
+            doc = Doc.objects.create(
+                lecture=parent.lecture,
+                title=file.name,
+                doc_tts=tts_url,
+                parent=parent,
+                version=parent.version + 1,
+                pdf_sha256=hashlib.sha256(pdf_bytes).hexdigest(),
+            )
+
+            pages = []
+            for page_num, content_hash in enumerate(hashes, start=1):
+                old = previous.get(content_hash)
+                if old is None:
+                    changed.append(page_num)
+                    pages.append(Page(doc=doc, page_number=page_num, content_hash=content_hash))
+                    continue
+                # 바뀌지 않은 페이지는 OCR / 요약 / TTS를 그대로 복사
+                pages.append(Page(
+                    doc=doc,
+                    page_number=page_num,
+                    content_hash=content_hash,
+                    image=old.image,
+                    thumbnail=old.thumbnail,
+                    ocr=old.ocr,
+                    page_tts=old.page_tts,
+                    summary=old.summary,
+                    summary_tts=old.summary_tts,
+                ))
+            Page.objects.bulk_create(pages)
+
+        # 바뀐 페이지만 AI로 전송
+        if changed:
+            try:
+                request_doc_ocr(doc, file, pdf_bytes, pages=changed, deferred=is_deferred(request))
+            except Exception as e:
+                return Response(
+                    {"error": f"AI 서버 요청 실패: {e}"},
+                    status=status.HTTP_502_BAD_GATEWAY,
+                )
+
+        return Response({
+            "docId": doc.id,
+            "title": doc.title,
+            "version": doc.version,
+            "parentId": parent.id,
+            "reused": len(hashes) - len(changed),
+            "changed": changed,
+        }, status=201)
+
+
+#교안 페이지 다시 OCR
+class DocReOcrView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsLectureMember]
+
+    def post(self, request, docId):
+        doc = get_object_or_404(Doc, id=docId)
+        self.check_object_permissions(request, doc)
+
+        if not doc.pdf_sha256 or not settings.AI_OCR_REOCR_URL:
+            return Response({"error": "원본 PDF 정보가 없어 다시 OCR할 수 없습니다. 교안을 다시 업로드해 주세요."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # {"pages": [3, 5]} 또는 {"start": 3, "end": 7}
+        total_pages = doc.pages.count()
+        try:
+            pages = request.data.get("pages")
+            if pages is None:
+                start = int(request.data.get("start"))
+                end = int(request.data.get("end", start))
+                pages = range(start, end + 1)
+            pages = sorted({int(n) for n in pages})
+        except (TypeError, ValueError):
+            return Response({"error": "pages 또는 start/end가 필요합니다."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if not pages or pages[0] < 1 or pages[-1] > total_pages:
+            return Response({"error": f"페이지 범위는 1~{total_pages} 입니다."},
+                            status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            resp = requests.post(ai_ocr_url, files=files, data=data, timeout=60)
+            resp = requests.post(
+                settings.AI_OCR_REOCR_URL.format(doc_id=doc.id),
+                json={
+                    "pdf_sha256": doc.pdf_sha256,
+                    "callback_url": f"{settings.BACKEND_BASE_URL}/docs/{doc.id}/ocr-callback/",
+                    "pages": pages,
+                },
+                timeout=10,
+            )
             resp.raise_for_status()
+            result = resp.json()
         except Exception as e:
             return Response(
                 {"error": f"AI 서버 요청 실패: {e}"},
                 status=status.HTTP_502_BAD_GATEWAY,
             )
 
-        return Response({"docId": doc.id, "title": doc.title}, status=201)
+        # 같은 교안의 OCR이 진행 중이면 바로 시작하지 않고 그 작업이 끝난 뒤 처리된다
+        attached = bool(result.get("attached"))
+        return Response({
+            "docId": doc.id,
+            "pages": pages,
+            "queued": not attached,
+            "attached": attached,
+            "message": "진행 중인 OCR이 끝난 뒤 다시 OCR합니다." if attached else "다시 OCR을 시작했습니다.",
+        }, status=202)
 #BE<>AI
+# OCR callback 대상 문서가 없을 때의 오류 코드 (AI 서버는 이 코드가 있을 때만 작업을 취소한다)
+DOC_NOT_FOUND = "doc_not_found"
+
+
+def _callback_doc(docId):
+    doc = Doc.objects.filter(id=docId).first()
+    if doc is None:
+        return None, Response({"error": "문서가 존재하지 않습니다.", "code": DOC_NOT_FOUND},
+                              status=status.HTTP_404_NOT_FOUND)
+    return doc, None
+
+
 class OcrCallbackView(APIView):
 
     def post(self, request, docId):
-        doc = get_object_or_404(Doc, id=docId)
+        doc, error = _callback_doc(docId)
+        if error:
+            return error
 
         page_number = request.data.get("page_number")
         image_url = request.data.get("image_url")
+        thumbnail_url = request.data.get("thumbnail_url")
         ocr_text = request.data.get("ocr_text")
 
         if not page_number or not ocr_text:
@@ -127,11 +301,78 @@ class OcrCallbackView(APIView):
 
         if image_url:
             page_obj.image = image_url
+        if thumbnail_url:
+            page_obj.thumbnail = thumbnail_url
 
+        # 다시 OCR해서 내용이 바뀌면 요약 / TTS는 새로 만들도록 비운다
+        if page_obj.ocr and page_obj.ocr != ocr_text:
+            page_obj.page_tts = page_obj.summary = page_obj.summary_tts = None
         page_obj.ocr = ocr_text
-        page_obj.save(update_fields=["image", "ocr"])
+        page_obj.save(update_fields=["image", "thumbnail", "ocr", "page_tts", "summary", "summary_tts"])
 
         return Response({"message": "페이지 OCR 저장 완료"}, status=status.HTTP_200_OK)
+
+
+class OcrBulkCallbackView(APIView):
+    # 여러 페이지 OCR 결과를 한 번에 반영 (AI outbox의 bulk callback)
+    def post(self, request, docId):
+        doc, error = _callback_doc(docId)
+        if error:
+            return error
+
+        items = request.data.get("pages")
+        if not isinstance(items, list) or not items:
+            return Response({"error": "pages는 비어 있지 않은 목록이어야 합니다."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # 항목마다 검사해서 잘못된 페이지만 빼고 반영한다 (빈 OCR 결과도 유효한 결과)
+        results = {}
+        rejected = []
+        for item in items:
+            page_number = item.get("page_number") if isinstance(item, dict) else None
+            ocr_text = item.get("ocr_text") if isinstance(item, dict) else None
+            try:
+                number = int(page_number)
+            except (TypeError, ValueError):
+                number = 0
+            if isinstance(page_number, bool) or number < 1 or not isinstance(ocr_text, str):
+                rejected.append(page_number)
+                continue
+            results[number] = item
+
+        if not results:
+            return Response({"message": "반영할 페이지가 없습니다.", "updated": 0, "rejected": rejected},
+                            status=status.HTTP_200_OK)
+
+        with transaction.atomic():
+            # 업로드 시 만들어 둔 Page가 없으면 먼저 생성
+            existing = set(
+                Page.objects.filter(doc=doc, page_number__in=results)
+                .values_list("page_number", flat=True)
+            )
+            Page.objects.bulk_create(
+                [Page(doc=doc, page_number=n) for n in results if n not in existing],
+                ignore_conflicts=True,
+            )
+
+            pages = list(Page.objects.select_for_update().filter(doc=doc, page_number__in=results))
+            for page_obj in pages:
+                item = results[page_obj.page_number]
+                if item.get("image_url"):
+                    page_obj.image = item["image_url"]
+                if item.get("thumbnail_url"):
+                    page_obj.thumbnail = item["thumbnail_url"]
+                # 다시 OCR해서 내용이 바뀌면 요약 / TTS는 새로 만들도록 비운다
+                if page_obj.ocr and page_obj.ocr != item["ocr_text"]:
+                    page_obj.page_tts = page_obj.summary = page_obj.summary_tts = None
+                page_obj.ocr = item["ocr_text"]
+
+            Page.objects.bulk_update(
+                pages, ["image", "thumbnail", "ocr", "page_tts", "summary", "summary_tts"]
+            )
+
+        return Response({"message": "페이지 OCR 일괄 저장 완료", "updated": len(pages), "rejected": rejected},
+                        status=status.HTTP_200_OK)
     
 #교안 TTS
 class PageTTSView(APIView):
@@ -292,7 +533,8 @@ class PageDetailView(APIView):
         page = doc.pages.get(page_number=pageNumber)
         data = PageSerializer(page).data
 
-        if not page.ocr:
+        # 아직 OCR 결과가 오지 않은 페이지 (빈 결과는 완료된 것)
+        if page.ocr is None:
             return Response(data, status=status.HTTP_202_ACCEPTED)
 
         return Response(data, status=status.HTTP_200_OK)
@@ -333,17 +575,24 @@ class BoardView(APIView):
         s3_key = f"boards/{page.id}_{image.name}"
         s3_url = upload_s3(s3_stream, s3_key, content_type=image.content_type)
 
-        import base64
-        image_b64 = base64.b64encode(img_bytes).decode()
-
-        ai_url = settings.AI_BOARD_OCR_URL  
+        # base64 없이 바이트 그대로 multipart로 전송
+        ai_url = settings.AI_BOARD_OCR_FILE_URL
         try:
             import requests
             ai_resp = requests.post(
                 ai_url,
-                json={"image_base64": image_b64},
+                files={"image": (image.name, img_bytes, image.content_type or "application/octet-stream")},
+                # 같은 페이지를 다시 찍은 판서는 AI 서버가 바뀐 부분만 OCR
+                data={"page_id": page.id},
                 timeout=12
             )
+            if ai_resp.status_code == 429:
+                # 판서 OCR 대기열이 가득 찬 경우: 재시도 시점을 그대로 전달
+                return Response(
+                    {"error": "판서 인식 요청이 많습니다. 잠시 후 다시 시도해 주세요."},
+                    status=status.HTTP_429_TOO_MANY_REQUESTS,
+                    headers={"Retry-After": ai_resp.headers.get("Retry-After", "1")},
+                )
             ai_resp.raise_for_status()
             ocr_text = ai_resp.json().get("text", "")
         except Exception as e:
@@ -215,7 +215,17 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Seoul'
 
 AI_OCR_URL = os.getenv("AI_OCR_URL")
+# 강의 중 화면 페이지 우선 OCR 요청 (예: http://ai:8000/ocr/pdf/{doc_id}/priority)
+AI_OCR_PRIORITY_URL = os.getenv("AI_OCR_PRIORITY_URL")
+# 교안 일부 페이지 다시 OCR (예: http://ai:8000/ocr/pdf/{doc_id}/reocr)
+AI_OCR_REOCR_URL = os.getenv("AI_OCR_REOCR_URL")
+# 교안 삭제 시 OCR 작업 취소 (예: http://ai:8000/ocr/pdf/{doc_id}/cancel)
+AI_OCR_CANCEL_URL = os.getenv("AI_OCR_CANCEL_URL")
 AI_BOARD_OCR_URL = os.getenv("AI_BOARD_OCR_URL")
+# 판서 이미지 multipart 업로드 (예: http://ai:8000/ocr/board/file), 없으면 AI_BOARD_OCR_URL + "/file"
+AI_BOARD_OCR_FILE_URL = os.getenv("AI_BOARD_OCR_FILE_URL") or (
+    f"{AI_BOARD_OCR_URL.rstrip('/')}/file" if AI_BOARD_OCR_URL else None
+)
 AI_EXAM_OCR_URL = os.getenv("AI_EXAM_OCR_URL")
 AI_EXAM_OCR_URL = os.getenv("AI_EXAM_OCR_URL")
 AI_EXAM_OCR_RESULT_URL = os.getenv("AI_EXAM_OCR_RESULT_URL") 